@@ -1,451 +1,415 @@
 """Inspector Mode - Test runner for validating external protocol implementations.
 
 Runs test suites against external servers to verify protocol compliance.
-Returns detailed reports with pass/fail status and recommendations.
+Returns detailed reports with pass/fail status and recommendations. The
+runner itself lives in ``app.services.inspector``; this module exposes it
+over HTTP.
 """
 
-import uuid
-from datetime import datetime, timezone
+import asyncio
+import json
+from collections.abc import AsyncIterator
 from typing import Any
 
 import httpx
-from fastapi import APIRouter, HTTPException
-from pydantic import BaseModel, Field
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+
+from app.services.capture import CaptureError, CaptureReader, capture_path
+from app.services.http_pool import get_client_pool
+from app.services.inspector import (
+    ACP_TESTS,
+    AP2_TESTS,
+    MAX_BATCH_CELLS,
+    MAX_SOAK_WINDOWS,
+    MOCK_PATHS,
+    RACE_TESTS,
+    UCP_TESTS,
+    X402_TESTS,
+    BatchReport,
+    BatchRun,
+    DiffReport,
+    DiffRun,
+    LoadReport,
+    LoadRun,
+    RaceReport,
+    RaceRun,
+    SoakReport,
+    SoakRun,
+    TestReport,
+    TestRun,
+    get_tests,
+    run_batch,
+    run_diff,
+    run_load,
+    run_race,
+    run_soak,
+    run_tests,
+    stream_tests,
+)
+from app.services.jobs import Job, JobQueue, JobStatus, QueueFullError, get_job_queue
 
 router = APIRouter()
 
+# Hosts that reach this sandbox when used with its own port
+LOOPBACK_HOSTS = {"localhost", "127.0.0.1", "::1", "0.0.0.0"}
+
 
 # ============================================================================
 # Models
 # ============================================================================
 
 
-class TestRun(BaseModel):
-    """A test run configuration."""
+class JobInfo(BaseModel):
+    """Status of a queued inspector run."""
 
+    job_id: str
+    status: str  # "queued", "running", "succeeded", "failed", "cancelled"
+    kind: str = "run"  # "run" or "soak"
     target_url: str
-    protocol: str  # "UCP", "ACP", "x402", "AP2"
-    tests: list[str] | None = None  # Specific tests to run, or None for all
-
-
-class TestResult(BaseModel):
-    """Result of a single test."""
-
-    test_id: str
-    name: str
-    passed: bool
-    duration_ms: int
+    protocol: str
+    submitted_at: str
+    started_at: str | None = None
+    finished_at: str | None = None
     error: str | None = None
-    expected: Any | None = None
-    actual: Any | None = None
-    recommendation: str | None = None
 
 
-class TestReport(BaseModel):
-    """Complete test run report."""
+def _is_sandbox_target(target_url: str, request: Request) -> bool:
+    """Check whether a target is one of this sandbox's own mock servers.
 
-    run_id: str
-    target_url: str
-    protocol: str
-    timestamp: str
-    duration_ms: int
-    passed: int
-    failed: int
-    warnings: int
-    security_score: int
-    results: list[TestResult]
-    summary: str
+    The target must name this server (or a loopback alias) on the port the
+    request arrived on, and point under ``/mock/``.
+    """
+    try:
+        target = httpx.URL(target_url)
+    except httpx.InvalidURL:
+        return False
+    server = request.scope.get("server") or (request.url.hostname, request.url.port)
+    own_hosts = LOOPBACK_HOSTS | {request.url.hostname, server[0]}
+    default_port = 443 if target.scheme == "https" else 80
+    return (
+        target.host in own_hosts
+        and (target.port or default_port) == server[1]
+        and target.path.startswith("/mock/")
+    )
 
 
 # ============================================================================
-# Test Definitions
+# API Endpoints
 # ============================================================================
 
-UCP_TESTS = [
-    {
-        "id": "ucp_discovery",
-        "name": "Discovery endpoint returns valid profile",
-        "endpoint": "/.well-known/ucp",
-        "method": "GET",
-        "expected_status": 200,
-        "required_fields": ["name", "version", "payment"],
-        "weight": 20,
-    },
-    {
-        "id": "ucp_discovery_payment_handlers",
-        "name": "Discovery includes payment handlers",
-        "endpoint": "/.well-known/ucp",
-        "method": "GET",
-        "expected_status": 200,
-        "json_path": "payment.handlers",
-        "min_length": 1,
-        "weight": 15,
-    },
-    {
-        "id": "ucp_checkout_create",
-        "name": "Can create checkout session",
-        "endpoint": "/checkout-sessions",
-        "method": "POST",
-        "body": {
-            "currency": "USD",
-            "line_items": [{"item": {"id": "test_product"}, "quantity": 1}],
-        },
-        "expected_status": 201,
-        "required_fields": ["id", "status", "line_items"],
-        "weight": 25,
-    },
-    {
-        "id": "ucp_checkout_get",
-        "name": "Can retrieve checkout session",
-        "depends_on": "ucp_checkout_create",
-        "endpoint_template": "/checkout-sessions/{checkout_id}",
-        "method": "GET",
-        "expected_status": 200,
-        "weight": 15,
-    },
-    {
-        "id": "ucp_idempotency",
-        "name": "Idempotency key is honored",
-        "endpoint": "/checkout-sessions",
-        "method": "POST",
-        "body": {
-            "currency": "USD",
-            "line_items": [{"item": {"id": "test_product"}, "quantity": 1}],
-        },
-        "headers": {"Idempotency-Key": "test-idempotency-key"},
-        "expected_status": 201,
-        "repeat": 2,
-        "expect_same_response": True,
-        "weight": 25,
-    },
-]
-
-ACP_TESTS = [
-    {
-        "id": "acp_discovery",
-        "name": "Discovery endpoint exists",
-        "endpoint": "/.well-known/checkout",
-        "method": "GET",
-        "expected_status": 200,
-        "weight": 20,
-    },
-    {
-        "id": "acp_discovery_api_version",
-        "name": "Discovery includes API-Version",
-        "endpoint": "/.well-known/checkout",
-        "method": "GET",
-        "expected_status": 200,
-        "required_fields": ["api_version"],
-        "weight": 15,
-    },
-    {
-        "id": "acp_session_create",
-        "name": "Can create checkout session",
-        "endpoint": "/checkout_sessions",
-        "method": "POST",
-        "body": {"items": [{"id": "item_123", "quantity": 1}]},
-        "headers": {"API-Version": "2026-01-16"},
-        "expected_status": 201,
-        "required_fields": ["id", "status", "line_items", "totals"],
-        "weight": 30,
-    },
-    {
-        "id": "acp_session_line_items",
-        "name": "Line items include totals breakdown",
-        "depends_on": "acp_session_create",
-        "check": "line_item_schema",
-        "weight": 20,
-    },
-    {
-        "id": "acp_session_states",
-        "name": "Session status transitions correctly",
-        "depends_on": "acp_session_create",
-        "check": "status_in",
-        "valid_statuses": ["not_ready_for_payment", "ready_for_payment"],
-        "weight": 15,
-    },
-]
-
-X402_TESTS = [
-    {
-        "id": "x402_info",
-        "name": "Info endpoint returns protocol details",
-        "endpoint": "/info",
-        "method": "GET",
-        "expected_status": 200,
-        "required_fields": ["x402Version", "protocol", "receiver"],
-        "weight": 15,
-    },
-    {
-        "id": "x402_supported",
-        "name": "Facilitator /supported returns CAIP-2 networks",
-        "endpoint": "/supported",
-        "method": "GET",
-        "expected_status": 200,
-        "required_fields": ["kinds", "signers"],
-        "check": "caip2_networks",
-        "weight": 20,
-    },
-    {
-        "id": "x402_402_response",
-        "name": "Protected resource returns 402 with PaymentRequired",
-        "endpoint": "/resource/premium-content",
-        "method": "GET",
-        "expected_status": 402,
-        "check": "x402_v2_format",
-        "weight": 30,
-    },
-    {
-        "id": "x402_verify_endpoint",
-        "name": "Facilitator /verify endpoint exists",
-        "endpoint": "/verify",
-        "method": "POST",
-        "body": {"paymentPayload": {}, "paymentRequirements": {}},
-        "expected_status": 422,  # Invalid payload expected
-        "weight": 15,
-    },
-    {
-        "id": "x402_settle_endpoint",
-        "name": "Facilitator /settle endpoint exists",
-        "endpoint": "/settle",
-        "method": "POST",
-        "body": {"paymentPayload": {}, "paymentRequirements": {}},
-        "expected_status": 422,  # Invalid payload expected
-        "weight": 15,
-    },
-]
-
-AP2_TESTS = [
-    {
-        "id": "ap2_agent_card",
-        "name": "Agent card with AP2 extension",
-        "endpoint": "/.well-known/a2a",
-        "method": "GET",
-        "expected_status": 200,
-        "json_path": "capabilities.extensions",
-        "contains_ap2": True,
-        "weight": 25,
-    },
-    {
-        "id": "ap2_message_handler",
-        "name": "A2A message endpoint accepts messages",
-        "endpoint": "/message",
-        "method": "POST",
-        "body": {
-            "jsonrpc": "2.0",
-            "id": "test-1",
-            "method": "ap2/browseProducts",
-            "params": {},
-        },
-        "expected_status": 200,
-        "weight": 35,
-    },
-]
 
+@router.post("/run", response_model=TestReport)
+async def run_test_suite(request: TestRun, http_request: Request) -> TestReport:
+    """Run a test suite against a target URL."""
+    if request.protocol not in ["UCP", "ACP", "x402", "AP2"]:
+        raise HTTPException(status_code=400, detail=f"Unknown protocol: {request.protocol}")
 
-# ============================================================================
-# Test Runner
-# ============================================================================
+    in_process = request.in_process and _is_sandbox_target(request.target_url, http_request)
+    return await run_tests(
+        request.target_url,
+        request.protocol,
+        request.concurrency,
+        in_process=in_process,
+        deadline_s=request.deadline_s,
+        score_performance=request.score_performance,
+        capture=request.capture,
+        timeout_s=request.timeout_s,
+        retries=request.retries,
+    )
 
 
-def _get_tests(protocol: str) -> list[dict[str, Any]]:
-    """Get test definitions for a protocol."""
-    tests_map = {
-        "UCP": UCP_TESTS,
-        "ACP": ACP_TESTS,
-        "x402": X402_TESTS,
-        "AP2": AP2_TESTS,
-    }
-    return tests_map.get(protocol, [])
+@router.post("/run/stream")
+async def run_test_suite_stream(
+    request: TestRun,
+    http_request: Request,
+    format: str = "ndjson",
+) -> StreamingResponse:
+    """Run a test suite, streaming each result as soon as it completes.
 
+    ``format=ndjson`` emits one JSON event per line; ``format=sse`` emits
+    Server-Sent Events named after the event type. Disconnecting aborts the run.
+    """
+    if request.protocol not in ["UCP", "ACP", "x402", "AP2"]:
+        raise HTTPException(status_code=400, detail=f"Unknown protocol: {request.protocol}")
+    if format not in ("ndjson", "sse"):
+        raise HTTPException(status_code=400, detail=f"Unknown stream format: {format}")
+
+    in_process = request.in_process and _is_sandbox_target(request.target_url, http_request)
+    events = stream_tests(
+        request.target_url,
+        request.protocol,
+        request.concurrency,
+        in_process,
+        request.deadline_s,
+        request.score_performance,
+        request.capture,
+        request.timeout_s,
+        request.retries,
+    )
 
-async def _run_test(
-    client: httpx.AsyncClient,
-    test: dict[str, Any],
-    context: dict[str, Any],
-) -> TestResult:
-    """Run a single test."""
-    start_time = datetime.now(timezone.utc)
-    test_id = test["id"]
-    name = test["name"]
+    async def encode() -> AsyncIterator[str]:
+        async for event in events:
+            data = json.dumps(event, separators=(",", ":"))
+            if format == "sse":
+                yield f"event: {event['event']}\ndata: {data}\n\n"
+            else:
+                yield f"{data}\n"
+
+    media_type = "text/event-stream" if format == "sse" else "application/x-ndjson"
+    return StreamingResponse(
+        encode(),
+        media_type=media_type,
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
-    try:
-        # Build endpoint URL
-        endpoint = test.get("endpoint", "")
-        if "endpoint_template" in test:
-            endpoint = test["endpoint_template"].format(**context)
-
-        # Make request
-        method = test.get("method", "GET")
-        body = test.get("body")
-        headers = test.get("headers", {})
-
-        if method == "GET":
-            response = await client.get(endpoint, headers=headers)
-        elif method == "POST":
-            response = await client.post(endpoint, json=body, headers=headers)
-        elif method == "PUT":
-            response = await client.put(endpoint, json=body, headers=headers)
-        else:
-            raise ValueError(f"Unknown method: {method}")
-
-        duration_ms = int((datetime.now(timezone.utc) - start_time).total_seconds() * 1000)
-
-        # Check status code
-        expected_status = test.get("expected_status", 200)
-        if response.status_code != expected_status:
-            return TestResult(
-                test_id=test_id,
-                name=name,
-                passed=False,
-                duration_ms=duration_ms,
-                error=f"Expected status {expected_status}, got {response.status_code}",
-                expected=expected_status,
-                actual=response.status_code,
-                recommendation=f"Check that {endpoint} returns HTTP {expected_status}",
-            )
-
-        # Check required fields
-        if "required_fields" in test:
-            try:
-                data = response.json()
-                for field in test["required_fields"]:
-                    if field not in data:
-                        return TestResult(
-                            test_id=test_id,
-                            name=name,
-                            passed=False,
-                            duration_ms=duration_ms,
-                            error=f"Missing required field: {field}",
-                            recommendation=f"Include '{field}' in the response",
-                        )
-                # Store for dependent tests
-                if "id" in data:
-                    context["checkout_id"] = data["id"]
-            except Exception as e:
-                return TestResult(
-                    test_id=test_id,
-                    name=name,
-                    passed=False,
-                    duration_ms=duration_ms,
-                    error=f"Invalid JSON response: {e}",
-                )
-
-        # Check expected header
-        if "expected_header" in test:
-            header_name = test["expected_header"]
-            if header_name.lower() not in [h.lower() for h in response.headers]:
-                return TestResult(
-                    test_id=test_id,
-                    name=name,
-                    passed=False,
-                    duration_ms=duration_ms,
-                    error=f"Missing expected header: {header_name}",
-                    recommendation=f"Include {header_name} header in 402 response",
-                )
-
-        return TestResult(
-            test_id=test_id,
-            name=name,
-            passed=True,
-            duration_ms=duration_ms,
+
+@router.post("/batch", response_model=BatchReport)
+async def run_batch_suite(request: BatchRun, http_request: Request) -> BatchReport:
+    """Run test suites for every target x protocol combination."""
+    unknown = [p for p in request.protocols if p not in ["UCP", "ACP", "x402", "AP2"]]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown protocol: {unknown[0]}")
+
+    targets = list(dict.fromkeys(request.targets))
+    protocols = list(dict.fromkeys(request.protocols))
+    if len(targets) * len(protocols) > MAX_BATCH_CELLS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Batch exceeds {MAX_BATCH_CELLS} target x protocol combinations",
         )
 
-    except httpx.RequestError as e:
-        duration_ms = int((datetime.now(timezone.utc) - start_time).total_seconds() * 1000)
-        return TestResult(
-            test_id=test_id,
-            name=name,
-            passed=False,
-            duration_ms=duration_ms,
-            error=f"Request failed: {e}",
-            recommendation="Check that the target server is running and accessible",
+    return await run_batch(
+        targets,
+        protocols,
+        concurrency=request.concurrency,
+        per_host_limit=request.per_host_limit,
+        test_concurrency=request.test_concurrency,
+        in_process_targets=frozenset(
+            t for t in targets if request.in_process and _is_sandbox_target(t, http_request)
+        ),
+        deadline_s=request.deadline_s,
+    )
+
+
+@router.post("/load", response_model=LoadReport)
+async def run_load_test(request: LoadRun) -> LoadReport:
+    """Replay selected tests at a target rate or concurrency for a fixed duration."""
+    tests = get_tests(request.protocol, opt_in=True)
+    if not tests:
+        raise HTTPException(status_code=400, detail=f"Unknown protocol: {request.protocol}")
+
+    by_id = {t.id: t for t in tests}
+    unknown = [t for t in request.tests if t not in by_id]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown test: {unknown[0]}")
+    passive = [t for t in request.tests if not by_id[t].sends_request]
+    if passive:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Test '{passive[0]}' only inspects its dependency's response",
         )
-    except Exception as e:
-        duration_ms = int((datetime.now(timezone.utc) - start_time).total_seconds() * 1000)
-        return TestResult(
-            test_id=test_id,
-            name=name,
-            passed=False,
-            duration_ms=duration_ms,
-            error=f"Test error: {e}",
+
+    return await run_load(
+        request.target_url,
+        request.protocol,
+        list(dict.fromkeys(request.tests)),
+        duration_s=request.duration_s,
+        rate=request.rate,
+        concurrency=request.concurrency,
+    )
+
+
+@router.post("/race", response_model=RaceReport)
+async def run_idempotency_race(request: RaceRun, http_request: Request) -> RaceReport:
+    """Fire concurrent duplicate creates and check exactly one resource results."""
+    if request.protocol not in RACE_TESTS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Idempotency races support {', '.join(RACE_TESTS)}, not {request.protocol}",
         )
 
+    in_process = request.in_process and _is_sandbox_target(request.target_url, http_request)
+    return await run_race(
+        request.target_url,
+        request.protocol,
+        request.requests,
+        in_process=in_process,
+    )
+
 
-async def run_tests(target_url: str, protocol: str) -> TestReport:
-    """Run all tests for a protocol against a target URL."""
-    run_id = f"run_{uuid.uuid4().hex[:12]}"
-    start_time = datetime.now(timezone.utc)
-    tests = _get_tests(protocol)
-    results: list[TestResult] = []
-    context: dict[str, Any] = {}
-
-    async with httpx.AsyncClient(base_url=target_url, timeout=30.0) as client:
-        for test in tests:
-            # Skip if dependency failed
-            if "depends_on" in test:
-                dep_result = next((r for r in results if r.test_id == test["depends_on"]), None)
-                if dep_result and not dep_result.passed:
-                    results.append(
-                        TestResult(
-                            test_id=test["id"],
-                            name=test["name"],
-                            passed=False,
-                            duration_ms=0,
-                            error=f"Skipped: dependency '{test['depends_on']}' failed",
-                        )
-                    )
-                    continue
-
-            result = await _run_test(client, test, context)
-            results.append(result)
-
-    duration_ms = int((datetime.now(timezone.utc) - start_time).total_seconds() * 1000)
-    passed = sum(1 for r in results if r.passed)
-    failed = sum(1 for r in results if not r.passed)
-
-    # Calculate security score
-    total_weight = sum(t.get("weight", 10) for t in tests)
-    earned_weight = sum(
-        t.get("weight", 10)
-        for t, r in zip(tests, results)
-        if r.passed
+@router.post("/soak", response_model=JobInfo, status_code=202)
+async def submit_soak(request: SoakRun, http_request: Request) -> JobInfo:
+    """Queue a soak run; fetch its SoakReport from /jobs/{id}/result when done."""
+    if request.protocol not in ["UCP", "ACP", "x402", "AP2"]:
+        raise HTTPException(status_code=400, detail=f"Unknown protocol: {request.protocol}")
+    if request.duration_s / request.window_s > MAX_SOAK_WINDOWS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"duration_s / window_s exceeds {MAX_SOAK_WINDOWS} windows",
+        )
+
+    queue = _require_job_queue()
+    in_process = request.in_process and _is_sandbox_target(request.target_url, http_request)
+    try:
+        job = queue.submit(
+            lambda: run_soak(
+                request.target_url,
+                request.protocol,
+                request.duration_s,
+                window_s=request.window_s,
+                interval_s=request.interval_s,
+                concurrency=request.concurrency,
+                drift_windows=request.drift_windows,
+                alpha=request.alpha,
+                min_change_pct=request.min_change_pct,
+                in_process=in_process,
+            ),
+            kind="soak",
+            target_url=request.target_url,
+            protocol=request.protocol,
+        )
+    except QueueFullError as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    return JobInfo(**job.describe())
+
+
+@router.post("/diff", response_model=DiffReport)
+async def run_differential(request: DiffRun, http_request: Request) -> DiffReport:
+    """Send a suite to the target and a reference, and diff their JSON responses."""
+    if request.protocol not in MOCK_PATHS:
+        raise HTTPException(status_code=400, detail=f"Unknown protocol: {request.protocol}")
+
+    reference_url = request.reference_url or (
+        f"{str(http_request.base_url).rstrip('/')}{MOCK_PATHS[request.protocol]}"
     )
-    security_score = int((earned_weight / total_weight) * 100) if total_weight > 0 else 0
-
-    # Generate summary
-    if failed == 0:
-        summary = f"All {passed} tests passed! Server is fully compliant with {protocol}."
-    else:
-        summary = f"{failed} of {passed + failed} tests failed. Review the results for recommendations."
-
-    return TestReport(
-        run_id=run_id,
-        target_url=target_url,
-        protocol=protocol,
-        timestamp=start_time.isoformat(),
-        duration_ms=duration_ms,
-        passed=passed,
-        failed=failed,
-        warnings=0,
-        security_score=security_score,
-        results=results,
-        summary=summary,
+    return await run_diff(
+        request.target_url,
+        request.protocol,
+        reference_url,
+        concurrency=request.concurrency,
+        ignore_fields=request.ignore_fields,
+        max_differences=request.max_differences,
+        # The sandbox's own mock is always reached in process when possible
+        reference_in_process=_is_sandbox_target(reference_url, http_request),
+        target_in_process=request.in_process and _is_sandbox_target(request.target_url, http_request),
     )
 
 
-# ============================================================================
-# API Endpoints
-# ============================================================================
+def _require_job_queue() -> JobQueue:
+    queue = get_job_queue()
+    if queue is None:
+        raise HTTPException(status_code=503, detail="Job queue is not running")
+    return queue
 
 
-@router.post("/run", response_model=TestReport)
-async def run_test_suite(request: TestRun) -> TestReport:
-    """Run a test suite against a target URL."""
+def _require_job(job_id: str) -> Job:
+    job = _require_job_queue().get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job '{job_id}' not found")
+    return job
+
+
+@router.post("/jobs", response_model=JobInfo, status_code=202)
+async def submit_test_suite(request: TestRun, http_request: Request) -> JobInfo:
+    """Queue a test suite run and return its job id immediately."""
     if request.protocol not in ["UCP", "ACP", "x402", "AP2"]:
         raise HTTPException(status_code=400, detail=f"Unknown protocol: {request.protocol}")
 
-    return await run_tests(request.target_url, request.protocol)
+    queue = _require_job_queue()
+    in_process = request.in_process and _is_sandbox_target(request.target_url, http_request)
+    try:
+        job = queue.submit(
+            lambda: run_tests(
+                request.target_url,
+                request.protocol,
+                request.concurrency,
+                in_process=in_process,
+                deadline_s=request.deadline_s,
+                score_performance=request.score_performance,
+                capture=request.capture,
+                timeout_s=request.timeout_s,
+                retries=request.retries,
+            ),
+            kind="run",
+            target_url=request.target_url,
+            protocol=request.protocol,
+        )
+    except QueueFullError as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    return JobInfo(**job.describe())
+
+
+@router.get("/jobs")
+async def list_jobs() -> dict[str, Any]:
+    """Job queue depth and counts by status."""
+    return _require_job_queue().stats()
+
+
+@router.get("/jobs/{job_id}", response_model=JobInfo)
+async def get_job(job_id: str) -> JobInfo:
+    """Get the status of a queued run."""
+    return JobInfo(**_require_job(job_id).describe())
+
+
+@router.get("/jobs/{job_id}/result", response_model=TestReport | SoakReport)
+async def get_job_result(job_id: str) -> TestReport | SoakReport:
+    """Get the report of a finished run."""
+    job = _require_job(job_id)
+    if job.status != JobStatus.SUCCEEDED:
+        raise HTTPException(status_code=409, detail=f"Job '{job_id}' is {job.status.value}")
+    return job.result
+
+
+@router.delete("/jobs/{job_id}", response_model=JobInfo)
+async def cancel_job(job_id: str) -> JobInfo:
+    """Cancel a queued or running run."""
+    _require_job(job_id)
+    job = _require_job_queue().cancel(job_id)
+    return JobInfo(**job.describe())
+
+
+async def _open_capture(run_id: str) -> CaptureReader:
+    try:
+        return await asyncio.to_thread(CaptureReader, capture_path(run_id))
+    except CaptureError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+
+@router.get("/captures/{run_id}")
+async def get_capture_index(run_id: str) -> dict[str, Any]:
+    """List the exchanges recorded by a run with capture enabled."""
+    reader = await _open_capture(run_id)
+    with reader:
+        return {
+            "run_id": run_id,
+            "complete": reader.complete,
+            "dropped": reader.dropped,
+            "exchanges": [
+                {k: v for k, v in entry.items() if k != "offset"} for entry in reader.exchanges
+            ],
+        }
+
+
+@router.get("/captures/{run_id}/{seq}")
+async def get_captured_exchange(run_id: str, seq: int) -> dict[str, Any]:
+    """Get one recorded exchange: request, response, timings and error."""
+    reader = await _open_capture(run_id)
+    with reader:
+        try:
+            return await asyncio.to_thread(reader.get, seq)
+        except CaptureError as e:
+            raise HTTPException(status_code=404, detail=str(e))
+
+
+@router.get("/pool")
+async def get_pool_stats() -> dict[str, Any]:
+    """Describe the shared inspector client pool."""
+    pool = get_client_pool()
+    if pool is None:
+        raise HTTPException(status_code=404, detail="Client pool is not running")
+    return pool.stats()
 
 
 @router.get("/protocols")
@@ -480,11 +444,11 @@ async def list_protocols() -> dict[str, Any]:
 @router.get("/tests/{protocol}")
 async def list_tests(protocol: str) -> dict[str, Any]:
     """List tests for a specific protocol."""
-    tests = _get_tests(protocol)
+    tests = get_tests(protocol)
     if not tests:
         raise HTTPException(status_code=404, detail=f"Unknown protocol: {protocol}")
 
     return {
         "protocol": protocol,
-        "tests": [{"id": t["id"], "name": t["name"], "weight": t.get("weight", 10)} for t in tests],
+        "tests": [{"id": t.id, "name": t.name, "weight": t.weight} for t in tests],
     }
@@ -0,0 +1,357 @@
+"""Inspector CLI - Run protocol test suites from the command line or CI.
+
+Runs every target x protocol suite (or the runs listed in a suite file) in
+parallel, prints a summary table and optionally writes JUnit XML and NDJSON
+reports. Only the runner is imported, not the web app or its mock servers.
+
+    python -m app.cli -t https://merchant.example -p UCP -p ACP --junit report.xml
+
+Exit status is 0 when every test passed, 1 when any test failed or a suite
+could not run, and 2 for usage errors.
+"""
+
+import argparse
+import asyncio
+import json
+import sys
+import xml.etree.ElementTree as ET
+from collections.abc import Sequence
+from dataclasses import dataclass
+from pathlib import Path
+from typing import IO
+
+from pydantic import TypeAdapter, ValidationError
+
+from app.services.http_pool import ClientPool
+from app.services.inspector import (
+    DEFAULT_CONCURRENCY,
+    MAX_BATCH_CONCURRENCY,
+    MAX_CONCURRENCY,
+    MAX_RUN_RETRIES,
+    SKIPPED_PREFIX,
+    TestReport,
+    TestRun,
+    get_tests,
+    run_tests,
+)
+
+EXIT_OK = 0
+EXIT_FAILED = 1
+
+DEFAULT_SUITE_CONCURRENCY = 4
+
+_RUNS = TypeAdapter(list[TestRun])
+
+
+@dataclass
+class SuiteOutcome:
+    """A suite's report, or the error that kept it from running."""
+
+    run: TestRun
+    report: TestReport | None = None
+    error: str | None = None
+
+    @property
+    def passed(self) -> bool:
+        return self.report is not None and self.report.failed == 0
+
+
+def load_suite_file(path: Path) -> list[TestRun]:
+    """Read a JSON list of runs, each shaped like a ``/run`` request body."""
+    data = json.loads(path.read_text())
+    if isinstance(data, dict):
+        data = data.get("runs")
+    return _RUNS.validate_python(data)
+
+
+async def run_suites(
+    runs: Sequence[TestRun],
+    concurrency: int = DEFAULT_SUITE_CONCURRENCY,
+    ndjson: IO[str] | None = None,
+) -> list[SuiteOutcome]:
+    """Run suites with at most ``concurrency`` in flight, in input order.
+
+    Suites against the same origin share a pooled client. Each report is
+    written to ``ndjson`` as soon as its suite finishes.
+    """
+    pool = ClientPool()
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def run_one(run: TestRun) -> SuiteOutcome:
+        async with semaphore:
+            try:
+                async with pool.client(run.target_url) as client:
+                    report = await run_tests(
+                        run.target_url,
+                        run.protocol,
+                        run.concurrency,
+                        client=client,
+                        deadline_s=run.deadline_s,
+                        score_performance=run.score_performance,
+                        capture=run.capture,
+                        timeout_s=run.timeout_s,
+                        retries=run.retries,
+                    )
+            except Exception as e:
+                outcome = SuiteOutcome(run, error=f"{type(e).__name__}: {e}")
+            else:
+                outcome = SuiteOutcome(run, report=report)
+        if ndjson is not None:
+            ndjson.write(_ndjson_line(outcome))
+            ndjson.flush()
+        return outcome
+
+    try:
+        return await asyncio.gather(*(run_one(run) for run in runs))
+    finally:
+        await pool.close()
+
+
+def _ndjson_line(outcome: SuiteOutcome) -> str:
+    if outcome.report is not None:
+        event = {"event": "report", **outcome.report.model_dump(mode="json")}
+    else:
+        event = {
+            "event": "error",
+            "target_url": outcome.run.target_url,
+            "protocol": outcome.run.protocol,
+            "error": outcome.error,
+        }
+    return json.dumps(event, separators=(",", ":")) + "\n"
+
+
+def junit_xml(outcomes: Sequence[SuiteOutcome]) -> ET.ElementTree:
+    """One ``testsuite`` per suite, one ``testcase`` per inspector test."""
+    root = ET.Element("testsuites", name="inspector")
+    totals = {"tests": 0, "failures": 0, "errors": 0, "skipped": 0}
+    for outcome in outcomes:
+        run = outcome.run
+        suite = ET.SubElement(root, "testsuite", name=f"{run.protocol} {run.target_url}")
+        counts = {"tests": 0, "failures": 0, "errors": 0, "skipped": 0}
+        if outcome.report is None:
+            case = ET.SubElement(suite, "testcase", classname=run.protocol, name="run")
+            ET.SubElement(case, "error", message=outcome.error or "").text = outcome.error
+            counts["tests"] = counts["errors"] = 1
+        else:
+            report = outcome.report
+            suite.set("timestamp", report.timestamp)
+            suite.set("time", f"{report.duration_ms / 1000:.3f}")
+            for result in report.results:
+                case = ET.SubElement(
+                    suite,
+                    "testcase",
+                    classname=f"{run.protocol}.{result.test_id}",
+                    name=result.name,
+                    time=f"{result.duration_ms / 1000:.3f}",
+                )
+                counts["tests"] += 1
+                if result.error is not None and result.error.startswith(SKIPPED_PREFIX):
+                    ET.SubElement(case, "skipped", message=result.error)
+                    counts["skipped"] += 1
+                elif not result.passed:
+                    failure = ET.SubElement(case, "failure", message=result.error or "failed")
+                    details = [
+                        f"{label}: {value}"
+                        for label, value in (
+                            ("expected", result.expected),
+                            ("actual", result.actual),
+                            ("recommendation", result.recommendation),
+                        )
+                        if value is not None
+                    ]
+                    failure.text = "\n".join(details) or None
+                    counts["failures"] += 1
+                elif result.warning:
+                    ET.SubElement(case, "system-out").text = f"warning: {result.warning}"
+        for key, value in counts.items():
+            suite.set(key, str(value))
+            totals[key] += value
+    for key, value in totals.items():
+        root.set(key, str(value))
+    ET.indent(root)
+    return ET.ElementTree(root)
+
+
+def summary_table(outcomes: Sequence[SuiteOutcome]) -> str:
+    """Fixed-width table of suite results, then each failed test and capture file."""
+    header = ("TARGET", "PROTOCOL", "PASSED", "FAILED", "WARN", "SCORE", "TIME")
+    rows = []
+    failures = []
+    for outcome in outcomes:
+        run = outcome.run
+        report = outcome.report
+        if report is None:
+            rows.append((run.target_url, run.protocol, "-", "-", "-", "-", "ERROR"))
+            failures.append(f"ERROR {run.protocol} {run.target_url}: {outcome.error}")
+            continue
+        rows.append(
+            (
+                run.target_url,
+                run.protocol,
+                str(report.passed),
+                str(report.failed),
+                str(report.warnings),
+                str(report.security_score),
+                f"{report.duration_ms / 1000:.2f}s",
+            )
+        )
+        for result in report.results:
+            if result.passed:
+                continue
+            skipped = result.error is not None and result.error.startswith(SKIPPED_PREFIX)
+            failures.append(
+                f"{'SKIP' if skipped else 'FAIL'} {run.protocol} {run.target_url} "
+                f"{result.test_id}: {result.error}"
+            )
+    widths = [max(len(row[i]) for row in (header, *rows)) for i in range(len(header))]
+    lines = [
+        "  ".join(cell.ljust(width) for cell, width in zip(row, widths)).rstrip()
+        for row in (header, *rows)
+    ]
+    captures = [
+        f"CAPTURE {o.run.protocol} {o.run.target_url}: {o.report.capture_file}"
+        for o in outcomes
+        if o.report is not None and o.report.capture_file is not None
+    ]
+    for section in (failures, captures):
+        if section:
+            lines.append("")
+            lines.extend(section)
+    return "\n".join(lines)
+
+
+def _build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="aps-inspect",
+        description="Run inspector test suites against protocol servers.",
+    )
+    parser.add_argument(
+        "-t",
+        "--target",
+        action="append",
+        default=[],
+        metavar="URL",
+        help="target base URL (repeatable)",
+    )
+    parser.add_argument(
+        "-p",
+        "--protocol",
+        action="append",
+        default=[],
+        metavar="PROTOCOL",
+        help="protocol suite to run against every target: UCP, ACP, x402, AP2 (repeatable)",
+    )
+    parser.add_argument(
+        "-f",
+        "--suite-file",
+        type=Path,
+        metavar="PATH",
+        help="JSON list of runs ({target_url, protocol, ...}), instead of -t/-p",
+    )
+    parser.add_argument(
+        "-j",
+        "--concurrency",
+        type=int,
+        default=DEFAULT_SUITE_CONCURRENCY,
+        help=f"suites in flight at once (default {DEFAULT_SUITE_CONCURRENCY})",
+    )
+    parser.add_argument(
+        "--test-concurrency",
+        type=int,
+        default=DEFAULT_CONCURRENCY,
+        help=f"tests in flight per suite for -t/-p runs (default {DEFAULT_CONCURRENCY})",
+    )
+    parser.add_argument(
+        "--deadline",
+        type=float,
+        metavar="SECONDS",
+        help="per-suite deadline for runs that do not set deadline_s",
+    )
+    parser.add_argument(
+        "--retries",
+        type=int,
+        default=0,
+        help="retries for idempotent requests of runs that do not set retries (default 0)",
+    )
+    parser.add_argument(
+        "--capture",
+        action="store_true",
+        help="record every exchange to a capture file per suite (see APS_INSPECTOR_CAPTURE_DIR)",
+    )
+    parser.add_argument("--junit", type=Path, metavar="PATH", help="write a JUnit XML report")
+    parser.add_argument(
+        "--ndjson",
+        type=Path,
+        metavar="PATH",
+        help="write one JSON report per suite as it finishes ('-' for stdout)",
+    )
+    parser.add_argument("-q", "--quiet", action="store_true", help="do not print the summary table")
+    return parser
+
+
+def _runs_from_args(args: argparse.Namespace) -> list[TestRun]:
+    if args.suite_file is not None:
+        if args.target or args.protocol:
+            raise ValueError("use either --suite-file or --target/--protocol, not both")
+        runs = load_suite_file(args.suite_file)
+    else:
+        if not args.target or not args.protocol:
+            raise ValueError("at least one --target and one --protocol are required")
+        runs = [
+            TestRun(target_url=target, protocol=protocol, concurrency=args.test_concurrency)
+            for target in dict.fromkeys(args.target)
+            for protocol in dict.fromkeys(args.protocol)
+        ]
+    if not runs:
+        raise ValueError("no runs to execute")
+    for run in runs:
+        if not get_tests(run.protocol):
+            raise ValueError(f"Unknown protocol: {run.protocol}")
+        if run.deadline_s is None and args.deadline is not None:
+            run.deadline_s = args.deadline
+        if not run.retries:
+            run.retries = args.retries
+        run.capture = run.capture or args.capture
+    return runs
+
+
+def main(argv: Sequence[str] | None = None) -> int:
+    parser = _build_parser()
+    args = parser.parse_args(argv)
+    if not 1 <= args.concurrency <= MAX_BATCH_CONCURRENCY:
+        parser.error(f"--concurrency must be between 1 and {MAX_BATCH_CONCURRENCY}")
+    if not 1 <= args.test_concurrency <= MAX_CONCURRENCY:
+        parser.error(f"--test-concurrency must be between 1 and {MAX_CONCURRENCY}")
+    if args.deadline is not None and args.deadline <= 0:
+        parser.error("--deadline must be positive")
+    if not 0 <= args.retries <= MAX_RUN_RETRIES:
+        parser.error(f"--retries must be between 0 and {MAX_RUN_RETRIES}")
+    try:
+        runs = _runs_from_args(args)
+    except (OSError, ValueError) as e:
+        # ValidationError and JSONDecodeError are ValueErrors
+        if isinstance(e, ValidationError):
+            error = e.errors()[0]
+            parser.error(f"{'.'.join(map(str, error['loc']))}: {error['msg']}")
+        parser.error(str(e))
+
+    ndjson: IO[str] | None = None
+    if args.ndjson is not None:
+        ndjson = sys.stdout if str(args.ndjson) == "-" else args.ndjson.open("w")
+    try:
+        outcomes = asyncio.run(run_suites(runs, args.concurrency, ndjson))
+    finally:
+        if ndjson is not None and ndjson is not sys.stdout:
+            ndjson.close()
+
+    if args.junit is not None:
+        junit_xml(outcomes).write(args.junit, encoding="utf-8", xml_declaration=True)
+    if not args.quiet:
+        # Keep stdout clean for NDJSON piped there
+        out = sys.stderr if ndjson is sys.stdout else sys.stdout
+        print(summary_table(outcomes), file=out)
+    return EXIT_OK if all(outcome.passed for outcome in outcomes) else EXIT_FAILED
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -8,6 +8,9 @@ from fastapi.middleware.cors import CORSMiddleware
 
 from app.api import flows, protocols, runs, scenarios, inspector, security
 from app.mock import ucp_router, acp_router, x402_router, ap2_router
+from app.mock.x402 import close_store as close_x402_store
+from app.services.http_pool import ClientPool, set_client_pool
+from app.services.jobs import JobQueue, set_job_queue
 
 
 @asynccontextmanager
@@ -15,9 +18,22 @@ async def lifespan(app: FastAPI):
     """Application lifespan handler."""
     # Startup
     print("🚀 AgentPayment Sandbox starting...")
+    client_pool = ClientPool(local_app=app)
+    await client_pool.start()
+    set_client_pool(client_pool)
+    app.state.client_pool = client_pool
+    job_queue = JobQueue()
+    await job_queue.start()
+    set_job_queue(job_queue)
+    app.state.job_queue = job_queue
     yield
     # Shutdown
     print("👋 AgentPayment Sandbox shutting down...")
+    set_job_queue(None)
+    await job_queue.close()
+    set_client_pool(None)
+    await client_pool.close()
+    await close_x402_store()
 
 
 app = FastAPI(
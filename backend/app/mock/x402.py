@@ -9,20 +9,78 @@ Protocol Version: 2
 - Facilitator endpoints: /verify, /settle, /supported
 """
 
+import base64
 import json
 import uuid
-from datetime import datetime, timezone
+from datetime import UTC, datetime
 from typing import Any
 
 from fastapi import APIRouter, Header, HTTPException, Request, Response
 from pydantic import BaseModel, Field
 
+from app.services.chain import ChainSettings, ChainSimulator
+from app.services.channels import (
+    Channel,
+    ChannelBook,
+    ChannelSettings,
+    voucher_signature,
+)
+from app.services.paid_files import (
+    PaidFileSettings,
+    file_resource,
+    list_file_resources,
+    paid_file_response,
+)
+from app.services.receipts import ReceiptIssuer
+from app.services.settlement import SettlementQueue, SettlementSettings
+from app.services.verify_cache import VerifiedPayment, VerifyCache
+from app.services.x402_store import create_store
+
 router = APIRouter()
 
 # In-memory storage
 _payments: dict[str, dict[str, Any]] = {}
-_nonces: set[str] = set()
-_settlements: dict[str, dict[str, Any]] = {}
+
+# Used nonces and settlements; shared across workers with APS_X402_STORE_BACKEND=sqlite
+_store = create_store()
+
+# Successful verifications, so /settle after /verify skips the static checks
+_verify_cache = VerifyCache.from_settings()
+
+# With APS_X402_CHAIN_ENABLED, settlements are mined by a simulated chain
+_chain_settings = ChainSettings()
+_chain = ChainSimulator.from_settings(_chain_settings) if _chain_settings.enabled else None
+
+
+def _record_settlement(tx_hash: str, settlement: dict[str, Any]) -> None:
+    """Store a settlement and, with the chain simulator on, broadcast its transaction.
+
+    A deferred payment for a resource earns its access receipt here, once it
+    has settled.
+    """
+    resource_id = settlement.get("resource")
+    if resource_id is not None and "receipt" not in settlement:
+        resource = _get_resource(resource_id)
+        if resource is not None:
+            _issue_receipt(settlement, resource_id, resource, tx_hash)
+    _store.add_settlement(tx_hash, settlement)
+    if _chain is not None:
+        _chain.submit(tx_hash)
+
+
+# With APS_X402_SETTLEMENT_MODE=deferred, resources are served before their payment settles
+_settlement_settings = SettlementSettings()
+_settlements = SettlementQueue.from_settings(_record_settlement, _settlement_settings)
+
+# Payment channels of the "channel" scheme, paid per request with cumulative vouchers
+_channel_settings = ChannelSettings()
+_channels = ChannelBook.from_settings(_channel_settings)
+
+# Signed access receipts, so a client that paid for a resource can come back without paying again
+_receipts = ReceiptIssuer.from_settings()
+
+# Files served as paid resources, streamed after payment
+_file_settings = PaidFileSettings()
 
 
 # ============================================================================
@@ -33,6 +91,8 @@ X402_VERSION = 2
 RECEIVER_ADDRESS = "0x209693Bc6afc0C5328bA36FaF03C514EF312287C"
 USDC_CONTRACT = "0x036CbD53842c5426634e7929541eC2318f3dCF7e"
 DEFAULT_NETWORK = "eip155:84532"  # Base Sepolia (CAIP-2)
+MAX_BATCH_ITEMS = 1000  # per /verify/batch or /settle/batch request
+CHANNEL_SCHEME = "channel"
 
 
 # ============================================================================
@@ -112,6 +172,12 @@ class SettleRequest(BaseModel):
     paymentRequirements: dict[str, Any]
 
 
+class OpenChannelRequest(BaseModel):
+    """Request to open a payment channel, funded by an exact-scheme deposit payment."""
+
+    paymentPayload: dict[str, Any]
+
+
 # ============================================================================
 # Protected Resources
 # ============================================================================
@@ -149,9 +215,27 @@ RESOURCES: dict[str, dict[str, Any]] = {
 # ============================================================================
 
 
+def _get_resource(resource_id: str) -> dict[str, Any] | None:
+    """A built-in resource, or a file in the paid files directory."""
+    return RESOURCES.get(resource_id) or file_resource(resource_id, _file_settings)
+
+
+def _all_resources() -> dict[str, dict[str, Any]]:
+    files = {resource["id"]: resource for resource in list_file_resources(_file_settings)}
+    return {**files, **RESOURCES}
+
+
+async def close_store() -> None:
+    """Settle queued payments, write buffered settlements and close the store; called at shutdown."""
+    await _settlements.close()
+    if _chain is not None:
+        await _chain.close()
+    _store.close()
+
+
 def _build_payment_required(resource_id: str, base_url: str) -> PaymentRequired:
     """Build x402 v2 PaymentRequired response."""
-    resource = RESOURCES.get(resource_id)
+    resource = _get_resource(resource_id)
     if not resource:
         raise HTTPException(status_code=404, detail="Resource not found")
 
@@ -172,15 +256,111 @@ def _build_payment_required(resource_id: str, base_url: str) -> PaymentRequired:
                 payTo=RECEIVER_ADDRESS,
                 maxTimeoutSeconds=60,
                 extra={"name": "USDC", "version": "2"},
-            )
+            ),
+            PaymentRequirements(
+                scheme=CHANNEL_SCHEME,
+                network=DEFAULT_NETWORK,
+                amount=resource["amount"],
+                asset=USDC_CONTRACT,
+                payTo=RECEIVER_ADDRESS,
+                maxTimeoutSeconds=60,
+                extra={
+                    "name": "USDC",
+                    "version": "2",
+                    "openChannel": f"{base_url}/channels/open",
+                    "minDeposit": str(_channel_settings.min_deposit),
+                },
+            ),
         ],
         extensions={},
     )
 
 
-def _verify_payment_payload(payload: dict[str, Any], requirements: dict[str, Any]) -> tuple[bool, str | None, str | None]:
+def _transaction_hash() -> str:
+    """Generate a mock transaction hash."""
+    return f"0x{uuid.uuid4().hex}{uuid.uuid4().hex[:32]}"
+
+
+def _scheme_of(payload: dict[str, Any]) -> str:
+    accepted = payload.get("accepted") if isinstance(payload, dict) else None
+    return accepted.get("scheme", "exact") if isinstance(accepted, dict) else "exact"
+
+
+def _redeem_voucher(payload: dict[str, Any], requirements: dict[str, Any]) -> tuple[bool, str | None, Channel | None]:
+    """Accept a channel voucher paying ``requirements["amount"]`` on top of the last one.
+
+    Returns: (is_valid, invalid_reason, channel)
+    """
+    if payload.get("x402Version") != X402_VERSION:
+        return False, "invalid_x402_version", None
+    voucher = payload.get("payload")
+    if not isinstance(voucher, dict) or not voucher.get("channelId"):
+        return False, "invalid_channel_payload", None
+    if not voucher.get("signature"):
+        return False, "invalid_signature", None
+    try:
+        cumulative = int(voucher.get("cumulativeAmount", ""))
+    except (TypeError, ValueError):
+        return False, "invalid_channel_payload", None
+
+    channel = _channels.get(voucher["channelId"])
+    if channel is not None and (
+        channel.pay_to != requirements["payTo"] or channel.network != requirements["network"]
+    ):
+        return False, "invalid_channel_recipient_mismatch", channel
+    channel, reason = _channels.redeem(
+        voucher["channelId"],
+        cumulative,
+        int(requirements["amount"]),
+        payer=voucher.get("from"),
+        signature=voucher.get("signature"),
+    )
+    return reason is None, reason, channel
+
+
+def _check_time_window(now: int, valid_after: int, valid_before: int) -> str | None:
+    """Reason an authorization is outside its time window at ``now``, if it is."""
+    if now < valid_after:
+        return "invalid_exact_evm_payload_authorization_valid_after"
+    if now > valid_before:
+        return "invalid_exact_evm_payload_authorization_valid_before"
+    return None
+
+
+def _verification_key(payload: dict[str, Any], requirements: dict[str, Any]) -> tuple[Any, ...] | None:
+    """Every input _verify_payment_payload reads, as a verify cache key.
+
+    Two payloads with the same key verify identically (given the same nonce
+    store and clock). None for payloads too malformed to have a key.
+    """
+    try:
+        inner = payload["payload"]
+        auth = inner["authorization"]
+        key = (
+            payload.get("x402Version"),
+            inner.get("signature"),
+            auth.get("from"),
+            auth.get("to"),
+            auth.get("value"),
+            auth.get("validAfter"),
+            auth.get("validBefore"),
+            auth.get("nonce"),
+            requirements.get("payTo"),
+            requirements.get("amount"),
+        )
+        hash(key)
+    except (KeyError, TypeError, AttributeError):
+        return None
+    return key
+
+
+def _verify_payment_payload(payload: dict[str, Any], requirements: dict[str, Any], now: int | None = None, remember: bool = True) -> tuple[bool, str | None, str | None]:
     """Verify payment payload against requirements.
 
+    ``now`` (epoch seconds) is the clock for the time-window check; batches
+    pass one snapshot for every item. With ``remember`` a valid payload is
+    added to the verify cache for a later settle.
+
     Returns: (is_valid, invalid_reason, payer_address)
     """
     try:
@@ -209,49 +389,81 @@ def _verify_payment_payload(payload: dict[str, Any], requirements: dict[str, Any
 
         # Check nonce not already used
         nonce = auth.get("nonce", "")
-        if nonce in _nonces:
+        if _store.has_nonce(nonce):
             return False, "nonce_already_used", payer
 
         # Check time window
-        now = int(datetime.now(timezone.utc).timestamp())
+        if now is None:
+            now = int(datetime.now(UTC).timestamp())
         valid_after = int(auth.get("validAfter", "0"))
         valid_before = int(auth.get("validBefore", str(now + 300)))
 
-        if now < valid_after:
-            return False, "invalid_exact_evm_payload_authorization_valid_after", payer
-        if now > valid_before:
-            return False, "invalid_exact_evm_payload_authorization_valid_before", payer
+        window_error = _check_time_window(now, valid_after, valid_before)
+        if window_error is not None:
+            return False, window_error, payer
 
+        if remember and _verify_cache.enabled:
+            key = _verification_key(payload, requirements)
+            if key is not None:
+                _verify_cache.put(key, VerifiedPayment(payer, nonce, valid_after, valid_before), now)
         return True, None, payer
 
     except Exception as e:
         return False, f"unexpected_verify_error: {e}", None
 
 
-def _settle_payment(payload: dict[str, Any], requirements: dict[str, Any]) -> tuple[bool, str | None, str | None, str | None]:
+def _settle_payment(payload: dict[str, Any], requirements: dict[str, Any], now: int | None = None, defer: bool = False, resource_id: str | None = None) -> tuple[bool, str | None, str | None, str | None]:
     """Settle payment on chain (mock).
 
+    A payload verified earlier is taken from the verify cache, and only its
+    nonce and time window are checked again. With ``defer`` the nonce is
+    still claimed here, but the settlement is queued for the background
+    worker and stays pending until its batch lands.
+
     Returns: (success, error_reason, payer, transaction_hash)
     """
-    is_valid, invalid_reason, payer = _verify_payment_payload(payload, requirements)
-
-    if not is_valid:
-        return False, invalid_reason, payer, None
+    if now is None:
+        now = int(datetime.now(UTC).timestamp())
+    key = _verification_key(payload, requirements) if _verify_cache.enabled else None
+    verified = _verify_cache.get(key, now) if key is not None else None
+
+    if verified is not None:
+        payer, nonce, valid_before = verified.payer, verified.nonce, verified.valid_before
+        if _store.has_nonce(nonce):
+            return False, "nonce_already_used", payer, None
+        window_error = _check_time_window(now, verified.valid_after, valid_before)
+        if window_error is not None:
+            return False, window_error, payer, None
+    else:
+        is_valid, invalid_reason, payer = _verify_payment_payload(
+            payload, requirements, now, remember=False
+        )
+        if not is_valid:
+            return False, invalid_reason, payer, None
+        auth = payload.get("payload", {}).get("authorization", {})
+        nonce = auth.get("nonce", "")
+        valid_before = int(auth.get("validBefore", str(now + 300)))
 
-    # Mark nonce as used
-    nonce = payload.get("payload", {}).get("authorization", {}).get("nonce", "")
-    _nonces.add(nonce)
+    # Mark nonce as used until the authorization expires; a concurrent settle may have won
+    if not _store.claim_nonce(nonce, valid_before):
+        return False, "nonce_already_used", payer, None
+    if key is not None:
+        _verify_cache.discard(key)
 
-    # Generate mock transaction hash
-    tx_hash = f"0x{uuid.uuid4().hex}{uuid.uuid4().hex[:32]}"
+    tx_hash = _transaction_hash()
 
-    # Store settlement
-    _settlements[tx_hash] = {
+    settlement = {
         "payer": payer,
         "amount": requirements.get("amount"),
         "network": requirements.get("network"),
-        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "timestamp": datetime.now(UTC).isoformat(),
     }
+    if defer:
+        if resource_id is not None:
+            settlement["resource"] = resource_id  # its receipt is issued once settled
+        _settlements.submit(tx_hash, settlement)
+    else:
+        _record_settlement(tx_hash, settlement)
 
     return True, None, payer, tx_hash
 
@@ -270,7 +482,7 @@ async def get_info() -> dict[str, Any]:
         "receiver": RECEIVER_ADDRESS,
         "supportedNetworks": [DEFAULT_NETWORK, "eip155:8453"],  # Base Sepolia, Base Mainnet
         "supportedAssets": [USDC_CONTRACT],
-        "resources": list(RESOURCES.keys()),
+        "resources": list(_all_resources()),
     }
 
 
@@ -289,6 +501,11 @@ async def get_supported() -> dict[str, Any]:
                 "scheme": "exact",
                 "network": "eip155:8453",
             },
+            {
+                "x402Version": X402_VERSION,
+                "scheme": CHANNEL_SCHEME,
+                "network": DEFAULT_NETWORK,
+            },
         ],
         "extensions": [],
         "signers": {
@@ -302,25 +519,101 @@ async def get_supported() -> dict[str, Any]:
 # ============================================================================
 
 
+def _deliver(
+    request: Request,
+    response: Response,
+    resource_id: str,
+    resource: dict[str, Any],
+    settlement: dict[str, Any],
+) -> Any:
+    """Return a paid resource, with its settlement in X-PAYMENT-RESPONSE.
+
+    File resources are streamed and may be requested by range; built-in ones
+    are returned inline with the settlement.
+    """
+    payment_response = base64.b64encode(
+        json.dumps({"success": True, **settlement}).encode()
+    ).decode("ascii")
+    if "file" in resource:
+        return paid_file_response(
+            resource["file"], request.headers, {"X-PAYMENT-RESPONSE": payment_response}
+        )
+    response.headers["X-PAYMENT-RESPONSE"] = payment_response
+    return {
+        "success": True,
+        "resource_id": resource_id,
+        "title": resource["title"],
+        "content": resource["content"],
+        "settlement": settlement,
+    }
+
+
+def _issue_receipt(
+    settlement: dict[str, Any],
+    resource_id: str,
+    resource: dict[str, Any],
+    transaction: str | None = None,
+) -> None:
+    """Add an access receipt to a settlement; for files it is a download entitlement."""
+    ttl_s = _file_settings.entitlement_ttl_s if "file" in resource else _receipts.ttl_s
+    if ttl_s > 0:
+        settlement["receipt"], settlement["receiptExpiresAt"] = _receipts.issue(
+            resource_id,
+            settlement.get("payer"),
+            transaction or settlement.get("transaction"),
+            ttl_s,
+        )
+
+
 @router.get("/resource/{resource_id}")
 async def get_resource(
     request: Request,
+    response: Response,
     resource_id: str,
     x_payment: str | None = Header(None, alias="X-PAYMENT"),
+    x_payment_receipt: str | None = Header(None, alias="X-PAYMENT-RECEIPT"),
 ) -> Any:
     """Access a protected resource.
 
     Returns 402 with PaymentRequired if no valid payment.
-    Returns resource content if payment is valid.
+    Returns resource content if payment is valid. In deferred settlement mode
+    the content is returned as soon as the payment verifies, with the
+    settlement still pending; poll /settlements/{transaction} for its status.
+    A ``channel`` scheme voucher is checked against its channel and settles
+    nothing until the channel is closed.
+
+    A settled exact payment also earns an access receipt, returned in the
+    X-PAYMENT-RESPONSE header and the settlement; a deferred one earns it
+    when it settles, from /settlements/{transaction}. Until it expires, sending
+    it back in X-PAYMENT-RECEIPT grants the resource without a new payment.
+
+    File resources are streamed rather than returned inline, and support
+    Range and conditional requests. Any payment for a file earns a receipt
+    that covers resumed downloads for ``APS_X402_FILES_ENTITLEMENT_TTL_S``.
     """
-    if resource_id not in RESOURCES:
+    resource = _get_resource(resource_id)
+    if resource is None:
         raise HTTPException(status_code=404, detail="Resource not found")
 
     base_url = str(request.base_url).rstrip("/")
 
+    receipt_error = None
+    if x_payment_receipt:
+        claims, receipt_error = _receipts.check(x_payment_receipt, resource_id)
+        if claims is not None:
+            settlement = {
+                "transaction": claims["transaction"],
+                "network": DEFAULT_NETWORK,
+                "payer": claims["payer"],
+                "receiptExpiresAt": claims["exp"],
+            }
+            return _deliver(request, response, resource_id, resource, settlement)
+
     # If no payment header, return 402
     if not x_payment:
         payment_required = _build_payment_required(resource_id, base_url)
+        if receipt_error is not None:
+            payment_required.error = receipt_error
         return Response(
             status_code=402,
             content=payment_required.model_dump_json(),
@@ -337,64 +630,147 @@ async def get_resource(
     requirements = {
         "scheme": "exact",
         "network": DEFAULT_NETWORK,
-        "amount": RESOURCES[resource_id]["amount"],
+        "amount": resource["amount"],
         "asset": USDC_CONTRACT,
         "payTo": RECEIVER_ADDRESS,
     }
 
-    success, error, payer, tx_hash = _settle_payment(payload, requirements)
+    if _scheme_of(payload) == CHANNEL_SCHEME:
+        requirements["scheme"] = CHANNEL_SCHEME
+        success, error, channel = _redeem_voucher(payload, requirements)
+        if not success:
+            raise HTTPException(status_code=402, detail=error or "Payment failed")
+        settlement = {
+            "scheme": CHANNEL_SCHEME,
+            "channelId": channel.channel_id,
+            "network": channel.network,
+            "payer": channel.payer,
+            "cumulativeAmount": str(channel.spent),
+            "remaining": str(channel.deposit - channel.spent),
+        }
+        # Vouchers are cheap already; only a download needs an entitlement to resume
+        if "file" in resource:
+            _issue_receipt(settlement, resource_id, resource)
+        return _deliver(request, response, resource_id, resource, settlement)
+
+    defer = _settlement_settings.mode == "deferred"
+    success, error, payer, tx_hash = _settle_payment(
+        payload, requirements, defer=defer, resource_id=resource_id
+    )
 
     if not success:
         raise HTTPException(status_code=402, detail=error or "Payment failed")
 
-    # Return resource with settlement info
-    resource = RESOURCES[resource_id]
-    return {
-        "success": True,
-        "resource_id": resource_id,
-        "title": resource["title"],
-        "content": resource["content"],
-        "settlement": {
-            "transaction": tx_hash,
-            "network": DEFAULT_NETWORK,
-            "payer": payer,
-        },
+    settlement = {
+        "transaction": tx_hash,
+        "network": DEFAULT_NETWORK,
+        "payer": payer,
+        "status": "settled",
     }
+    if not defer:
+        _issue_receipt(settlement, resource_id, resource)
+    elif _settlements.pending(tx_hash):
+        # No receipt until the payment settles; it then appears in /settlements/{tx}
+        settlement["status"] = "pending"
+    else:
+        # Recorded inline, with its receipt, because the settlement queue was full
+        recorded = _store.get_settlement(tx_hash) or {}
+        settlement.update(
+            {k: recorded[k] for k in ("receipt", "receiptExpiresAt") if k in recorded}
+        )
+    return _deliver(request, response, resource_id, resource, settlement)
 
 
 # ============================================================================
-# Facilitator Endpoints
+# Payment Channels
 # ============================================================================
 
 
-@router.post("/verify")
-async def verify_payment(request: VerifyRequest) -> dict[str, Any]:
-    """Verify payment authorization without settling."""
-    is_valid, invalid_reason, payer = _verify_payment_payload(
-        request.paymentPayload,
-        request.paymentRequirements,
+@router.post("/channels/open")
+async def open_channel(request: OpenChannelRequest) -> dict[str, Any]:
+    """Open a payment channel funded by an exact-scheme payment of the deposit.
+
+    The deposit is settled like any exact payment and must be at least
+    ``minDeposit``. Resources are then paid with ``channel`` vouchers.
+    """
+    requirements = {
+        "scheme": "exact",
+        "network": DEFAULT_NETWORK,
+        "amount": str(_channel_settings.min_deposit),
+        "asset": USDC_CONTRACT,
+        "payTo": RECEIVER_ADDRESS,
+    }
+    success, error, payer, tx_hash = _settle_payment(request.paymentPayload, requirements)
+    if not success:
+        raise HTTPException(status_code=402, detail=error or "Deposit payment failed")
+    deposit = int(request.paymentPayload["payload"]["authorization"]["value"])
+    channel = _channels.open(payer, RECEIVER_ADDRESS, USDC_CONTRACT, DEFAULT_NETWORK, deposit, tx_hash)
+    return channel.to_dict()
+
+
+@router.get("/channels/{channel_id}")
+async def get_channel(channel_id: str) -> dict[str, Any]:
+    """Deposit, amount spent and status of a payment channel."""
+    channel = _channels.get(channel_id)
+    if channel is None:
+        raise HTTPException(status_code=404, detail="Channel not found")
+    return channel.to_dict()
+
+
+@router.post("/channels/{channel_id}/close")
+async def close_channel(channel_id: str) -> dict[str, Any]:
+    """Close a channel, settling its latest voucher in one transaction.
+
+    The payee receives the cumulative amount of the last accepted voucher and
+    the rest of the deposit is refunded to the payer.
+    """
+    channel = _channels.get(channel_id)
+    if channel is None:
+        raise HTTPException(status_code=404, detail="Channel not found")
+    if channel.closed:
+        raise HTTPException(status_code=409, detail="Channel already closed")
+    tx_hash = _transaction_hash()
+    _record_settlement(
+        tx_hash,
+        {
+            "payer": channel.payer,
+            "amount": str(channel.spent),
+            "network": channel.network,
+            "timestamp": datetime.now(UTC).isoformat(),
+            "channelId": channel.channel_id,
+            "refund": str(channel.deposit - channel.spent),
+            "vouchers": channel.vouchers,
+        },
     )
+    _channels.close(channel_id, tx_hash)
+    return channel.to_dict()
+
 
+# ============================================================================
+# Facilitator Endpoints
+# ============================================================================
+
+
+def _verify_response(is_valid: bool, invalid_reason: str | None, payer: str | None) -> dict[str, Any]:
     if is_valid:
         return {"isValid": True, "payer": payer}
     else:
         return {"isValid": False, "invalidReason": invalid_reason, "payer": payer}
 
 
-@router.post("/settle")
-async def settle_payment_endpoint(request: SettleRequest) -> dict[str, Any]:
-    """Settle payment on blockchain."""
-    success, error, payer, tx_hash = _settle_payment(
-        request.paymentPayload,
-        request.paymentRequirements,
-    )
-
+def _settle_response(
+    requirements: dict[str, Any],
+    success: bool,
+    error: str | None,
+    payer: str | None,
+    tx_hash: str | None,
+) -> dict[str, Any]:
     if success:
         return {
             "success": True,
             "payer": payer,
             "transaction": tx_hash,
-            "network": request.paymentRequirements.get("network", DEFAULT_NETWORK),
+            "network": requirements.get("network", DEFAULT_NETWORK),
         }
     else:
         return {
@@ -402,10 +778,118 @@ async def settle_payment_endpoint(request: SettleRequest) -> dict[str, Any]:
             "errorReason": error,
             "payer": payer,
             "transaction": "",
-            "network": request.paymentRequirements.get("network", DEFAULT_NETWORK),
+            "network": requirements.get("network", DEFAULT_NETWORK),
         }
 
 
+def _nonce_of(payload: dict[str, Any]) -> str | None:
+    try:
+        return payload["payload"]["authorization"]["nonce"]
+    except (KeyError, TypeError):
+        # Malformed payloads are reported by verification itself
+        return None
+
+
+def _payer_of(payload: dict[str, Any]) -> str | None:
+    return payload["payload"]["authorization"].get("from")
+
+
+def _check_batch_size(items: list[Any]) -> None:
+    if not items:
+        raise HTTPException(status_code=400, detail="Batch is empty")
+    if len(items) > MAX_BATCH_ITEMS:
+        raise HTTPException(status_code=400, detail=f"Batch exceeds {MAX_BATCH_ITEMS} items")
+
+
+@router.post("/verify")
+async def verify_payment(request: VerifyRequest) -> dict[str, Any]:
+    """Verify payment authorization without settling."""
+    return _verify_response(
+        *_verify_payment_payload(request.paymentPayload, request.paymentRequirements)
+    )
+
+
+@router.post("/settle")
+async def settle_payment_endpoint(request: SettleRequest) -> dict[str, Any]:
+    """Settle payment on blockchain."""
+    return _settle_response(
+        request.paymentRequirements,
+        *_settle_payment(request.paymentPayload, request.paymentRequirements),
+    )
+
+
+@router.post("/verify/batch")
+async def verify_payment_batch(requests: list[VerifyRequest]) -> dict[str, Any]:
+    """Verify many payments in request order; results are in the same order.
+
+    Every item is checked against one clock snapshot. An item whose nonce
+    was already verified by an earlier item of the batch is invalid with
+    ``duplicate_nonce_in_batch``, since at most one of them could settle.
+    Otherwise each result is what ``/verify`` would return.
+    """
+    _check_batch_size(requests)
+    now = int(datetime.now(UTC).timestamp())
+    verified: set[str] = set()
+    results = []
+    for request in requests:
+        nonce = _nonce_of(request.paymentPayload)
+        if nonce is not None and nonce in verified:
+            payer = _payer_of(request.paymentPayload)
+            results.append(_verify_response(False, "duplicate_nonce_in_batch", payer))
+            continue
+        is_valid, invalid_reason, payer = _verify_payment_payload(
+            request.paymentPayload, request.paymentRequirements, now
+        )
+        if is_valid and nonce is not None:
+            verified.add(nonce)
+        results.append(_verify_response(is_valid, invalid_reason, payer))
+    return {"results": results}
+
+
+@router.post("/settle/batch")
+async def settle_payment_batch(requests: list[SettleRequest]) -> dict[str, Any]:
+    """Settle many payments in request order; results are in the same order.
+
+    Items are settled one after another against one clock snapshot, exactly
+    as separate ``/settle`` calls would be: a nonce claimed by an earlier
+    item makes a later one fail with ``nonce_already_used``.
+    """
+    _check_batch_size(requests)
+    now = int(datetime.now(UTC).timestamp())
+    results = [
+        _settle_response(
+            request.paymentRequirements,
+            *_settle_payment(request.paymentPayload, request.paymentRequirements, now),
+        )
+        for request in requests
+    ]
+    return {"results": results}
+
+
+@router.get("/settlements/{tx_hash}")
+async def get_settlement_status(tx_hash: str) -> dict[str, Any]:
+    """Status of a settlement: ``pending`` until its batch lands, then ``settled``.
+
+    With the chain simulator on, ``chain`` tracks the transaction from the
+    mempool through inclusion to confirmation, or null before it is broadcast.
+    """
+    settlement = _settlements.pending(tx_hash) or _store.get_settlement(tx_hash)
+    if settlement is None:
+        raise HTTPException(status_code=404, detail="Settlement not found")
+    response = {"transaction": tx_hash, "status": "settled", **settlement}
+    if _chain is not None:
+        response["chain"] = _chain.status(tx_hash)
+    return response
+
+
+@router.get("/chain")
+async def get_chain() -> dict[str, Any]:
+    """Head, mempool and reorg metrics of the simulated chain."""
+    if _chain is None:
+        return {"enabled": False}
+    return {"enabled": True, **_chain.stats()}
+
+
 # ============================================================================
 # Discovery API (Bazaar)
 # ============================================================================
@@ -422,7 +906,7 @@ async def discover_resources(
     base_url = str(request.base_url).rstrip("/")
     items = []
 
-    for resource_id, resource in RESOURCES.items():
+    for resource_id, resource in _all_resources().items():
         items.append({
             "resource": f"{base_url}/resource/{resource_id}",
             "type": "http",
@@ -438,7 +922,7 @@ async def discover_resources(
                     "extra": {"name": "USDC", "version": "2"},
                 }
             ],
-            "lastUpdated": int(datetime.now(timezone.utc).timestamp()),
+            "lastUpdated": int(datetime.now(UTC).timestamp()),
             "metadata": {
                 "category": "data",
                 "provider": "APS Mock",
@@ -466,23 +950,44 @@ async def discover_resources(
 async def reset_test_state() -> dict[str, str]:
     """Reset server state for testing."""
     _payments.clear()
-    _nonces.clear()
-    _settlements.clear()
+    _store.clear()
+    _verify_cache.clear()
+    _channels.clear()
+    _receipts.clear()
+    if _chain is not None:
+        _chain.clear()
     return {"status": "reset"}
 
 
+@router.get("/test/store")
+async def get_store_stats() -> dict[str, Any]:
+    """Backend, size and eviction metrics of the nonce and settlement store."""
+    return {
+        **_store.stats(),
+        "verify_cache": _verify_cache.stats(),
+        "settlement_queue": {"mode": _settlement_settings.mode, **_settlements.stats()},
+        "channels": _channels.stats(),
+        "receipts": _receipts.stats(),
+    }
+
+
 @router.post("/test/generate-payment")
 async def generate_test_payment(
     request: Request,
     resource_id: str,
+    amount: str | None = None,
 ) -> dict[str, Any]:
-    """Generate a valid x402 v2 test payment for a resource."""
-    if resource_id not in RESOURCES:
+    """Generate a valid x402 v2 test payment for a resource.
+
+    ``amount`` overrides the authorized value, e.g. for a channel deposit.
+    """
+    resource = _get_resource(resource_id)
+    if resource is None:
         raise HTTPException(status_code=404, detail="Resource not found")
 
     base_url = str(request.base_url).rstrip("/")
-    resource = RESOURCES[resource_id]
-    now = int(datetime.now(timezone.utc).timestamp())
+    value = amount or resource["amount"]
+    now = int(datetime.now(UTC).timestamp())
     nonce = f"0x{uuid.uuid4().hex}{uuid.uuid4().hex[:32]}"
 
     # Generate mock payment payload
@@ -507,7 +1012,7 @@ async def generate_test_payment(
             "authorization": {
                 "from": "0x857b06519E91e3A54538791bDbb0E22373e36b66",
                 "to": RECEIVER_ADDRESS,
-                "value": resource["amount"],
+                "value": value,
                 "validAfter": str(now - 60),
                 "validBefore": str(now + 300),
                 "nonce": nonce,
@@ -521,3 +1026,55 @@ async def generate_test_payment(
         "payment_payload": payment_payload,
         "instructions": "Add as X-PAYMENT header (JSON string) to access the resource",
     }
+
+
+@router.post("/test/generate-voucher")
+async def generate_test_voucher(
+    request: Request,
+    resource_id: str,
+    channel_id: str,
+    cumulative_amount: str,
+) -> dict[str, Any]:
+    """Generate a channel voucher for a resource, signed by the channel's payer."""
+    resource = _get_resource(resource_id)
+    if resource is None:
+        raise HTTPException(status_code=404, detail="Resource not found")
+    channel = _channels.get(channel_id)
+    if channel is None:
+        raise HTTPException(status_code=404, detail="Channel not found")
+    try:
+        cumulative = int(cumulative_amount)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="cumulative_amount must be an integer")
+
+    base_url = str(request.base_url).rstrip("/")
+    voucher_payload = {
+        "x402Version": X402_VERSION,
+        "resource": {
+            "url": f"{base_url}/resource/{resource_id}",
+            "description": resource["description"],
+            "mimeType": resource["mimeType"],
+        },
+        "accepted": {
+            "scheme": CHANNEL_SCHEME,
+            "network": DEFAULT_NETWORK,
+            "amount": resource["amount"],
+            "asset": USDC_CONTRACT,
+            "payTo": RECEIVER_ADDRESS,
+            "maxTimeoutSeconds": 60,
+            "extra": {"name": "USDC", "version": "2"},
+        },
+        "payload": {
+            "signature": voucher_signature(channel_id, cumulative, channel.payer),
+            "from": channel.payer,
+            "channelId": channel_id,
+            "cumulativeAmount": str(cumulative),
+        },
+        "extensions": {},
+    }
+
+    return {
+        "x_payment_header": json.dumps(voucher_payload),
+        "payment_payload": voucher_payload,
+        "instructions": "Add as X-PAYMENT header; raise cumulativeAmount by the price on every request",
+    }
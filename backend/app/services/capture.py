@@ -0,0 +1,348 @@
+"""Exchange Capture - Raw request/response recordings of inspector runs.
+
+With capture enabled, every request the inspector sends is recorded with its
+response (or error) and phase timings in one file per run, so a disputed
+failure can be examined byte for byte afterwards.
+
+Capture files are append-only sequences of length-prefixed frames, each frame
+one exchange compressed on its own with zlib and a preset dictionary of common
+header names and JSON keys (which is what makes small frames compress well).
+Closing the writer appends an index frame and a fixed-size trailer pointing at
+it, so a reader finds any exchange with one seek and decompresses only that
+frame. A file whose writer never closed has no trailer; its frames are still
+found by walking the length prefixes.
+
+``CaptureWriter.record`` only queues the exchange: encoding, compression and
+file writes happen in a background task, off the event loop.
+"""
+
+import asyncio
+import base64
+import json
+import re
+import struct
+import time
+import zlib
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, BinaryIO
+
+import httpx
+from pydantic import BaseModel
+from pydantic_settings import BaseSettings, SettingsConfigDict
+
+MAGIC = b"APSCAP\x00\x01"
+TRAILER_MAGIC = b"APSIDX\x00\x01"
+SUFFIX = ".apscap"
+
+_FRAME = struct.Struct(">I")  # compressed frame length
+_TRAILER = struct.Struct(">Q8s")  # index frame offset, TRAILER_MAGIC
+
+# Frames written per trip to the writer thread
+_BATCH = 256
+
+# Run ids name capture files, so nothing else may reach the filesystem
+_RUN_ID = re.compile(r"run_[0-9a-f]{12}")
+
+# Preset dictionary for frame compression; changing it requires a new MAGIC
+_ZDICT = (
+    b'"test_id": "kind": "initial" "retry" "hedge" "concurrent" "attempt": '
+    b'"method": "GET" "POST" "PUT" "DELETE" "url": "http://localhost '
+    b'"https:// "request": "response": "status_code": "headers": "body": '
+    b'"body_base64": "timings": "queue_ms": "connect_ms": "tls_ms": "send_ms": '
+    b'"wait_ms": "receive_ms": "total_ms": "ttfb_ms": "new_connection": '
+    b'"duration_ms": "finished_at": "error": null, true, false, '
+    b'"host": "user-agent": "python-httpx/ "accept": "*/*" '
+    b'"accept-encoding": "gzip, deflate" "connection": "keep-alive" '
+    b'"content-type": "application/json" "content-length": "date": '
+    b'"server": "uvicorn" "idempotency-key": "x-payment": '
+    b'"x-payment-response": "checkout_id" "session_id" "line_items" '
+    b'"payment_handlers" "status": "currency": "amount": "created_at" '
+)
+
+
+class CaptureSettings(BaseSettings):
+    """Capture configuration, read from ``APS_INSPECTOR_CAPTURE_*`` environment variables."""
+
+    model_config = SettingsConfigDict(env_prefix="APS_INSPECTOR_CAPTURE_")
+
+    dir: Path = Path("captures")
+    level: int = 6  # zlib compression level
+    max_queue: int = 10000  # exchanges waiting to be written before new ones are dropped
+
+
+class CaptureError(Exception):
+    """A capture file is missing, malformed or has no such exchange."""
+
+
+@dataclass(slots=True)
+class CapturedExchange:
+    """One request the inspector sent, as handed to ``CaptureWriter.record``.
+
+    ``method``, ``url``, ``headers`` and ``content`` describe the request as
+    the test built it; when there is a ``response`` the request it carries
+    (with the client's default headers) is recorded instead.
+    """
+
+    test_id: str
+    kind: str  # "initial", "retry", "hedge" or "concurrent"
+    attempt: int
+    method: str
+    url: str
+    headers: dict[str, str]
+    content: bytes | None
+    response: httpx.Response | None
+    timings: BaseModel | None
+    duration_ms: float
+    error: str | None = None
+    finished_at: float = 0.0
+
+
+def capture_path(run_id: str, settings: CaptureSettings | None = None) -> Path:
+    """Path of a run's capture file."""
+    if not _RUN_ID.fullmatch(run_id):
+        raise CaptureError(f"Invalid run id: {run_id}")
+    return (settings or CaptureSettings()).dir / f"{run_id}{SUFFIX}"
+
+
+def _body(content: bytes) -> dict[str, str]:
+    try:
+        return {"body": content.decode("utf-8")}
+    except UnicodeDecodeError:
+        return {"body_base64": base64.b64encode(content).decode("ascii")}
+
+
+def _encode(exchange: CapturedExchange) -> dict[str, Any]:
+    response = exchange.response
+    if response is not None:
+        sent = response.request
+        request = {
+            "method": sent.method,
+            "url": str(sent.url),
+            "headers": sent.headers.multi_items(),
+            **_body(sent.content),
+        }
+        received = {
+            "status_code": response.status_code,
+            "headers": response.headers.multi_items(),
+            **_body(response.content),
+        }
+    else:
+        request = {
+            "method": exchange.method,
+            "url": exchange.url,
+            "headers": list(exchange.headers.items()),
+            **_body(exchange.content or b""),
+        }
+        received = None
+    return {
+        "test_id": exchange.test_id,
+        "kind": exchange.kind,
+        "attempt": exchange.attempt,
+        "request": request,
+        "response": received,
+        "timings": exchange.timings.model_dump() if exchange.timings is not None else None,
+        "duration_ms": exchange.duration_ms,
+        "finished_at": exchange.finished_at,
+        "error": exchange.error,
+    }
+
+
+def _compress(data: bytes, level: int) -> bytes:
+    compressor = zlib.compressobj(level, zdict=_ZDICT)
+    return compressor.compress(data) + compressor.flush()
+
+
+def _decompress(data: bytes) -> bytes:
+    decompressor = zlib.decompressobj(zdict=_ZDICT)
+    return decompressor.decompress(data) + decompressor.flush()
+
+
+class CaptureWriter:
+    """Writes one run's exchanges to a capture file from a background task.
+
+    Use as an async context manager. ``record`` never blocks: when
+    ``max_queue`` exchanges are already waiting, further ones are counted in
+    ``dropped`` rather than slowing the run down.
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        level: int = 6,
+        max_queue: int = 10000,
+    ) -> None:
+        self.path = path
+        self.level = level
+        self.written = 0
+        self.dropped = 0
+        self._queue: asyncio.Queue[CapturedExchange | None] = asyncio.Queue(max_queue)
+        self._file: BinaryIO | None = None
+        self._offset = 0
+        self._index: list[dict[str, Any]] = []
+        self._writer: asyncio.Task[None] | None = None
+
+    async def __aenter__(self) -> "CaptureWriter":
+        await asyncio.to_thread(self._open)
+        self._writer = asyncio.create_task(self._drain())
+        return self
+
+    async def __aexit__(self, *exc_info: object) -> None:
+        await self.close()
+
+    def record(self, exchange: CapturedExchange) -> None:
+        """Queue an exchange to be written."""
+        exchange.finished_at = time.time()
+        try:
+            self._queue.put_nowait(exchange)
+        except asyncio.QueueFull:
+            self.dropped += 1
+
+    async def close(self) -> None:
+        """Write everything queued, then the index, and close the file."""
+        if self._writer is None:
+            return
+        writer, self._writer = self._writer, None
+        # The sentinel must get in even when the queue is full
+        await self._queue.put(None)
+        try:
+            await writer
+        finally:
+            await asyncio.to_thread(self._finish)
+
+    def _open(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._file = self.path.open("xb")
+        self._file.write(MAGIC)
+        self._offset = len(MAGIC)
+
+    async def _drain(self) -> None:
+        while True:
+            batch = [await self._queue.get()]
+            while len(batch) < _BATCH and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+            done = batch[-1] is None
+            exchanges = [e for e in batch if e is not None]
+            if exchanges:
+                await asyncio.to_thread(self._write, exchanges)
+            if done:
+                return
+
+    def _frame(self, data: bytes) -> int:
+        """Append one compressed frame; return its offset."""
+        payload = _compress(data, self.level)
+        offset = self._offset
+        self._file.write(_FRAME.pack(len(payload)) + payload)
+        self._offset += _FRAME.size + len(payload)
+        return offset
+
+    def _write(self, exchanges: list[CapturedExchange]) -> None:
+        for exchange in exchanges:
+            response = exchange.response
+            offset = self._frame(json.dumps(_encode(exchange)).encode())
+            self._index.append(
+                {
+                    "seq": len(self._index),
+                    "offset": offset,
+                    "test_id": exchange.test_id,
+                    "kind": exchange.kind,
+                    "attempt": exchange.attempt,
+                    "method": exchange.method,
+                    "url": exchange.url,
+                    "status_code": response.status_code if response is not None else None,
+                    "error": exchange.error,
+                }
+            )
+        self.written += len(exchanges)
+        self._file.flush()
+
+    def _finish(self) -> None:
+        if self._file is None:
+            return
+        index = {"exchanges": self._index, "dropped": self.dropped}
+        offset = self._frame(json.dumps(index).encode())
+        self._file.write(_TRAILER.pack(offset, TRAILER_MAGIC))
+        self._file.close()
+        self._file = None
+
+
+class CaptureReader:
+    """Random access to the exchanges in a capture file."""
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        try:
+            self._file = path.open("rb")
+        except FileNotFoundError:
+            raise CaptureError(f"No capture file {path.name}") from None
+        if self._file.read(len(MAGIC)) != MAGIC:
+            self._file.close()
+            raise CaptureError(f"{path.name} is not a capture file")
+        self.complete, self.dropped, self.exchanges = self._load_index()
+
+    def __enter__(self) -> "CaptureReader":
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self._file.close()
+
+    def _read_frame(self, offset: int) -> bytes | None:
+        """Decompress the frame at ``offset``, or None past the last whole frame."""
+        self._file.seek(offset)
+        prefix = self._file.read(_FRAME.size)
+        if len(prefix) < _FRAME.size:
+            return None
+        (length,) = _FRAME.unpack(prefix)
+        payload = self._file.read(length)
+        if len(payload) < length:
+            return None
+        try:
+            return _decompress(payload)
+        except zlib.error:
+            return None
+
+    def _load_index(self) -> tuple[bool, int, list[dict[str, Any]]]:
+        size = self._file.seek(0, 2)
+        if size >= len(MAGIC) + _TRAILER.size:
+            self._file.seek(size - _TRAILER.size)
+            offset, magic = _TRAILER.unpack(self._file.read(_TRAILER.size))
+            data = self._read_frame(offset) if magic == TRAILER_MAGIC else None
+            if data is not None:
+                index = json.loads(data)
+                return True, index["dropped"], index["exchanges"]
+        return False, 0, self._scan()
+
+    def _scan(self) -> list[dict[str, Any]]:
+        """Rebuild the index of an unclosed file by walking its frames."""
+        exchanges = []
+        offset = len(MAGIC)
+        while (data := self._read_frame(offset)) is not None:
+            exchange = json.loads(data)
+            response = exchange["response"]
+            exchanges.append(
+                {
+                    "seq": len(exchanges),
+                    "offset": offset,
+                    "test_id": exchange["test_id"],
+                    "kind": exchange["kind"],
+                    "attempt": exchange["attempt"],
+                    "method": exchange["request"]["method"],
+                    "url": exchange["request"]["url"],
+                    "status_code": response["status_code"] if response else None,
+                    "error": exchange["error"],
+                }
+            )
+            offset = self._file.tell()
+        return exchanges
+
+    def get(self, seq: int) -> dict[str, Any]:
+        """Decompress and return one exchange."""
+        if not 0 <= seq < len(self.exchanges):
+            raise CaptureError(f"No exchange {seq} in {self.path.name}")
+        data = self._read_frame(self.exchanges[seq]["offset"])
+        if data is None:
+            raise CaptureError(f"Exchange {seq} in {self.path.name} is truncated")
+        return json.loads(data)
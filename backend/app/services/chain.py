@@ -0,0 +1,259 @@
+"""Chain Simulator - Block production, mempool and confirmations for the x402 mock.
+
+A real facilitator's settlement is a transaction that waits in the mempool,
+is included in a block, gains confirmations as further blocks are built on top
+and can be knocked out again by a reorg. ``ChainSimulator`` reproduces that
+timing in process so clients can be tested against it:
+
+- Submitted transactions wait in a FIFO mempool.
+- Every ``block_interval_s`` a block is mined with as many transactions as fit
+  in ``block_gas_limit`` at ``tx_gas`` each.
+- A transaction is ``confirmed`` once its block is ``confirmations`` deep.
+- With ``reorg_probability`` set, a block may first drop the last
+  ``reorg_depth`` blocks, returning their transactions to the mempool.
+
+Blocks are produced by a single asyncio task, so in-flight transactions cost
+only their bookkeeping, never a thread or a timer each. Transactions stay
+queryable while their block is among the last ``history`` blocks.
+"""
+
+import asyncio
+import hashlib
+import random
+import time
+from collections import deque
+from collections.abc import Callable
+from dataclasses import dataclass, field
+from typing import Any
+
+from pydantic_settings import BaseSettings, SettingsConfigDict
+
+GENESIS_HASH = "0x" + "00" * 32
+
+
+class ChainSettings(BaseSettings):
+    """Chain simulator configuration, read from ``APS_X402_CHAIN_*`` environment variables."""
+
+    model_config = SettingsConfigDict(env_prefix="APS_X402_CHAIN_")
+
+    enabled: bool = False
+    block_interval_s: float = 2.0
+    block_gas_limit: int = 30_000_000
+    tx_gas: int = 65_000  # roughly one USDC transferWithAuthorization
+    confirmations: int = 3  # depth at which a transaction counts as confirmed
+    reorg_probability: float = 0.0  # chance that a new block reorgs the chain first
+    reorg_depth: int = 1  # blocks dropped by a reorg
+    history: int = 10_000  # blocks whose transactions stay queryable
+    seed: int | None = None  # for reproducible reorgs
+
+
+@dataclass(slots=True)
+class Block:
+    """A mined block."""
+
+    number: int
+    hash: str
+    parent_hash: str
+    timestamp: float
+    transactions: list[str] = field(default_factory=list)
+    gas_used: int = 0
+
+
+@dataclass(slots=True)
+class _Transaction:
+    hash: str
+    submitted_at: float
+    block: Block | None = None
+    reorgs: int = 0
+
+
+class ChainSimulator:
+    """An in-process chain that mines submitted transactions on a timer.
+
+    The block producer starts with the first submission. ``mine`` builds one
+    block immediately, for driving the chain by hand.
+    """
+
+    def __init__(
+        self,
+        block_interval_s: float = 2.0,
+        block_gas_limit: int = 30_000_000,
+        tx_gas: int = 65_000,
+        confirmations: int = 3,
+        reorg_probability: float = 0.0,
+        reorg_depth: int = 1,
+        history: int = 10_000,
+        seed: int | None = None,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        if tx_gas > block_gas_limit:
+            raise ValueError("tx_gas exceeds block_gas_limit")
+        self.block_interval_s = block_interval_s
+        self.block_gas_limit = block_gas_limit
+        self.tx_gas = tx_gas
+        self.confirmations = confirmations
+        self.reorg_probability = reorg_probability
+        self.reorg_depth = reorg_depth
+        self.history = history
+        self.clock = clock
+        self._rng = random.Random(seed)
+        self._blocks: deque[Block] = deque([Block(0, GENESIS_HASH, GENESIS_HASH, clock())])
+        self._mempool: deque[_Transaction] = deque()
+        self._transactions: dict[str, _Transaction] = {}
+        self._producer: asyncio.Task[None] | None = None
+        self.reorgs = 0
+        self.reorged_transactions = 0
+        self._included = 0
+        self._inclusion_s = 0.0
+
+    @classmethod
+    def from_settings(cls, settings: ChainSettings | None = None) -> "ChainSimulator":
+        settings = settings or ChainSettings()
+        return cls(
+            block_interval_s=settings.block_interval_s,
+            block_gas_limit=settings.block_gas_limit,
+            tx_gas=settings.tx_gas,
+            confirmations=settings.confirmations,
+            reorg_probability=settings.reorg_probability,
+            reorg_depth=settings.reorg_depth,
+            history=settings.history,
+            seed=settings.seed,
+        )
+
+    @property
+    def head(self) -> Block:
+        return self._blocks[-1]
+
+    @property
+    def block_capacity(self) -> int:
+        """Transactions that fit in one block."""
+        return self.block_gas_limit // self.tx_gas
+
+    def submit(self, tx_hash: str) -> None:
+        """Add a transaction to the mempool."""
+        if self._producer is None:
+            self._producer = asyncio.get_running_loop().create_task(self._produce())
+        if tx_hash in self._transactions:
+            return
+        transaction = _Transaction(tx_hash, self.clock())
+        self._transactions[tx_hash] = transaction
+        self._mempool.append(transaction)
+
+    def status(self, tx_hash: str) -> dict[str, Any] | None:
+        """Where a transaction is: ``mempool``, ``included`` or ``confirmed``."""
+        transaction = self._transactions.get(tx_hash)
+        if transaction is None:
+            return None
+        block = transaction.block
+        if block is None:
+            return {"state": "mempool", "confirmations": 0, "reorgs": transaction.reorgs}
+        depth = self.head.number - block.number + 1
+        return {
+            "state": "confirmed" if depth >= self.confirmations else "included",
+            "blockNumber": block.number,
+            "blockHash": block.hash,
+            "confirmations": depth,
+            "reorgs": transaction.reorgs,
+        }
+
+    async def _produce(self) -> None:
+        # Scheduled against the loop clock so block times do not drift
+        loop = asyncio.get_running_loop()
+        next_block = loop.time()
+        while True:
+            next_block += self.block_interval_s
+            await asyncio.sleep(max(0.0, next_block - loop.time()))
+            self.mine()
+
+    def mine(self) -> Block:
+        """Mine one block, after a reorg if one is drawn."""
+        if self.reorg_probability and self._rng.random() < self.reorg_probability:
+            self.reorg(self.reorg_depth)
+        now = self.clock()
+        parent = self.head
+        transactions = [
+            self._mempool.popleft() for _ in range(min(self.block_capacity, len(self._mempool)))
+        ]
+        digest = hashlib.sha256(f"{parent.hash}:{parent.number + 1}:{now}".encode())
+        for transaction in transactions:
+            digest.update(transaction.hash.encode())
+        block = Block(
+            number=parent.number + 1,
+            hash="0x" + digest.hexdigest(),
+            parent_hash=parent.hash,
+            timestamp=now,
+            transactions=[t.hash for t in transactions],
+            gas_used=len(transactions) * self.tx_gas,
+        )
+        for transaction in transactions:
+            transaction.block = block
+            self._inclusion_s += now - transaction.submitted_at
+        self._included += len(transactions)
+        self._blocks.append(block)
+        if len(self._blocks) > self.history:
+            for tx_hash in self._blocks.popleft().transactions:
+                del self._transactions[tx_hash]
+        return block
+
+    def reorg(self, depth: int) -> int:
+        """Drop the last ``depth`` blocks, returning their transactions to the mempool.
+
+        The oldest retained block is never dropped. Returns transactions reorged.
+        """
+        depth = min(depth, len(self._blocks) - 1)
+        if depth < 1:
+            return 0
+        returned: list[_Transaction] = []
+        for _ in range(depth):
+            block = self._blocks.pop()
+            returned[:0] = [self._transactions[tx_hash] for tx_hash in block.transactions]
+        for transaction in returned:
+            # Counted again, from submission, when it is next included
+            self._inclusion_s -= transaction.block.timestamp - transaction.submitted_at
+            transaction.block = None
+            transaction.reorgs += 1
+        self._included -= len(returned)
+        # Back to the front of the mempool, ahead of newer transactions, in order
+        self._mempool.extendleft(reversed(returned))
+        self.reorgs += 1
+        self.reorged_transactions += len(returned)
+        return len(returned)
+
+    def clear(self) -> None:
+        """Forget every transaction and restart from genesis."""
+        self._blocks = deque([Block(0, GENESIS_HASH, GENESIS_HASH, self.clock())])
+        self._mempool.clear()
+        self._transactions.clear()
+        self.reorgs = 0
+        self.reorged_transactions = 0
+        self._included = 0
+        self._inclusion_s = 0.0
+
+    async def close(self) -> None:
+        """Stop producing blocks."""
+        if self._producer is None:
+            return
+        producer, self._producer = self._producer, None
+        producer.cancel()
+        try:
+            await producer
+        except asyncio.CancelledError:
+            pass
+
+    def stats(self) -> dict[str, Any]:
+        head = self.head
+        return {
+            "height": head.number,
+            "head": head.hash,
+            "mempool": len(self._mempool),
+            "tracked_transactions": len(self._transactions),
+            "block_interval_s": self.block_interval_s,
+            "block_capacity": self.block_capacity,
+            "confirmations": self.confirmations,
+            "last_block_gas_used": head.gas_used,
+            "reorgs": self.reorgs,
+            "reorged_transactions": self.reorged_transactions,
+            "mean_inclusion_s": round(self._inclusion_s / self._included, 3)
+            if self._included
+            else 0.0,
+        }
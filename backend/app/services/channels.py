@@ -0,0 +1,234 @@
+"""Payment Channels - Metered x402 payments settled once per channel.
+
+Settling every request on chain caps throughput at what settlement can
+sustain. With the ``channel`` scheme a client instead deposits funds once,
+opening a channel, and then pays each request with a voucher: a signed
+statement of the cumulative amount it has spent in the channel so far.
+
+Checking a voucher is a single comparison against the last one accepted: the
+new cumulative amount must exceed it by at least the price and stay within the
+deposit. The voucher must also come from the channel's payer and carry their
+signature over the channel id and cumulative amount. The mock stands in a
+SHA-256 digest (``voucher_signature``) for the payer's EIP-712 signature, so
+knowing a channel id is not enough to spend its deposit. Nothing is settled per request; closing the channel settles the
+latest voucher in one transaction and refunds the rest of the deposit.
+
+Channels are kept in process memory, so with several workers a channel is
+only usable on the worker that opened it. A channel is forgotten
+``retain_s`` seconds after it is closed or expires, so the book does not grow
+with every channel ever opened.
+"""
+
+import hashlib
+import hmac
+import time
+import uuid
+from collections.abc import Callable
+from dataclasses import dataclass
+from typing import Any
+
+from pydantic_settings import BaseSettings, SettingsConfigDict
+
+# Shortest time between sweeps for channels past their retention
+_PRUNE_INTERVAL_S = 10
+
+
+class ChannelSettings(BaseSettings):
+    """Payment channel configuration, read from ``APS_X402_CHANNEL_*`` environment variables."""
+
+    model_config = SettingsConfigDict(env_prefix="APS_X402_CHANNEL_")
+
+    min_deposit: int = 100000  # 0.1 USDC in atomic units
+    ttl_s: int = 3600  # how long a channel accepts vouchers after opening
+    retain_s: int = 600  # how long closed or expired channels stay queryable
+
+
+def voucher_signature(channel_id: str, cumulative: int, payer: str) -> str:
+    """The mock signature of ``payer`` on a voucher for ``cumulative`` in a channel."""
+    message = f"{channel_id}:{cumulative}:{payer.lower()}".encode()
+    return "0x" + hashlib.sha256(message).hexdigest()
+
+
+@dataclass(slots=True)
+class Channel:
+    """A funded channel from a payer to a payee."""
+
+    channel_id: str
+    payer: str
+    pay_to: str
+    asset: str
+    network: str
+    deposit: int
+    opened_at: int
+    expires_at: int
+    spent: int = 0  # cumulative amount of the last accepted voucher
+    vouchers: int = 0
+    closed: bool = False
+    closed_at: int | None = None
+    open_transaction: str | None = None
+    close_transaction: str | None = None
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "channelId": self.channel_id,
+            "payer": self.payer,
+            "payTo": self.pay_to,
+            "asset": self.asset,
+            "network": self.network,
+            "deposit": str(self.deposit),
+            "spent": str(self.spent),
+            "remaining": str(self.deposit - self.spent),
+            "vouchers": self.vouchers,
+            "openedAt": self.opened_at,
+            "expiresAt": self.expires_at,
+            "status": "closed" if self.closed else "open",
+            "openTransaction": self.open_transaction,
+            "closeTransaction": self.close_transaction,
+        }
+
+
+class ChannelBook:
+    """Open and closed channels, by channel id."""
+
+    def __init__(
+        self,
+        ttl_s: int = 3600,
+        retain_s: int = 600,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        self.ttl_s = ttl_s
+        self.retain_s = retain_s
+        self.clock = clock
+        self._channels: dict[str, Channel] = {}
+        self._pruned_at = -float("inf")
+        self.accepted = 0
+        self.rejected = 0
+
+    @classmethod
+    def from_settings(cls, settings: ChannelSettings | None = None) -> "ChannelBook":
+        settings = settings or ChannelSettings()
+        return cls(settings.ttl_s, settings.retain_s)
+
+    def _prune(self) -> None:
+        """Forget channels closed or expired more than ``retain_s`` ago."""
+        now = self.clock()
+        if now < self._pruned_at + _PRUNE_INTERVAL_S:
+            return
+        self._pruned_at = now
+        cutoff = now - self.retain_s
+        stale = [
+            channel_id
+            for channel_id, channel in self._channels.items()
+            if (channel.closed_at if channel.closed else channel.expires_at) < cutoff
+        ]
+        for channel_id in stale:
+            del self._channels[channel_id]
+
+    def open(
+        self,
+        payer: str,
+        pay_to: str,
+        asset: str,
+        network: str,
+        deposit: int,
+        transaction: str | None = None,
+    ) -> Channel:
+        self._prune()
+        now = int(self.clock())
+        channel = Channel(
+            channel_id=f"0x{uuid.uuid4().hex}{uuid.uuid4().hex}",
+            payer=payer,
+            pay_to=pay_to,
+            asset=asset,
+            network=network,
+            deposit=deposit,
+            opened_at=now,
+            expires_at=now + self.ttl_s,
+            open_transaction=transaction,
+        )
+        self._channels[channel.channel_id] = channel
+        return channel
+
+    def get(self, channel_id: str) -> Channel | None:
+        return self._channels.get(channel_id)
+
+    def redeem(
+        self,
+        channel_id: str,
+        cumulative: int,
+        price: int,
+        payer: str | None = None,
+        signature: str | None = None,
+    ) -> tuple[Channel | None, str | None]:
+        """Accept a voucher for ``cumulative`` if it pays at least ``price`` more.
+
+        ``payer`` and ``signature`` must be the channel's payer and their
+        signature on the voucher. Returns the channel and None, or the
+        channel (if any) and the reason the voucher was rejected.
+        """
+        channel = self._channels.get(channel_id)
+        reason = self._check(channel, cumulative, price, payer, signature)
+        if reason is not None:
+            self.rejected += 1
+            return channel, reason
+        channel.spent = cumulative
+        channel.vouchers += 1
+        self.accepted += 1
+        return channel, None
+
+    def _check(
+        self,
+        channel: Channel | None,
+        cumulative: int,
+        price: int,
+        payer: str | None,
+        signature: str | None,
+    ) -> str | None:
+        if channel is None:
+            return "channel_not_found"
+        if not _signed_by_payer(channel, cumulative, payer, signature):
+            return "invalid_signature"
+        if channel.closed:
+            return "channel_closed"
+        if self.clock() > channel.expires_at:
+            return "channel_expired"
+        if cumulative > channel.deposit:
+            return "channel_deposit_exceeded"
+        if cumulative - channel.spent < price:
+            return "invalid_channel_voucher_amount"
+        return None
+
+    def close(self, channel_id: str, transaction: str) -> Channel | None:
+        """Mark a channel closed by the transaction settling its last voucher."""
+        channel = self._channels.get(channel_id)
+        if channel is None or channel.closed:
+            return None
+        channel.closed = True
+        channel.closed_at = int(self.clock())
+        channel.close_transaction = transaction
+        return channel
+
+    def clear(self) -> None:
+        self._channels.clear()
+
+    def stats(self) -> dict[str, Any]:
+        self._prune()
+        open_channels = sum(1 for c in self._channels.values() if not c.closed)
+        return {
+            "open": open_channels,
+            "closed": len(self._channels) - open_channels,
+            "vouchers_accepted": self.accepted,
+            "vouchers_rejected": self.rejected,
+        }
+
+
+def _signed_by_payer(
+    channel: Channel, cumulative: int, payer: str | None, signature: str | None
+) -> bool:
+    if not isinstance(payer, str) or payer.lower() != channel.payer.lower():
+        return False
+    if not isinstance(signature, str):
+        return False
+    expected = voucher_signature(channel.channel_id, cumulative, channel.payer)
+    # Compared as bytes: compare_digest rejects non-ASCII strings
+    return hmac.compare_digest(signature.encode(), expected.encode())
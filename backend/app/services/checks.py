@@ -0,0 +1,703 @@
+"""Inspector Check Engine - Compiles test definitions into executable checks.
+
+Test definitions are plain dicts (see ``UCP_TESTS`` etc. in the inspector).
+They are compiled once, when the suite is loaded, into ``CompiledTest``
+objects: the request is pre-built, JSON paths are pre-parsed and every
+declared assertion is bound to a check function. Running a test then only
+sends the request and calls the bound checks.
+
+New checks are added with ``register_check``. A named check runs when a
+definition lists it under ``check``; a keyed check runs whenever a
+definition contains a key of the same name.
+"""
+
+import json
+import math
+from collections.abc import Callable, Mapping
+from dataclasses import dataclass, field
+from typing import Any
+
+from app.validators import (
+    validate_caip2_network,
+    validate_checkout_session,
+    validate_line_item,
+    validate_payment_required,
+)
+
+# HTTP methods a test definition may use
+SUPPORTED_METHODS = {"GET", "POST", "PUT", "PATCH", "DELETE"}
+
+DEFAULT_WEIGHT = 10
+DEFAULT_EXPECTED_STATUS = 200
+
+# Methods that may be sent again without an Idempotency-Key
+IDEMPOTENT_METHODS = {"GET", "PUT", "DELETE"}
+
+
+# ============================================================================
+# Exchange and Check Types
+# ============================================================================
+
+
+_UNPARSED = object()
+
+
+@dataclass(slots=True)
+class Exchange:
+    """A response under test, with its body parsed as JSON at most once.
+
+    ``bodies`` holds every response body when a test repeats its request.
+    """
+
+    status_code: int
+    headers: Mapping[str, str]
+    content: bytes
+    endpoint: str
+    bodies: list[bytes] = field(default_factory=list)
+    _json: Any = _UNPARSED
+
+    def json(self) -> Any:
+        if self._json is _UNPARSED:
+            self._json = json.loads(self.content)
+        return self._json
+
+
+@dataclass(frozen=True, slots=True)
+class CheckFailure:
+    """Why a check failed."""
+
+    error: str
+    recommendation: str | None = None
+    expected: Any | None = None
+    actual: Any | None = None
+
+
+Check = Callable[[Exchange], CheckFailure | None]
+CheckFactory = Callable[[dict[str, Any]], Check]
+
+# Checks selected by name via a definition's ``check`` value
+CHECKS: dict[str, CheckFactory] = {}
+
+# Checks selected by the presence of a definition key, run in registration order
+KEYED_CHECKS: dict[str, CheckFactory] = {}
+
+
+def register_check(name: str, *, keyed: bool = False) -> Callable[[CheckFactory], CheckFactory]:
+    """Register a check factory under ``name``.
+
+    The factory receives the full test definition at compile time and returns
+    the check to run against each response. Validate the definition in the
+    factory so mistakes surface when the suite is loaded, not when it runs.
+    """
+
+    def decorator(factory: CheckFactory) -> CheckFactory:
+        (KEYED_CHECKS if keyed else CHECKS)[name] = factory
+        return factory
+
+    return decorator
+
+
+# ============================================================================
+# JSON Paths
+# ============================================================================
+
+
+JsonPath = tuple[str | int, ...]
+
+_MISSING = object()
+
+
+def compile_json_path(path: str) -> JsonPath:
+    """Parse a dotted path such as ``payment.handlers`` or ``line_items.0.id``."""
+    if not path:
+        raise ValueError("json_path must not be empty")
+    return tuple(int(part) if part.isdigit() else part for part in path.split("."))
+
+
+def resolve_json_path(data: Any, path: JsonPath) -> Any:
+    """Follow a compiled path into parsed JSON, returning ``_MISSING`` if absent."""
+    for part in path:
+        if isinstance(part, int) and isinstance(data, list):
+            if part >= len(data):
+                return _MISSING
+            data = data[part]
+        elif isinstance(data, dict) and part in data:
+            data = data[part]
+        else:
+            return _MISSING
+    return data
+
+
+def _format_path(path: JsonPath) -> str:
+    return ".".join(str(part) for part in path)
+
+
+def _definition_path(definition: dict[str, Any]) -> JsonPath:
+    if "json_path" not in definition:
+        raise ValueError(f"Test '{definition['id']}' needs a json_path")
+    return compile_json_path(definition["json_path"])
+
+
+# ============================================================================
+# Built-in Checks
+# ============================================================================
+
+
+_JSON_TYPES = {dict: "object", list: "array", str: "string", bool: "boolean", type(None): "null"}
+
+
+def _not_an_object(data: Any) -> CheckFailure | None:
+    """A failure if a parsed body is not a JSON object, which field checks need."""
+    if isinstance(data, dict):
+        return None
+    kind = _JSON_TYPES.get(type(data), "number")
+    return CheckFailure(
+        error=f"Expected a JSON object, got {kind}",
+        expected="object",
+        actual=kind,
+        recommendation="Return the resource as a JSON object",
+    )
+
+
+def _status_check(expected: int, endpoint_hint: str) -> Check:
+    def check(exchange: Exchange) -> CheckFailure | None:
+        if exchange.status_code == expected:
+            return None
+        return CheckFailure(
+            error=f"Expected status {expected}, got {exchange.status_code}",
+            expected=expected,
+            actual=exchange.status_code,
+            recommendation=f"Check that {exchange.endpoint or endpoint_hint} returns HTTP {expected}",
+        )
+
+    return check
+
+
+@register_check("required_fields", keyed=True)
+def _required_fields(definition: dict[str, Any]) -> Check:
+    fields = tuple(definition["required_fields"])
+
+    def check(exchange: Exchange) -> CheckFailure | None:
+        data = exchange.json()
+        if not isinstance(data, dict):
+            return _not_an_object(data)
+        for name in fields:
+            if name not in data:
+                return CheckFailure(
+                    error=f"Missing required field: {name}",
+                    recommendation=f"Include '{name}' in the response",
+                )
+        return None
+
+    return check
+
+
+@register_check("json_path", keyed=True)
+def _json_path_present(definition: dict[str, Any]) -> Check:
+    path = _definition_path(definition)
+    label = _format_path(path)
+
+    def check(exchange: Exchange) -> CheckFailure | None:
+        if resolve_json_path(exchange.json(), path) is _MISSING:
+            return CheckFailure(
+                error=f"Missing field at {label}",
+                recommendation=f"Include '{label}' in the response",
+            )
+        return None
+
+    return check
+
+
+@register_check("min_length", keyed=True)
+def _min_length(definition: dict[str, Any]) -> Check:
+    path = _definition_path(definition)
+    label = _format_path(path)
+    minimum = int(definition["min_length"])
+
+    def check(exchange: Exchange) -> CheckFailure | None:
+        value = resolve_json_path(exchange.json(), path)
+        length = len(value) if isinstance(value, (list, dict, str)) else 0
+        if length < minimum:
+            return CheckFailure(
+                error=f"Expected at least {minimum} entries at {label}, got {length}",
+                expected=minimum,
+                actual=length,
+                recommendation=f"Return at least {minimum} entries in '{label}'",
+            )
+        return None
+
+    return check
+
+
+@register_check("contains_ap2", keyed=True)
+def _contains_ap2(definition: dict[str, Any]) -> Check:
+    path = _definition_path(definition)
+    label = _format_path(path)
+    required = bool(definition["contains_ap2"])
+
+    def check(exchange: Exchange) -> CheckFailure | None:
+        value = resolve_json_path(exchange.json(), path)
+        entries = value if isinstance(value, list) else []
+        found = any("ap2" in str(e.get("uri", "")).lower() for e in entries if isinstance(e, dict))
+        if found != required:
+            return CheckFailure(
+                error=f"AP2 extension {'missing from' if required else 'unexpected in'} {label}",
+                recommendation="Declare the AP2 extension URI in the agent card capabilities",
+            )
+        return None
+
+    return check
+
+
+@register_check("expected_header", keyed=True)
+def _expected_header(definition: dict[str, Any]) -> Check:
+    header_name = definition["expected_header"]
+    lowered = header_name.lower()
+
+    def check(exchange: Exchange) -> CheckFailure | None:
+        if lowered not in (h.lower() for h in exchange.headers):
+            return CheckFailure(
+                error=f"Missing expected header: {header_name}",
+                recommendation=f"Include {header_name} header in 402 response",
+            )
+        return None
+
+    return check
+
+
+@register_check("expect_single_resource", keyed=True)
+def _expect_single_resource(definition: dict[str, Any]) -> Check:
+    if int(definition.get("repeat", 1)) < 2:
+        raise ValueError(f"Test '{definition['id']}' needs repeat >= 2 to count resources")
+
+    def check(exchange: Exchange) -> CheckFailure | None:
+        bodies = [json.loads(body) for body in exchange.bodies]
+        ids = {body.get("id") if isinstance(body, dict) else None for body in bodies}
+        if len(ids) != 1:
+            return CheckFailure(
+                error=f"{len(exchange.bodies)} duplicate requests created {len(ids)} resources",
+                expected=1,
+                actual=len(ids),
+                recommendation="Serialize creates per Idempotency-Key so duplicates return the first resource",
+            )
+        return None
+
+    return check
+
+
+@register_check("expect_same_response", keyed=True)
+def _expect_same_response(definition: dict[str, Any]) -> Check:
+    if int(definition.get("repeat", 1)) < 2:
+        raise ValueError(f"Test '{definition['id']}' needs repeat >= 2 to compare responses")
+
+    def check(exchange: Exchange) -> CheckFailure | None:
+        first = exchange.bodies[0] if exchange.bodies else exchange.content
+        for attempt, body in enumerate(exchange.bodies[1:], start=2):
+            if body != first:
+                return CheckFailure(
+                    error=f"Response {attempt} differs from response 1",
+                    recommendation="Return the original response for a repeated Idempotency-Key",
+                )
+        return None
+
+    return check
+
+
+@register_check("caip2_networks")
+def _caip2_networks(definition: dict[str, Any]) -> Check:
+    def check(exchange: Exchange) -> CheckFailure | None:
+        data = exchange.json()
+        if not isinstance(data, dict):
+            return _not_an_object(data)
+        kinds = data.get("kinds") or []
+        if not isinstance(kinds, list):
+            kinds = [kinds]
+        if not kinds:
+            return CheckFailure(
+                error="No payment kinds listed",
+                recommendation="List supported scheme/network pairs under 'kinds'",
+            )
+        for kind in kinds:
+            network = kind.get("network", "") if isinstance(kind, dict) else ""
+            valid, error = validate_caip2_network(network)
+            if not valid:
+                return CheckFailure(
+                    error=error or f"Invalid network: {network}",
+                    actual=network,
+                    recommendation="Use CAIP-2 identifiers such as 'eip155:84532'",
+                )
+        return None
+
+    return check
+
+
+@register_check("x402_v2_format")
+def _x402_v2_format(definition: dict[str, Any]) -> Check:
+    def check(exchange: Exchange) -> CheckFailure | None:
+        valid, errors = validate_payment_required(exchange.json())
+        if not valid:
+            return CheckFailure(
+                error=f"Invalid x402 v2 PaymentRequired: {'; '.join(errors)}",
+                recommendation="Return a PaymentRequired body with x402Version, resource and accepts",
+            )
+        return None
+
+    return check
+
+
+@register_check("checkout_session_schema")
+def _checkout_session_schema(definition: dict[str, Any]) -> Check:
+    def check(exchange: Exchange) -> CheckFailure | None:
+        data = exchange.json()
+        if not isinstance(data, dict):
+            return _not_an_object(data)
+        valid, errors = validate_checkout_session(data)
+        if not valid:
+            return CheckFailure(
+                error=f"Invalid ACP CheckoutSession: {'; '.join(errors)}",
+                recommendation="Match the ACP OpenAPI CheckoutSession schema",
+            )
+        return None
+
+    return check
+
+
+@register_check("line_item_schema")
+def _line_item_schema(definition: dict[str, Any]) -> Check:
+    def check(exchange: Exchange) -> CheckFailure | None:
+        data = exchange.json()
+        if not isinstance(data, dict):
+            return _not_an_object(data)
+        line_items = data.get("line_items")
+        if not line_items:
+            return CheckFailure(
+                error="No line_items in response",
+                recommendation="Include line_items with per-item totals",
+            )
+        for i, line_item in enumerate(line_items):
+            valid, errors = validate_line_item(line_item)
+            if not valid:
+                return CheckFailure(
+                    error=f"Invalid line item {i}: {'; '.join(errors)}",
+                    recommendation="Include base_amount, subtotal, tax and total on each line item",
+                )
+        return None
+
+    return check
+
+
+@register_check("status_in")
+def _status_in(definition: dict[str, Any]) -> Check:
+    valid_statuses = frozenset(definition.get("valid_statuses") or ())
+    if not valid_statuses:
+        raise ValueError(f"Test '{definition['id']}' needs valid_statuses for status_in")
+
+    def check(exchange: Exchange) -> CheckFailure | None:
+        data = exchange.json()
+        if not isinstance(data, dict):
+            return _not_an_object(data)
+        status = data.get("status")
+        if status not in valid_statuses:
+            return CheckFailure(
+                error=f"Unexpected status: {status}",
+                expected=sorted(valid_statuses),
+                actual=status,
+                recommendation=f"Session status should be one of {sorted(valid_statuses)}",
+            )
+        return None
+
+    return check
+
+
+# ============================================================================
+# Request Policies
+# ============================================================================
+
+
+@dataclass(frozen=True, slots=True)
+class RequestPolicy:
+    """How a test's request is timed out, retried and hedged.
+
+    ``timeout`` bounds each attempt, in seconds. A failed attempt (transport
+    error, timeout or a status in ``retry_statuses``) is retried up to
+    ``retries`` times after a full-jitter backoff of up to
+    ``backoff * 2**n`` seconds, capped at ``max_backoff``. With
+    ``hedge_after`` a duplicate is sent if an attempt has not answered within
+    that many seconds, and whichever answers first is used.
+    """
+
+    timeout: float | None = None
+    retries: int = 0
+    backoff: float = 0.1
+    max_backoff: float = 5.0
+    retry_statuses: frozenset[int] = frozenset({429, 502, 503, 504})
+    hedge_after: float | None = None
+
+    @property
+    def repeats_requests(self) -> bool:
+        return self.retries > 0 or self.hedge_after is not None
+
+
+DEFAULT_POLICY = RequestPolicy()
+
+
+def compile_policy(definition: dict[str, Any], method: str, headers: dict[str, str]) -> RequestPolicy:
+    """Build a test's RequestPolicy from its timeout, retry and hedging keys.
+
+    The keys are ``timeout`` (seconds), ``retries``, ``retry_backoff``
+    (seconds), ``retry_on`` (status codes) and ``hedge_after_ms``. Requests
+    that are not idempotent may only be repeated with an Idempotency-Key.
+    """
+    keys = ("timeout", "retries", "retry_backoff", "retry_on", "hedge_after_ms")
+    if not any(key in definition for key in keys):
+        return DEFAULT_POLICY
+
+    test_id = definition["id"]
+    timeout = definition.get("timeout")
+    retries = int(definition.get("retries", 0))
+    backoff = float(definition.get("retry_backoff", DEFAULT_POLICY.backoff))
+    hedge_after_ms = definition.get("hedge_after_ms")
+    if timeout is not None and float(timeout) <= 0:
+        raise ValueError(f"Test '{test_id}' needs a positive timeout")
+    if retries < 0 or backoff < 0:
+        raise ValueError(f"Test '{test_id}' needs non-negative retries and retry_backoff")
+    if hedge_after_ms is not None and float(hedge_after_ms) <= 0:
+        raise ValueError(f"Test '{test_id}' needs a positive hedge_after_ms")
+
+    policy = RequestPolicy(
+        timeout=float(timeout) if timeout is not None else None,
+        retries=retries,
+        backoff=backoff,
+        retry_statuses=frozenset(definition.get("retry_on", DEFAULT_POLICY.retry_statuses)),
+        hedge_after=float(hedge_after_ms) / 1000 if hedge_after_ms is not None else None,
+    )
+    if policy.repeats_requests:
+        if definition.get("concurrent"):
+            raise ValueError(f"Test '{test_id}' cannot retry or hedge concurrent requests")
+        if method not in IDEMPOTENT_METHODS and "Idempotency-Key" not in headers:
+            raise ValueError(
+                f"Test '{test_id}' retries or hedges a {method} without an Idempotency-Key"
+            )
+    return policy
+
+
+# ============================================================================
+# Latency SLOs
+# ============================================================================
+
+SLO_SEVERITIES = {"fail", "warn"}
+
+
+@dataclass(frozen=True, slots=True)
+class LatencySLO:
+    """A latency budget for a test's requests.
+
+    With ``percentile`` the budget applies to that nearest-rank percentile of
+    the test's ``repeat`` requests, otherwise to the slowest request.
+    ``severity`` ``warn`` reports a breach without failing the test.
+    """
+
+    max_ms: float
+    percentile: float | None = None
+    severity: str = "fail"
+
+    @property
+    def label(self) -> str:
+        return "max" if self.percentile is None else f"p{self.percentile:g}"
+
+    def observe(self, latencies_ms: list[float]) -> float:
+        """The latency (ms) the budget applies to."""
+        if self.percentile is None:
+            return max(latencies_ms)
+        ordered = sorted(latencies_ms)
+        rank = max(1, math.ceil(self.percentile / 100 * len(ordered)))
+        return ordered[rank - 1]
+
+    def evaluate(self, latencies_ms: list[float]) -> CheckFailure | None:
+        """Check request latencies (ms) against the budget."""
+        observed = self.observe(latencies_ms)
+        if observed <= self.max_ms:
+            return None
+        return CheckFailure(
+            error=f"Latency {self.label} {observed:.1f}ms exceeds the {self.max_ms:g}ms budget",
+            expected=self.max_ms,
+            actual=round(observed, 3),
+            recommendation="Profile the endpoint or raise the SLO if the budget is unrealistic",
+        )
+
+
+def compile_slo(definition: dict[str, Any], sends_request: bool, repeat: int) -> LatencySLO | None:
+    """Build a test's LatencySLO from its ``latency_slo`` mapping, if any.
+
+    The mapping takes ``max_ms`` and optionally ``percentile`` and
+    ``severity`` (``fail`` or ``warn``).
+    """
+    spec = definition.get("latency_slo")
+    if spec is None:
+        return None
+
+    test_id = definition["id"]
+    if not sends_request:
+        raise ValueError(f"Test '{test_id}' sends no request to put a latency_slo on")
+    if "max_ms" not in spec or float(spec["max_ms"]) <= 0:
+        raise ValueError(f"Test '{test_id}' latency_slo needs a positive max_ms")
+    percentile = spec.get("percentile")
+    if percentile is not None:
+        if not 0 < float(percentile) <= 100:
+            raise ValueError(f"Test '{test_id}' latency_slo percentile must be in (0, 100]")
+        if repeat < 2:
+            raise ValueError(f"Test '{test_id}' needs repeat >= 2 for a latency percentile")
+    severity = spec.get("severity", "fail")
+    if severity not in SLO_SEVERITIES:
+        raise ValueError(f"Test '{test_id}' latency_slo severity must be 'fail' or 'warn'")
+
+    return LatencySLO(
+        max_ms=float(spec["max_ms"]),
+        percentile=float(percentile) if percentile is not None else None,
+        severity=severity,
+    )
+
+
+# ============================================================================
+# Compiled Tests
+# ============================================================================
+
+
+@dataclass(frozen=True, slots=True)
+class CompiledTest:
+    """A test definition compiled for execution.
+
+    ``endpoint`` is None for tests that only inspect the response of the test
+    they depend on (for example ``acp_session_line_items``). With
+    ``concurrent`` the ``repeat`` requests are released together rather than
+    sent one after another. ``policy`` governs timeouts, retries and hedging;
+    ``slo`` is an optional latency budget.
+    """
+
+    id: str
+    name: str
+    weight: int
+    depends_on: tuple[str, ...]
+    method: str
+    endpoint: str | None
+    endpoint_template: str | None
+    headers: dict[str, str]
+    content: bytes | None
+    repeat: int
+    concurrent: bool
+    policy: RequestPolicy
+    slo: LatencySLO | None
+    checks: tuple[Check, ...]
+    captures: tuple[tuple[str, JsonPath], ...]
+    definition: dict[str, Any]
+
+    @property
+    def sends_request(self) -> bool:
+        return self.endpoint is not None or self.endpoint_template is not None
+
+    def evaluate(self, exchange: Exchange) -> CheckFailure | None:
+        """Run every check in order, returning the first failure."""
+        try:
+            for check in self.checks:
+                failure = check(exchange)
+                if failure is not None:
+                    return failure
+        except json.JSONDecodeError as e:
+            return CheckFailure(error=f"Invalid JSON response: {e}")
+        return None
+
+    def capture(self, exchange: Exchange, context: dict[str, Any]) -> None:
+        """Store values from a passing response for dependent tests."""
+        context["response"] = exchange
+        if not self.captures:
+            return
+        try:
+            data = exchange.json()
+        except json.JSONDecodeError:
+            return
+        for name, path in self.captures:
+            value = resolve_json_path(data, path)
+            if value is not _MISSING:
+                context[name] = value
+
+
+def compile_test(definition: dict[str, Any]) -> CompiledTest:
+    """Compile one test definition, raising ValueError if it is malformed."""
+    test_id = definition.get("id")
+    if not test_id or "name" not in definition:
+        raise ValueError(f"Test definition needs an id and a name: {definition!r}")
+
+    method = definition.get("method", "GET").upper()
+    if method not in SUPPORTED_METHODS:
+        raise ValueError(f"Test '{test_id}' uses unknown method: {method}")
+
+    depends_on = definition.get("depends_on") or ()
+    if isinstance(depends_on, str):
+        depends_on = (depends_on,)
+
+    endpoint = definition.get("endpoint")
+    endpoint_template = definition.get("endpoint_template")
+    if endpoint is None and endpoint_template is None and not depends_on:
+        raise ValueError(f"Test '{test_id}' has no endpoint and no dependency to inspect")
+
+    headers = dict(definition.get("headers", {}))
+    content = None
+    if "body" in definition and method != "GET":
+        content = json.dumps(definition["body"]).encode()
+        headers.setdefault("Content-Type", "application/json")
+
+    checks: list[Check] = []
+    sends_request = endpoint is not None or endpoint_template is not None
+    # Tests that reuse a dependency's response only assert a status if asked
+    if sends_request or "expected_status" in definition:
+        expected = int(definition.get("expected_status", DEFAULT_EXPECTED_STATUS))
+        checks.append(_status_check(expected, endpoint or endpoint_template or ""))
+    for key, factory in KEYED_CHECKS.items():
+        if key in definition:
+            checks.append(factory(definition))
+
+    named = definition.get("check") or ()
+    for check_name in (named,) if isinstance(named, str) else named:
+        if check_name not in CHECKS:
+            raise ValueError(f"Test '{test_id}' uses unknown check: {check_name}")
+        checks.append(CHECKS[check_name](definition))
+
+    repeat = max(1, int(definition.get("repeat", 1)))
+    concurrent = bool(definition.get("concurrent", False))
+    if concurrent and repeat < 2:
+        raise ValueError(f"Test '{test_id}' needs repeat >= 2 to send concurrently")
+
+    captures = definition.get("capture")
+    if captures is None:
+        # Created resources expose their id to dependents as checkout_id
+        captures = {"checkout_id": "id"} if "required_fields" in definition else {}
+
+    return CompiledTest(
+        id=test_id,
+        name=definition["name"],
+        weight=int(definition.get("weight", DEFAULT_WEIGHT)),
+        depends_on=tuple(depends_on),
+        method=method,
+        endpoint=endpoint,
+        endpoint_template=endpoint_template,
+        headers=headers,
+        content=content,
+        repeat=repeat,
+        concurrent=concurrent,
+        policy=compile_policy(definition, method, headers),
+        slo=compile_slo(definition, sends_request, repeat),
+        checks=tuple(checks),
+        captures=tuple((name, compile_json_path(path)) for name, path in captures.items()),
+        definition=definition,
+    )
+
+
+def compile_suite(definitions: list[dict[str, Any]]) -> list[CompiledTest]:
+    """Compile a list of test definitions, rejecting duplicate ids."""
+    compiled = [compile_test(d) for d in definitions]
+    seen: set[str] = set()
+    for test in compiled:
+        if test.id in seen:
+            raise ValueError(f"Duplicate test id: {test.id}")
+        seen.add(test.id)
+    return compiled
@@ -0,0 +1,189 @@
+"""JSON Structural Diff - Compares a response against a reference response.
+
+Used by the inspector's differential mode to show where a partner server's
+responses diverge from the sandbox's reference mocks. Volatile fields (ids,
+timestamps, nonces, ...) differ on every request, so they are compared by
+presence and type only.
+
+The differ walks both documents iteratively. Equal subtrees are skipped with a
+single ``==``, array items are compared by position, and a path string is only
+built for a difference that is actually reported, so diffing large payloads
+such as long ``line_items`` arrays stays linear in their size.
+"""
+
+from collections.abc import Iterable
+from dataclasses import dataclass
+from typing import Any
+
+# Field names whose values are expected to differ between servers
+VOLATILE_FIELDS = frozenset(
+    {
+        "id",
+        "nonce",
+        "signature",
+        "timestamp",
+        "token",
+        "transaction",
+        "tx_hash",
+        "txHash",
+        "validAfter",
+        "validBefore",
+    }
+)
+
+# Field name endings that mark ids and timestamps (checkout_id, created_at, expiresAt)
+VOLATILE_SUFFIXES = ("_id", "_at", "Id", "At")
+
+DEFAULT_MAX_DIFFERENCES = 100
+
+
+@dataclass(frozen=True, slots=True)
+class Difference:
+    """One divergence between the reference and the candidate document.
+
+    ``kind`` is ``missing`` (only in the reference), ``unexpected`` (only in
+    the candidate), ``type``, ``length`` (arrays) or ``value``. Arrays and
+    objects are summarized rather than copied into ``reference``/``candidate``.
+    """
+
+    path: str
+    kind: str
+    reference: Any = None
+    candidate: Any = None
+
+
+_JSON_TYPES = {
+    type(None): "null",
+    bool: "boolean",
+    int: "number",
+    float: "number",
+    str: "string",
+    list: "array",
+    dict: "object",
+}
+
+
+def _json_type(value: Any) -> str:
+    json_type = _JSON_TYPES.get(type(value))
+    if json_type is not None:
+        return json_type
+    # Subclasses, e.g. of str or dict
+    if isinstance(value, bool):
+        return "boolean"
+    if isinstance(value, (int, float)):
+        return "number"
+    if isinstance(value, str):
+        return "string"
+    if isinstance(value, list):
+        return "array"
+    if isinstance(value, dict):
+        return "object"
+    return type(value).__name__
+
+
+def _preview(value: Any) -> Any:
+    if isinstance(value, list):
+        return f"<array of {len(value)}>"
+    if isinstance(value, dict):
+        return f"<object with {len(value)} fields>"
+    return value
+
+
+# A path is a linked list of (parent, key) pairs, so descending costs O(1)
+_Path = tuple["_Path", str | int] | None
+
+
+def _render_path(path: _Path) -> str:
+    parts: list[str] = []
+    while path is not None:
+        path, part = path
+        parts.append(str(part))
+    return ".".join(reversed(parts))
+
+
+class JsonDiffer:
+    """Structural diff of parsed JSON documents.
+
+    Fields named in ``ignore`` are skipped entirely. Fields in ``volatile``, or
+    ending in one of ``VOLATILE_SUFFIXES``, must be present with the same JSON
+    type but may hold any value. At most ``max_differences`` differences are
+    collected per document.
+    """
+
+    def __init__(
+        self,
+        ignore: Iterable[str] = (),
+        volatile: Iterable[str] = VOLATILE_FIELDS,
+        max_differences: int = DEFAULT_MAX_DIFFERENCES,
+    ) -> None:
+        self.ignore = frozenset(ignore)
+        self.volatile = frozenset(volatile)
+        self.max_differences = max_differences
+        self._volatile_cache: dict[str, bool] = {}
+
+    def _is_volatile(self, key: str) -> bool:
+        volatile = self._volatile_cache.get(key)
+        if volatile is None:
+            volatile = key in self.volatile or key.endswith(VOLATILE_SUFFIXES)
+            self._volatile_cache[key] = volatile
+        return volatile
+
+    def diff(self, reference: Any, candidate: Any) -> tuple[list[Difference], bool]:
+        """Compare two documents; return the differences and whether the list was truncated."""
+        differences: list[Difference] = []
+        stack: list[tuple[Any, Any, _Path]] = [(reference, candidate, None)]
+
+        def report(path: _Path, kind: str, ref: Any = None, cand: Any = None) -> None:
+            differences.append(Difference(_render_path(path), kind, _preview(ref), _preview(cand)))
+
+        while stack:
+            if len(differences) >= self.max_differences:
+                return differences[: self.max_differences], True
+            ref, cand, path = stack.pop()
+            if type(ref) is type(cand) and ref == cand:
+                continue
+
+            ref_type, cand_type = _json_type(ref), _json_type(cand)
+            if ref_type != cand_type:
+                report(path, "type", ref_type, cand_type)
+            elif ref_type == "object":
+                children = []
+                for key, ref_value in ref.items():
+                    if key in self.ignore:
+                        continue
+                    if key not in cand:
+                        report((path, key), "missing", ref_value)
+                    elif self._is_volatile(key):
+                        cand_value = cand[key]
+                        if _json_type(ref_value) != _json_type(cand_value):
+                            report(
+                                (path, key),
+                                "type",
+                                _json_type(ref_value),
+                                _json_type(cand_value),
+                            )
+                    else:
+                        cand_value = cand[key]
+                        # Skip equal values here rather than after a push and pop
+                        if type(ref_value) is not type(cand_value) or ref_value != cand_value:
+                            children.append((ref_value, cand_value, (path, key)))
+                for key, cand_value in cand.items():
+                    if key not in ref and key not in self.ignore:
+                        report((path, key), "unexpected", None, cand_value)
+                # Reversed so the stack visits fields in document order
+                stack.extend(reversed(children))
+            elif ref_type == "array":
+                if len(ref) != len(cand):
+                    report(path, "length", len(ref), len(cand))
+                shared = min(len(ref), len(cand))
+                stack.extend(
+                    (ref[i], cand[i], (path, i))
+                    for i in range(shared - 1, -1, -1)
+                    if type(ref[i]) is not type(cand[i]) or ref[i] != cand[i]
+                )
+            elif ref != cand:
+                # Numbers compare across int/float; everything else differs in value
+                report(path, "value", ref, cand)
+
+        truncated = len(differences) > self.max_differences
+        return differences[: self.max_differences], truncated
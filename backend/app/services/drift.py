@@ -0,0 +1,186 @@
+"""Rolling Statistics and Drift Detection - Compact aggregates for long runs.
+
+A soak run can make millions of requests, so samples are never kept.
+``RunningStats`` folds each sample into a count, mean and sum of squared
+deviations (Welford's method) plus fixed histogram buckets, which is enough to
+report percentiles and to merge windows exactly.
+
+Drift between the early and late part of a run is tested with a two-sample z
+test: Welch's statistic for mean latency and a pooled two-proportion test for
+error rate. Both use the normal approximation, which holds for the hundreds of
+samples a soak window collects. Successive samples in a soak are not
+independent, so with enough of them a z test flags even a trivial shift; a
+shift in mean latency only counts as drift once it is also at least
+``min_change_pct`` percent.
+"""
+
+import bisect
+import math
+from collections.abc import Iterable, Sequence
+from dataclasses import dataclass
+
+DEFAULT_ALPHA = 0.01
+DEFAULT_MIN_CHANGE_PCT = 20.0
+
+
+class RunningStats:
+    """Count, mean, variance, extremes and a bucketed histogram of samples."""
+
+    __slots__ = ("bounds", "count", "mean", "m2", "min", "max", "buckets")
+
+    def __init__(self, bounds: Sequence[float]) -> None:
+        self.bounds = bounds
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+        # One bucket per bound (samples <= bound) plus an overflow bucket
+        self.buckets = [0] * (len(bounds) + 1)
+
+    def add(self, value: float) -> None:
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+        self.buckets[bisect.bisect_left(self.bounds, value)] += 1
+
+    def merge(self, other: "RunningStats") -> None:
+        """Fold another aggregate with the same bounds into this one."""
+        if not other.count:
+            return
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        self.m2 += other.m2 + delta * delta * self.count * other.count / count
+        self.mean += delta * other.count / count
+        self.count = count
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self.buckets = [a + b for a, b in zip(self.buckets, other.buckets)]
+
+    @property
+    def variance(self) -> float:
+        return self.m2 / (self.count - 1) if self.count > 1 else 0.0
+
+    def percentile(self, pct: float) -> float:
+        """Estimate the nearest-rank percentile from the histogram.
+
+        The bucket holding the rank is assumed to be filled evenly between its
+        edges, narrowed to the observed range (the first bucket starts at
+        ``min``, the overflow bucket ends at ``max``), and the value is
+        interpolated linearly within it.
+        """
+        if not self.count:
+            return 0.0
+        rank = max(1, math.ceil(pct / 100 * self.count))
+        seen = 0
+        lower = self.min
+        for i, count in enumerate(self.buckets):
+            upper = min(self.bounds[i], self.max) if i < len(self.bounds) else self.max
+            if count and seen + count >= rank:
+                lower = max(lower, self.min)
+                return lower + (upper - lower) * (rank - seen) / count
+            seen += count
+            if i < len(self.bounds):
+                lower = self.bounds[i]
+        return self.max
+
+
+def merged(stats: Iterable[RunningStats], bounds: Sequence[float]) -> RunningStats:
+    """Merge several aggregates into a new one."""
+    total = RunningStats(bounds)
+    for part in stats:
+        total.merge(part)
+    return total
+
+
+@dataclass(frozen=True, slots=True)
+class DriftTest:
+    """Outcome of comparing one metric between early and late samples.
+
+    ``significant`` means the change is unlikely to be chance at ``alpha``
+    and at least ``min_change_pct`` percent; ``direction`` is ``up``,
+    ``down`` or ``none``.
+    """
+
+    metric: str
+    early: float
+    late: float
+    change_pct: float | None
+    statistic: float
+    p_value: float
+    significant: bool
+    direction: str
+
+
+def _two_sided_p(z: float) -> float:
+    return math.erfc(abs(z) / math.sqrt(2))
+
+
+def _drift(
+    metric: str,
+    early: float,
+    late: float,
+    z: float,
+    alpha: float,
+    min_change_pct: float = 0.0,
+) -> DriftTest:
+    p_value = _two_sided_p(z)
+    change_pct = (late - early) / early * 100 if early else None
+    # From zero any rise is unbounded in percent
+    large_enough = abs(change_pct) >= min_change_pct if change_pct is not None else late != early
+    significant = p_value < alpha and large_enough
+    return DriftTest(
+        metric=metric,
+        early=early,
+        late=late,
+        change_pct=change_pct,
+        statistic=z,
+        p_value=p_value,
+        significant=significant,
+        direction=("up" if late > early else "down") if significant else "none",
+    )
+
+
+def mean_drift(
+    metric: str,
+    early: RunningStats,
+    late: RunningStats,
+    alpha: float = DEFAULT_ALPHA,
+    min_change_pct: float = DEFAULT_MIN_CHANGE_PCT,
+) -> DriftTest:
+    """Welch z test for a change in mean between two aggregates.
+
+    The change is significant only if it is also at least ``min_change_pct``
+    percent of the early mean.
+    """
+    if early.count < 2 or late.count < 2:
+        return _drift(metric, early.mean, late.mean, 0.0, alpha, min_change_pct)
+    se = math.sqrt(early.variance / early.count + late.variance / late.count)
+    if se == 0:
+        # No spread on either side: any difference at all is a shift
+        z = 0.0 if early.mean == late.mean else math.copysign(math.inf, late.mean - early.mean)
+    else:
+        z = (late.mean - early.mean) / se
+    return _drift(metric, early.mean, late.mean, z, alpha, min_change_pct)
+
+
+def rate_drift(
+    metric: str,
+    early_hits: int,
+    early_total: int,
+    late_hits: int,
+    late_total: int,
+    alpha: float = DEFAULT_ALPHA,
+) -> DriftTest:
+    """Pooled two-proportion z test for a change in rate."""
+    early_rate = early_hits / early_total if early_total else 0.0
+    late_rate = late_hits / late_total if late_total else 0.0
+    if not early_total or not late_total:
+        return _drift(metric, early_rate, late_rate, 0.0, alpha)
+    pooled = (early_hits + late_hits) / (early_total + late_total)
+    se = math.sqrt(pooled * (1 - pooled) * (1 / early_total + 1 / late_total))
+    z = (late_rate - early_rate) / se if se else 0.0
+    return _drift(metric, early_rate, late_rate, z, alpha)
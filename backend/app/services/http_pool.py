@@ -0,0 +1,200 @@
+"""Inspector HTTP Client Pool - Shared, warm connections per target origin.
+
+The application lifespan owns one ``ClientPool`` for the whole process.
+Inspector runs borrow a client for their target's origin instead of opening
+their own, so consecutive and batched runs against the same partner reuse
+kept-alive (optionally HTTP/2) connections. Clients left unused for
+``idle_timeout`` seconds are closed by a background task.
+
+When the pool is given the sandbox's own ASGI app, callers may opt in to
+``in_process`` clients that dispatch requests straight to the app without a
+socket, for inspecting the sandbox's own mock servers.
+"""
+
+import asyncio
+import importlib.util
+import time
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Any
+
+import httpx
+from pydantic_settings import BaseSettings, SettingsConfigDict
+
+if TYPE_CHECKING:
+    from starlette.types import ASGIApp
+
+
+class PoolSettings(BaseSettings):
+    """Client pool configuration, read from ``APS_INSPECTOR_*`` environment variables."""
+
+    model_config = SettingsConfigDict(env_prefix="APS_INSPECTOR_")
+
+    http2: bool = False
+    max_connections: int = 20  # per origin
+    max_keepalive_connections: int = 10  # per origin
+    keepalive_expiry: float = 30.0  # seconds an idle connection stays open
+    idle_timeout: float = 300.0  # seconds before an unused client is closed
+    timeout: float = 30.0  # per request
+
+
+@dataclass
+class _PooledClient:
+    client: httpx.AsyncClient
+    last_used: float = field(default_factory=time.monotonic)
+    in_use: int = 0
+    borrows: int = 0
+
+
+def _origin(url: str) -> str:
+    """Get the scheme://host:port origin of a URL."""
+    parsed = httpx.URL(url)
+    return f"{parsed.scheme}://{parsed.netloc.decode('ascii')}"
+
+
+class ClientPool:
+    """httpx.AsyncClients keyed by target origin and connection limit."""
+
+    def __init__(
+        self,
+        settings: PoolSettings | None = None,
+        local_app: "ASGIApp | None" = None,
+    ) -> None:
+        self.settings = settings or PoolSettings()
+        self.local_app = local_app
+        self._local_client: httpx.AsyncClient | None = None
+        if self.settings.http2 and importlib.util.find_spec("h2") is None:
+            raise RuntimeError("HTTP/2 requires the 'h2' package: pip install 'aps-backend[http2]'")
+        self._clients: dict[tuple[str, int], _PooledClient] = {}
+        self._lock = asyncio.Lock()
+        self._evictor: asyncio.Task[None] | None = None
+        self._closed = False
+        self.evictions = 0
+
+    async def start(self) -> None:
+        """Start the idle-eviction task."""
+        if self._evictor is None:
+            self._evictor = asyncio.create_task(self._evict_loop())
+
+    async def close(self) -> None:
+        """Stop eviction and close every pooled client."""
+        self._closed = True
+        if self._evictor is not None:
+            self._evictor.cancel()
+            await asyncio.gather(self._evictor, return_exceptions=True)
+            self._evictor = None
+        async with self._lock:
+            clients = [e.client for e in self._clients.values()]
+            self._clients.clear()
+            if self._local_client is not None:
+                clients.append(self._local_client)
+                self._local_client = None
+        await asyncio.gather(*(c.aclose() for c in clients), return_exceptions=True)
+
+    def _new_client(self, max_connections: int) -> httpx.AsyncClient:
+        keepalive = min(self.settings.max_keepalive_connections, max_connections)
+        return httpx.AsyncClient(
+            http2=self.settings.http2,
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=keepalive,
+                keepalive_expiry=self.settings.keepalive_expiry,
+            ),
+            # Waiting for a pooled connection is throttling, not a failure
+            timeout=httpx.Timeout(self.settings.timeout, pool=None),
+        )
+
+    @asynccontextmanager
+    async def client(
+        self,
+        url: str,
+        max_connections: int | None = None,
+        in_process: bool = False,
+    ) -> AsyncIterator[httpx.AsyncClient]:
+        """Borrow the client for ``url``'s origin, creating it if needed.
+
+        ``max_connections`` overrides the configured per-origin limit; each
+        distinct limit gets its own client so callers never share a budget
+        they did not ask for. A borrowed client is never evicted.
+
+        With ``in_process`` (and a ``local_app``) the client dispatches to the
+        app through an ASGI transport instead; the caller is responsible for
+        only doing so for URLs that the app itself serves.
+        """
+        if self._closed:
+            raise RuntimeError("Client pool is closed")
+        if in_process and self.local_app is not None:
+            if self._local_client is None:
+                self._local_client = httpx.AsyncClient(
+                    transport=httpx.ASGITransport(app=self.local_app),
+                    timeout=self.settings.timeout,
+                )
+            yield self._local_client
+            return
+        key = (_origin(url), max_connections or self.settings.max_connections)
+        async with self._lock:
+            entry = self._clients.get(key)
+            if entry is None:
+                entry = self._clients[key] = _PooledClient(self._new_client(key[1]))
+            entry.in_use += 1
+            entry.borrows += 1
+        try:
+            yield entry.client
+        finally:
+            entry.in_use -= 1
+            entry.last_used = time.monotonic()
+
+    async def evict_idle(self) -> int:
+        """Close clients that have been unused for ``idle_timeout``; return how many."""
+        cutoff = time.monotonic() - self.settings.idle_timeout
+        async with self._lock:
+            idle = [
+                key
+                for key, entry in self._clients.items()
+                if entry.in_use == 0 and entry.last_used < cutoff
+            ]
+            evicted = [self._clients.pop(key) for key in idle]
+        await asyncio.gather(*(e.client.aclose() for e in evicted), return_exceptions=True)
+        self.evictions += len(evicted)
+        return len(evicted)
+
+    async def _evict_loop(self) -> None:
+        interval = max(1.0, self.settings.idle_timeout / 2)
+        while True:
+            await asyncio.sleep(interval)
+            await self.evict_idle()
+
+    def stats(self) -> dict[str, Any]:
+        """Describe the pooled clients."""
+        now = time.monotonic()
+        return {
+            "http2": self.settings.http2,
+            "clients": [
+                {
+                    "origin": origin,
+                    "max_connections": limit,
+                    "in_use": entry.in_use,
+                    "borrows": entry.borrows,
+                    "idle_s": round(now - entry.last_used, 1) if not entry.in_use else 0.0,
+                }
+                for (origin, limit), entry in self._clients.items()
+            ],
+            "evictions": self.evictions,
+            "in_process": self._local_client is not None,
+        }
+
+
+# Process-wide pool, installed by the application lifespan
+_pool: ClientPool | None = None
+
+
+def get_client_pool() -> ClientPool | None:
+    """Get the process-wide pool, or None outside the application lifespan."""
+    return _pool
+
+
+def set_client_pool(pool: ClientPool | None) -> None:
+    """Install (or clear) the process-wide pool."""
+    global _pool
+    _pool = pool
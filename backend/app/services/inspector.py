@@ -0,0 +1,2191 @@
+"""Inspector Runner - Runs protocol test suites against external servers.
+
+The engine behind the inspector API: test tables, the scheduler and the run,
+batch, load, race, soak and differential modes, with the report models they
+return. It depends only on httpx and pydantic, so the command-line runner can
+use it without importing FastAPI or the mock routers.
+"""
+
+import asyncio
+import bisect
+import heapq
+import itertools
+import json
+import math
+import random
+import time
+import uuid
+from collections import Counter
+from collections.abc import AsyncIterator
+from contextlib import nullcontext
+from dataclasses import dataclass, replace
+from datetime import datetime, timezone
+from typing import Any
+
+import httpx
+from pydantic import BaseModel, Field
+
+from app.services.capture import (
+    CapturedExchange,
+    CaptureSettings,
+    CaptureWriter,
+    capture_path,
+)
+from app.services.checks import (
+    DEFAULT_POLICY,
+    IDEMPOTENT_METHODS,
+    CompiledTest,
+    Exchange,
+    RequestPolicy,
+    compile_suite,
+)
+from app.services.diff import DEFAULT_MAX_DIFFERENCES, Difference, JsonDiffer
+from app.services.drift import (
+    DEFAULT_ALPHA,
+    DEFAULT_MIN_CHANGE_PCT,
+    DriftTest,
+    RunningStats,
+    mean_drift,
+    merged,
+    rate_drift,
+)
+from app.services.http_pool import ClientPool, get_client_pool
+
+# Maximum number of tests in flight at once against a single target
+DEFAULT_CONCURRENCY = 4
+MAX_CONCURRENCY = 32
+
+# Upper bound for a run's deadline_s, after which outstanding tests are cancelled
+MAX_RUN_DEADLINE_S = 3600.0
+MAX_RUN_RETRIES = 5
+
+# Batch runs: suites in flight across all targets, and connections per host
+DEFAULT_BATCH_CONCURRENCY = 16
+MAX_BATCH_CONCURRENCY = 128
+DEFAULT_PER_HOST_LIMIT = 8
+MAX_BATCH_CELLS = 1000
+
+# Load mode limits
+MAX_LOAD_DURATION_S = 300.0
+MAX_LOAD_RATE = 2000.0
+MAX_LOAD_CONCURRENCY = 256
+
+# Idempotency races
+DEFAULT_RACE_REQUESTS = 10
+MAX_RACE_REQUESTS = 100
+
+# Error prefix of results for tests that were not run
+SKIPPED_PREFIX = "Skipped: "
+
+# Soak runs
+MAX_SOAK_DURATION_S = 86400.0
+MAX_SOAK_WINDOWS = 1440
+
+# Differential runs
+MAX_DIFF_DIFFERENCES = 1000
+
+# Where this sandbox serves the reference mock for each protocol
+MOCK_PATHS = {"UCP": "/mock/ucp", "ACP": "/mock/acp", "x402": "/mock/x402", "AP2": "/mock/ap2"}
+
+# Upper bounds (ms) of load-mode latency histogram buckets; the last is open-ended
+LATENCY_BUCKETS_MS = [1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000]
+
+
+# ============================================================================
+# Models
+# ============================================================================
+
+
+class TestRun(BaseModel):
+    """A test run configuration."""
+
+    target_url: str
+    protocol: str  # "UCP", "ACP", "x402", "AP2"
+    tests: list[str] | None = None  # Specific tests to run, or None for all
+    concurrency: int = Field(default=DEFAULT_CONCURRENCY, ge=1, le=MAX_CONCURRENCY)
+    in_process: bool = False  # Dispatch to this sandbox's own mocks without a socket
+    deadline_s: float | None = Field(default=None, gt=0, le=MAX_RUN_DEADLINE_S)
+    score_performance: bool = False  # Tests earn their weight only if their SLO is met
+    capture: bool = False  # Record every exchange to a capture file for the run
+    # Request policy for tests that declare none; retries apply to idempotent requests
+    timeout_s: float | None = Field(default=None, gt=0)
+    retries: int = Field(default=0, ge=0, le=MAX_RUN_RETRIES)
+
+
+class PhaseTimings(BaseModel):
+    """Time spent in each phase of an HTTP exchange, in milliseconds.
+
+    ``connect_ms`` includes DNS resolution, which httpcore performs as part
+    of opening the TCP connection. ``queue_ms`` is time before the first
+    network step, mostly waiting for a pooled connection. ``wait_ms`` is the
+    gap between sending the request and receiving response headers, i.e.
+    server think time.
+    """
+
+    queue_ms: float = 0.0
+    connect_ms: float = 0.0
+    tls_ms: float = 0.0
+    send_ms: float = 0.0
+    wait_ms: float = 0.0
+    receive_ms: float = 0.0
+    total_ms: float = 0.0
+
+
+class RequestTimings(PhaseTimings):
+    """Phase timings of a single request."""
+
+    ttfb_ms: float = 0.0
+    new_connection: bool = False
+
+
+class TimingSummary(BaseModel):
+    """Phase timings aggregated over every request in a run."""
+
+    requests: int
+    new_connections: int
+    mean: PhaseTimings
+    max: PhaseTimings
+    total: PhaseTimings
+
+
+class Attempt(BaseModel):
+    """One attempt at a test's request.
+
+    ``kind`` is ``initial``, ``retry`` or ``hedge``. ``outcome`` is ``used``,
+    ``retried`` (a retryable status), ``failed``, ``cancelled`` (a hedge race
+    was decided while it was in flight) or ``discarded`` (it answered, but
+    another answer was used).
+    """
+
+    number: int
+    kind: str
+    started_ms: float  # Since the test started
+    duration_ms: float = 0.0
+    status_code: int | None = None
+    outcome: str | None = None
+    error: str | None = None
+
+
+class TestResult(BaseModel):
+    """Result of a single test."""
+
+    test_id: str
+    name: str
+    passed: bool
+    duration_ms: int
+    status_code: int | None = None
+    timings: RequestTimings | None = None
+    attempts: list[Attempt] | None = None  # Only for tests that retry or hedge
+    latency_ms: float | None = None  # Slowest request, or the SLO's percentile
+    slo_met: bool | None = None  # None for tests without a latency SLO
+    warning: str | None = None  # A warn-severity SLO breach on a passing test
+    error: str | None = None
+    expected: Any | None = None
+    actual: Any | None = None
+    recommendation: str | None = None
+
+
+class TestReport(BaseModel):
+    """Complete test run report."""
+
+    run_id: str
+    target_url: str
+    protocol: str
+    timestamp: str
+    duration_ms: int
+    passed: int
+    failed: int
+    warnings: int
+    security_score: int
+    performance_score: int | None = None  # Weighted share of latency SLOs met
+    results: list[TestResult]
+    summary: str
+    timings: TimingSummary | None = None
+    capture_file: str | None = None  # Set for runs with capture enabled
+
+
+class BatchRun(BaseModel):
+    """A batch run over a matrix of targets and protocols."""
+
+    targets: list[str] = Field(min_length=1)
+    protocols: list[str] = Field(min_length=1)
+    concurrency: int = Field(default=DEFAULT_BATCH_CONCURRENCY, ge=1, le=MAX_BATCH_CONCURRENCY)
+    per_host_limit: int = Field(default=DEFAULT_PER_HOST_LIMIT, ge=1, le=MAX_CONCURRENCY)
+    test_concurrency: int = Field(default=DEFAULT_CONCURRENCY, ge=1, le=MAX_CONCURRENCY)
+    in_process: bool = False  # Dispatch to this sandbox's own mocks without a socket
+    deadline_s: float | None = Field(default=None, gt=0, le=MAX_RUN_DEADLINE_S)  # Per suite
+
+
+class BatchRollup(BaseModel):
+    """Aggregate statistics across every cell of a batch run."""
+
+    cells: int
+    cells_passed: int
+    cells_failed: int
+    tests_passed: int
+    tests_failed: int
+    mean_security_score: float
+    min_security_score: int
+
+
+class BatchReport(BaseModel):
+    """Aggregated report for a batch run, one TestReport per cell."""
+
+    batch_id: str
+    timestamp: str
+    duration_ms: int
+    rollup: BatchRollup
+    reports: list[TestReport]
+
+
+class LoadRun(BaseModel):
+    """A load run replaying selected tests against a target.
+
+    With ``rate`` set, requests are started on a fixed schedule (open loop) and
+    ``concurrency`` caps requests in flight; ticks that find the cap reached
+    are counted as dropped. Without ``rate``, ``concurrency`` workers each
+    issue requests back to back (closed loop).
+    """
+
+    target_url: str
+    protocol: str
+    tests: list[str] = Field(min_length=1)
+    duration_s: float = Field(default=10.0, gt=0, le=MAX_LOAD_DURATION_S)
+    rate: float | None = Field(default=None, gt=0, le=MAX_LOAD_RATE)
+    concurrency: int = Field(default=DEFAULT_CONCURRENCY, ge=1, le=MAX_LOAD_CONCURRENCY)
+
+
+class HistogramBucket(BaseModel):
+    """Latency histogram bucket; ``le_ms`` is None for the overflow bucket."""
+
+    le_ms: float | None
+    count: int
+
+
+class LatencyHistogram(BaseModel):
+    """Latency distribution of a set of requests."""
+
+    count: int
+    min_ms: float
+    mean_ms: float
+    p50_ms: float
+    p90_ms: float
+    p99_ms: float
+    max_ms: float
+    buckets: list[HistogramBucket]
+
+
+class LoadTestStats(BaseModel):
+    """Load results for one test definition."""
+
+    test_id: str
+    name: str
+    requests: int
+    passed: int
+    failed: int
+    throughput_rps: float
+    latency: LatencyHistogram
+    status_codes: dict[str, int]
+    errors: dict[str, int]
+
+
+class LoadReport(BaseModel):
+    """Complete load run report."""
+
+    run_id: str
+    target_url: str
+    protocol: str
+    timestamp: str
+    mode: str  # "rate" or "concurrency"
+    duration_ms: int
+    requests: int
+    passed: int
+    failed: int
+    dropped: int
+    throughput_rps: float
+    latency: LatencyHistogram
+    setup: list[TestResult]
+    tests: list[LoadTestStats]
+
+
+class RaceRun(BaseModel):
+    """An idempotency race: identical creates sharing one Idempotency-Key."""
+
+    target_url: str
+    protocol: str
+    requests: int = Field(default=DEFAULT_RACE_REQUESTS, ge=2, le=MAX_RACE_REQUESTS)
+    in_process: bool = False
+
+
+class RaceReport(BaseModel):
+    """Outcome of an idempotency race.
+
+    The race passes when every request succeeded, all responses are
+    byte-identical and they all name the same resource.
+    """
+
+    run_id: str
+    target_url: str
+    protocol: str
+    timestamp: str
+    endpoint: str
+    idempotency_key: str
+    requests: int
+    passed: bool
+    resources_created: int
+    resource_ids: list[str]
+    identical_responses: bool
+    distinct_responses: int
+    status_codes: dict[str, int]
+    errors: dict[str, int]
+    start_skew_ms: float  # Spread of the moments requests were released
+    latency_spread_ms: float  # Slowest minus fastest response
+    latency: LatencyHistogram
+    recommendation: str | None = None
+
+
+class SoakRun(BaseModel):
+    """A soak run cycling a protocol suite for a fixed duration.
+
+    Results are aggregated into windows of ``window_s`` seconds. The first and
+    last ``drift_windows`` windows (default: a quarter of the run each) are
+    compared for drift at significance level ``alpha``. A rise in mean
+    latency must also be at least ``min_change_pct`` percent to count.
+    """
+
+    target_url: str
+    protocol: str
+    duration_s: float = Field(default=3600.0, gt=0, le=MAX_SOAK_DURATION_S)
+    window_s: float = Field(default=60.0, ge=1)
+    interval_s: float = Field(default=0.0, ge=0)  # Pause between suite cycles
+    concurrency: int = Field(default=DEFAULT_CONCURRENCY, ge=1, le=MAX_CONCURRENCY)
+    drift_windows: int | None = Field(default=None, ge=1)
+    alpha: float = Field(default=DEFAULT_ALPHA, gt=0, lt=0.5)
+    min_change_pct: float = Field(default=DEFAULT_MIN_CHANGE_PCT, ge=0)
+    in_process: bool = False
+
+
+class SoakWindow(BaseModel):
+    """Aggregated results of the suite cycles that finished in one window."""
+
+    index: int
+    start_s: float
+    cycles: int
+    tests: int
+    failed: int
+    error_rate: float
+    latency: LatencyHistogram
+    failures: dict[str, int]  # failed results by test id
+
+
+class DriftCheck(BaseModel):
+    """Comparison of one metric between the early and late windows of a soak."""
+
+    metric: str
+    early: float
+    late: float
+    change_pct: float | None
+    statistic: float | None  # z score; None when both sides are constant
+    p_value: float
+    significant: bool
+    direction: str  # "up", "down" or "none"
+
+
+class SoakReport(BaseModel):
+    """Complete soak run report.
+
+    ``drift_detected`` is set when latency or error rate rose significantly
+    between the early and late windows.
+    """
+
+    run_id: str
+    target_url: str
+    protocol: str
+    timestamp: str
+    duration_ms: int
+    window_s: float
+    cycles: int
+    tests: int
+    failed: int
+    error_rate: float
+    latency: LatencyHistogram
+    windows: list[SoakWindow]
+    early_windows: list[int]
+    late_windows: list[int]
+    drift: list[DriftCheck]
+    drift_detected: bool
+    summary: str
+
+
+class DiffRun(BaseModel):
+    """A differential run of one suite against a target and a reference.
+
+    ``reference_url`` defaults to this sandbox's own mock for the protocol.
+    Fields named in ``ignore_fields`` are left out of the comparison.
+    """
+
+    target_url: str
+    protocol: str
+    reference_url: str | None = None
+    concurrency: int = Field(default=DEFAULT_CONCURRENCY, ge=1, le=MAX_CONCURRENCY)
+    ignore_fields: list[str] = Field(default_factory=list)
+    max_differences: int = Field(default=DEFAULT_MAX_DIFFERENCES, ge=1, le=MAX_DIFF_DIFFERENCES)
+    in_process: bool = False
+
+
+class FieldDifference(BaseModel):
+    """A JSON field where the target's response diverges from the reference."""
+
+    path: str
+    kind: str  # missing, unexpected, type, length, value or body
+    reference: Any | None = None
+    target: Any | None = None
+
+
+class TestDiff(BaseModel):
+    """Comparison of one test's responses from the reference and the target."""
+
+    test_id: str
+    name: str
+    endpoint: str | None = None
+    reference_status: int | None = None
+    target_status: int | None = None
+    reference_passed: bool
+    target_passed: bool
+    matches: bool
+    differences: list[FieldDifference] = Field(default_factory=list)
+    truncated: bool = False
+    note: str | None = None
+
+
+class DiffReport(BaseModel):
+    """Complete differential run report."""
+
+    run_id: str
+    target_url: str
+    reference_url: str
+    protocol: str
+    timestamp: str
+    duration_ms: int
+    compared: int
+    matching: int
+    diverging: int
+    differences: int
+    reference_score: int
+    target_score: int
+    tests: list[TestDiff]
+
+
+# ============================================================================
+# Test Definitions
+# ============================================================================
+
+UCP_TESTS = [
+    {
+        "id": "ucp_discovery",
+        "name": "Discovery endpoint returns valid profile",
+        "endpoint": "/.well-known/ucp",
+        "method": "GET",
+        "expected_status": 200,
+        "required_fields": ["name", "version", "payment"],
+        "weight": 20,
+    },
+    {
+        "id": "ucp_discovery_payment_handlers",
+        "name": "Discovery includes payment handlers",
+        "endpoint": "/.well-known/ucp",
+        "method": "GET",
+        "expected_status": 200,
+        "json_path": "payment.handlers",
+        "min_length": 1,
+        "weight": 15,
+    },
+    {
+        "id": "ucp_checkout_create",
+        "name": "Can create checkout session",
+        "endpoint": "/checkout-sessions",
+        "method": "POST",
+        "body": {
+            "currency": "USD",
+            "line_items": [{"item": {"id": "test_product"}, "quantity": 1}],
+        },
+        "expected_status": 201,
+        "required_fields": ["id", "status", "line_items"],
+        "weight": 25,
+    },
+    {
+        "id": "ucp_checkout_get",
+        "name": "Can retrieve checkout session",
+        "depends_on": "ucp_checkout_create",
+        "endpoint_template": "/checkout-sessions/{checkout_id}",
+        "method": "GET",
+        "expected_status": 200,
+        "weight": 15,
+    },
+    {
+        "id": "ucp_idempotency",
+        "name": "Idempotency key is honored",
+        "endpoint": "/checkout-sessions",
+        "method": "POST",
+        "body": {
+            "currency": "USD",
+            "line_items": [{"item": {"id": "test_product"}, "quantity": 1}],
+        },
+        "headers": {"Idempotency-Key": "test-idempotency-key"},
+        "expected_status": 201,
+        "repeat": 2,
+        "expect_same_response": True,
+        "weight": 25,
+    },
+]
+
+ACP_TESTS = [
+    {
+        "id": "acp_discovery",
+        "name": "Discovery endpoint exists",
+        "endpoint": "/.well-known/checkout",
+        "method": "GET",
+        "expected_status": 200,
+        "weight": 20,
+    },
+    {
+        "id": "acp_discovery_api_version",
+        "name": "Discovery includes API-Version",
+        "endpoint": "/.well-known/checkout",
+        "method": "GET",
+        "expected_status": 200,
+        "required_fields": ["api_version"],
+        "weight": 15,
+    },
+    {
+        "id": "acp_session_create",
+        "name": "Can create checkout session",
+        "endpoint": "/checkout_sessions",
+        "method": "POST",
+        "body": {"items": [{"id": "item_123", "quantity": 1}]},
+        "headers": {"API-Version": "2026-01-16"},
+        "expected_status": 201,
+        "required_fields": ["id", "status", "line_items", "totals"],
+        "check": "checkout_session_schema",
+        "weight": 30,
+    },
+    {
+        "id": "acp_session_line_items",
+        "name": "Line items include totals breakdown",
+        "depends_on": "acp_session_create",
+        "check": "line_item_schema",
+        "weight": 20,
+    },
+    {
+        "id": "acp_session_states",
+        "name": "Session status transitions correctly",
+        "depends_on": "acp_session_create",
+        "check": "status_in",
+        "valid_statuses": ["not_ready_for_payment", "ready_for_payment"],
+        "weight": 15,
+    },
+]
+
+# Opt-in tests: not part of the default suites or their scores, run only when
+# selected by id (e.g. in a load run)
+OPT_IN_TESTS = {
+    "UCP": [
+        {
+            "id": "ucp_idempotency_race",
+            "name": "Concurrent duplicates create one resource",
+            "endpoint": "/checkout-sessions",
+            "method": "POST",
+            "body": {
+                "currency": "USD",
+                "line_items": [{"item": {"id": "test_product"}, "quantity": 1}],
+            },
+            "headers": {"Idempotency-Key": "test-idempotency-key"},
+            "expected_status": 201,
+            "repeat": 5,
+            "concurrent": True,
+            "expect_same_response": True,
+            "expect_single_resource": True,
+            "weight": 25,
+        },
+    ],
+    "ACP": [
+        {
+            "id": "acp_idempotency_race",
+            "name": "Concurrent duplicates create one resource",
+            "endpoint": "/checkout_sessions",
+            "method": "POST",
+            "body": {"items": [{"id": "item_123", "quantity": 1}]},
+            "headers": {"API-Version": "2026-01-16", "Idempotency-Key": "test-idempotency-key"},
+            "expected_status": 201,
+            "repeat": 5,
+            "concurrent": True,
+            "expect_same_response": True,
+            "expect_single_resource": True,
+            "weight": 20,
+        },
+    ],
+}
+
+X402_TESTS = [
+    {
+        "id": "x402_info",
+        "name": "Info endpoint returns protocol details",
+        "endpoint": "/info",
+        "method": "GET",
+        "expected_status": 200,
+        "required_fields": ["x402Version", "protocol", "receiver"],
+        "weight": 15,
+    },
+    {
+        "id": "x402_supported",
+        "name": "Facilitator /supported returns CAIP-2 networks",
+        "endpoint": "/supported",
+        "method": "GET",
+        "expected_status": 200,
+        "required_fields": ["kinds", "signers"],
+        "check": "caip2_networks",
+        "weight": 20,
+    },
+    {
+        "id": "x402_402_response",
+        "name": "Protected resource returns 402 with PaymentRequired",
+        "endpoint": "/resource/premium-content",
+        "method": "GET",
+        "expected_status": 402,
+        "check": "x402_v2_format",
+        "weight": 30,
+    },
+    {
+        "id": "x402_verify_endpoint",
+        "name": "Facilitator /verify endpoint exists",
+        "endpoint": "/verify",
+        "method": "POST",
+        "body": {"paymentPayload": {}, "paymentRequirements": {}},
+        "expected_status": 422,  # Invalid payload expected
+        "weight": 15,
+    },
+    {
+        "id": "x402_settle_endpoint",
+        "name": "Facilitator /settle endpoint exists",
+        "endpoint": "/settle",
+        "method": "POST",
+        "body": {"paymentPayload": {}, "paymentRequirements": {}},
+        "expected_status": 422,  # Invalid payload expected
+        "weight": 15,
+    },
+]
+
+AP2_TESTS = [
+    {
+        "id": "ap2_agent_card",
+        "name": "Agent card with AP2 extension",
+        "endpoint": "/.well-known/a2a",
+        "method": "GET",
+        "expected_status": 200,
+        "json_path": "capabilities.extensions",
+        "contains_ap2": True,
+        "weight": 25,
+    },
+    {
+        "id": "ap2_message_handler",
+        "name": "A2A message endpoint accepts messages",
+        "endpoint": "/message",
+        "method": "POST",
+        "body": {
+            "jsonrpc": "2.0",
+            "id": "test-1",
+            "method": "ap2/browseProducts",
+            "params": {},
+        },
+        "expected_status": 200,
+        "weight": 35,
+    },
+]
+
+
+# ============================================================================
+# Test Runner
+# ============================================================================
+
+
+# Definitions are compiled once at import; see app.services.checks
+SUITES: dict[str, list[CompiledTest]] = {
+    "UCP": compile_suite(UCP_TESTS),
+    "ACP": compile_suite(ACP_TESTS),
+    "x402": compile_suite(X402_TESTS),
+    "AP2": compile_suite(AP2_TESTS),
+}
+OPT_IN_SUITES: dict[str, list[CompiledTest]] = {
+    protocol: compile_suite(definitions) for protocol, definitions in OPT_IN_TESTS.items()
+}
+
+
+def with_run_policy(
+    tests: list[CompiledTest], timeout_s: float | None = None, retries: int = 0
+) -> list[CompiledTest]:
+    """Give tests that declare no request policy the run's timeout and retries.
+
+    Retries only go to requests that can safely be repeated: idempotent
+    methods, not sent concurrently.
+    """
+    if timeout_s is None and not retries:
+        return tests
+    policed = []
+    for test in tests:
+        if test.sends_request and test.policy is DEFAULT_POLICY:
+            repeatable = test.method in IDEMPOTENT_METHODS and not test.concurrent
+            policy = RequestPolicy(timeout=timeout_s, retries=retries if repeatable else 0)
+            test = replace(test, policy=policy)
+        policed.append(test)
+    return policed
+
+
+def get_tests(protocol: str, opt_in: bool = False) -> list[CompiledTest]:
+    """Get compiled tests for a protocol, with its opt-in tests if ``opt_in``."""
+    tests = SUITES.get(protocol, [])
+    if opt_in and tests:
+        tests = tests + OPT_IN_SUITES.get(protocol, [])
+    return tests
+
+
+class _PhaseTracer:
+    """httpcore ``trace`` extension that timestamps each request phase.
+
+    Events arrive as ``<layer>.<step>.started``/``.complete`` (for example
+    ``connection.connect_tcp.started`` or ``http11.receive_response_headers.complete``);
+    only the step and edge are kept, each stamped with a monotonic clock.
+    """
+
+    def __init__(self) -> None:
+        self.started = time.perf_counter()
+        self.finished: float | None = None
+        self.marks: dict[str, float] = {}
+
+    async def __call__(self, event: str, info: dict[str, Any]) -> None:
+        self.marks.setdefault(event.split(".", 1)[-1], time.perf_counter())
+
+    def finish(self) -> None:
+        self.finished = time.perf_counter()
+
+    def _span(self, first_step: str, last_step: str | None = None) -> float:
+        """Milliseconds from the start of one step to the end of another.
+
+        A step that raised ends at its ``failed`` event, so a refused
+        connection still reports how long the attempt took.
+        """
+        start = self.marks.get(f"{first_step}.started")
+        last_step = last_step or first_step
+        end = self.marks.get(f"{last_step}.complete", self.marks.get(f"{last_step}.failed"))
+        if start is None or end is None:
+            return 0.0
+        return round((end - start) * 1000, 3)
+
+    def timings(self) -> RequestTimings:
+        end = self.finished if self.finished is not None else time.perf_counter()
+        # In-process transports emit no events: everything is request time
+        first_mark = min(self.marks.values(), default=self.started)
+        headers_received = self.marks.get("receive_response_headers.complete")
+        return RequestTimings(
+            queue_ms=round((first_mark - self.started) * 1000, 3),
+            connect_ms=self._span("connect_tcp"),
+            tls_ms=self._span("start_tls"),
+            send_ms=self._span("send_request_headers", "send_request_body"),
+            wait_ms=self._span("receive_response_headers"),
+            receive_ms=self._span("receive_response_body"),
+            total_ms=round((end - self.started) * 1000, 3),
+            ttfb_ms=round((headers_received - self.started) * 1000, 3) if headers_received else 0.0,
+            new_connection="connect_tcp.started" in self.marks,
+        )
+
+    def duration_ms(self) -> int:
+        end = self.finished if self.finished is not None else time.perf_counter()
+        return int((end - self.started) * 1000)
+
+
+@dataclass(slots=True)
+class _RacedRequest:
+    """One request of a group sent together."""
+
+    response: httpx.Response | None
+    error: httpx.RequestError | None
+    started: float
+    finished: float
+
+    @property
+    def latency_ms(self) -> float:
+        return (self.finished - self.started) * 1000
+
+
+async def _send_together(
+    client: httpx.AsyncClient,
+    method: str,
+    url: str,
+    content: bytes | None,
+    headers: dict[str, str],
+    count: int,
+    tracer: _PhaseTracer | None = None,
+) -> list[_RacedRequest]:
+    """Send ``count`` identical requests released at the same moment.
+
+    Every request waits on a barrier until all of them are ready, so they
+    reach the target as close together as the client's connections allow.
+    ``tracer`` records the phases of the first request.
+    """
+    barrier = asyncio.Barrier(count)
+
+    async def send(traced: bool) -> _RacedRequest:
+        await barrier.wait()
+        started = time.perf_counter()
+        try:
+            response = await client.request(
+                method,
+                url,
+                content=content,
+                headers=headers,
+                extensions={"trace": tracer} if traced and tracer is not None else None,
+            )
+        except httpx.RequestError as e:
+            return _RacedRequest(None, e, started, time.perf_counter())
+        return _RacedRequest(response, None, started, time.perf_counter())
+
+    return await asyncio.gather(*(send(i == 0) for i in range(count)))
+
+
+class _PolicySender:
+    """Sends a test's request under its RequestPolicy, recording every attempt.
+
+    Each attempt is bounded by the policy's timeout and by the run deadline.
+    Transport errors, timeouts and retryable statuses are retried after a
+    full-jitter backoff; a slow attempt is hedged with a duplicate.
+    """
+
+    def __init__(
+        self,
+        client: httpx.AsyncClient,
+        test: CompiledTest,
+        url: str,
+        headers: dict[str, str],
+        deadline: float | None = None,
+        capture: CaptureWriter | None = None,
+    ) -> None:
+        self.client = client
+        self.test = test
+        self.policy = test.policy
+        self.url = url
+        self.headers = headers
+        self.deadline = deadline
+        self.capture = capture
+        self.started = time.perf_counter()
+        self.attempts: list[Attempt] = []
+
+    def timeout(self) -> float | None:
+        """Seconds the next attempt may take, or None for no limit."""
+        limits = [self.policy.timeout] if self.policy.timeout is not None else []
+        if self.deadline is not None:
+            limits.append(max(0.0, self.deadline - time.perf_counter()))
+        return min(limits, default=None)
+
+    def _exhausted(self, retry: int) -> bool:
+        expired = self.deadline is not None and time.perf_counter() >= self.deadline
+        return retry >= self.policy.retries or expired
+
+    def _backoff(self, retry: int) -> float:
+        ceiling = min(self.policy.max_backoff, self.policy.backoff * 2**retry)
+        if self.deadline is not None:
+            ceiling = min(ceiling, max(0.0, self.deadline - time.perf_counter()))
+        return random.uniform(0, ceiling)
+
+    async def _attempt(self, record: Attempt, tracer: _PhaseTracer) -> httpx.Response:
+        began = time.perf_counter()
+        response: httpx.Response | None = None
+        try:
+            async with asyncio.timeout(self.timeout()):
+                response = await self.client.request(
+                    self.test.method,
+                    self.url,
+                    content=self.test.content,
+                    headers=self.headers,
+                    extensions={"trace": tracer},
+                )
+        except asyncio.CancelledError:
+            record.outcome = "cancelled"
+            raise
+        except TimeoutError:
+            record.outcome = "failed"
+            record.error = "Timed out"
+            raise
+        except httpx.RequestError as e:
+            record.outcome = "failed"
+            record.error = str(e) or type(e).__name__
+            raise
+        finally:
+            record.duration_ms = round((time.perf_counter() - began) * 1000, 3)
+            if self.capture is not None:
+                self._capture(record, tracer, response)
+        record.status_code = response.status_code
+        return response
+
+    def _capture(
+        self, record: Attempt, tracer: _PhaseTracer, response: httpx.Response | None
+    ) -> None:
+        self.capture.record(
+            CapturedExchange(
+                test_id=self.test.id,
+                kind=record.kind,
+                attempt=record.number,
+                method=self.test.method,
+                url=self.url,
+                headers=self.headers,
+                content=self.test.content,
+                response=response,
+                timings=tracer.timings(),
+                duration_ms=record.duration_ms,
+                error=record.error or ("Cancelled" if record.outcome == "cancelled" else None),
+            )
+        )
+
+    def _start(
+        self, kind: str, tracer: _PhaseTracer | None = None
+    ) -> tuple[asyncio.Task[httpx.Response], tuple[Attempt, _PhaseTracer]]:
+        record = Attempt(
+            number=len(self.attempts) + 1,
+            kind=kind,
+            started_ms=round((time.perf_counter() - self.started) * 1000, 3),
+        )
+        self.attempts.append(record)
+        tracer = tracer or _PhaseTracer()
+        return asyncio.create_task(self._attempt(record, tracer)), (record, tracer)
+
+    async def _try(
+        self, kind: str, tracer: _PhaseTracer | None
+    ) -> tuple[httpx.Response, Attempt, _PhaseTracer]:
+        """Make one attempt, hedged with a duplicate if it is slow to answer."""
+        task, attempt = self._start(kind, tracer)
+        running = {task: attempt}
+        try:
+            if self.policy.hedge_after is not None:
+                done, _ = await asyncio.wait(running, timeout=self.policy.hedge_after)
+                if not done:
+                    hedge, hedge_attempt = self._start("hedge")
+                    running[hedge] = hedge_attempt
+            error: BaseException | None = None
+            while running:
+                done, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+                for finished in sorted(done, key=lambda t: running[t][0].number):
+                    record, used = running.pop(finished)
+                    if finished.exception() is None:
+                        return finished.result(), record, used
+                    error = error or finished.exception()
+            raise error
+        finally:
+            for pending in running:
+                pending.cancel()
+            if running:
+                await asyncio.gather(*running, return_exceptions=True)
+
+    async def send(
+        self, tracer: _PhaseTracer | None = None
+    ) -> tuple[httpx.Response, _PhaseTracer]:
+        """Send the request, returning the response used and its tracer.
+
+        ``tracer`` records the first attempt. Raises the last attempt's error
+        when every attempt failed.
+        """
+        retry = 0
+        try:
+            while True:
+                try:
+                    response, record, used = await self._try(
+                        "retry" if retry else "initial", tracer if not retry else None
+                    )
+                except (httpx.TransportError, TimeoutError):
+                    if self._exhausted(retry):
+                        raise
+                else:
+                    if self._exhausted(retry) or response.status_code not in self.policy.retry_statuses:
+                        record.outcome = "used"
+                        return response, used
+                    record.outcome = "retried"
+                await asyncio.sleep(self._backoff(retry))
+                retry += 1
+        finally:
+            # Answers that arrived alongside the one used were thrown away
+            for record in self.attempts:
+                if record.outcome is None:
+                    record.outcome = "discarded"
+
+
+def _capture_raced(
+    capture: CaptureWriter,
+    test: CompiledTest,
+    url: str,
+    headers: dict[str, str],
+    raced: list[_RacedRequest],
+    tracer: _PhaseTracer,
+) -> None:
+    """Record a group of requests sent together; only the first was traced."""
+    for number, request in enumerate(raced, 1):
+        error = request.error
+        capture.record(
+            CapturedExchange(
+                test_id=test.id,
+                kind="concurrent",
+                attempt=number,
+                method=test.method,
+                url=url,
+                headers=headers,
+                content=test.content,
+                response=request.response,
+                timings=tracer.timings() if number == 1 else None,
+                duration_ms=round(request.latency_ms, 3),
+                error=(str(error) or type(error).__name__) if error is not None else None,
+            )
+        )
+
+
+def _fresh_idempotency_key(headers: dict[str, str]) -> dict[str, str]:
+    """Make a declared Idempotency-Key unique to this run.
+
+    Otherwise a response cached by an earlier run would satisfy the check
+    without the target ever deduplicating the requests just sent.
+    """
+    key = headers.get("Idempotency-Key")
+    if key is None:
+        return headers
+    return {**headers, "Idempotency-Key": f"{key}-{uuid.uuid4().hex[:12]}"}
+
+
+async def _run_test(
+    client: httpx.AsyncClient,
+    test: CompiledTest,
+    context: dict[str, Any],
+    base_url: str = "",
+    exchanges: dict[str, Exchange] | None = None,
+    deadline: float | None = None,
+    capture: CaptureWriter | None = None,
+) -> TestResult:
+    """Run a single test.
+
+    Tests without an endpoint check the response stored in ``context`` by the
+    test they depend on. A passing test stores its response and captured
+    values in ``context`` for its own dependents. Repeated requests share one
+    Idempotency-Key, fresh for each run, and are sent together when the test
+    is ``concurrent``. With ``exchanges`` every response received, passing or
+    not, is recorded under the test's id. Requests follow the test's
+    RequestPolicy and give up at ``deadline`` (a ``time.perf_counter`` value).
+    With ``capture`` every request sent is also written to the run's capture.
+    """
+    tracer = _PhaseTracer()
+    timings: RequestTimings | None = None
+    sender: _PolicySender | None = None
+    latencies: list[float] = []
+
+    def attempts() -> list[Attempt] | None:
+        if sender is None or not test.policy.repeats_requests:
+            return None
+        return sender.attempts
+
+    try:
+        if test.sends_request:
+            # Build endpoint URL
+            endpoint = test.endpoint
+            if test.endpoint_template is not None:
+                endpoint = test.endpoint_template.format(**context)
+
+            url = f"{base_url}{endpoint}"
+            headers = test.headers if test.repeat == 1 else _fresh_idempotency_key(test.headers)
+            sender = _PolicySender(client, test, url, headers, deadline, capture)
+            bodies: list[bytes] = []
+            if test.concurrent:
+                async with asyncio.timeout(sender.timeout()):
+                    raced = await _send_together(
+                        client, test.method, url, test.content, headers, test.repeat, tracer
+                    )
+                if capture is not None:
+                    _capture_raced(capture, test, url, headers, raced, tracer)
+                for request in raced:
+                    if request.error is not None:
+                        raise request.error
+                timings = tracer.timings()
+                response = raced[0].response
+                bodies = [r.response.content for r in raced]
+                latencies = [r.latency_ms for r in raced]
+            else:
+                for _ in range(test.repeat):
+                    began = time.perf_counter()
+                    response, used = await sender.send(tracer if not bodies else None)
+                    latencies.append((time.perf_counter() - began) * 1000)
+                    if not bodies:
+                        timings = used.timings()
+                    bodies.append(response.content)
+            tracer.finish()
+
+            exchange = Exchange(
+                status_code=response.status_code,
+                headers=response.headers,
+                content=bodies[0],
+                endpoint=endpoint,
+                bodies=bodies,
+            )
+            if exchanges is not None:
+                exchanges[test.id] = exchange
+        else:
+            exchange = context.get("response")
+            if exchange is None:
+                return TestResult(
+                    test_id=test.id,
+                    name=test.name,
+                    passed=False,
+                    duration_ms=0,
+                    error="No response from dependency to inspect",
+                )
+
+        latency_ms = slo_met = slo_failure = None
+        if latencies:
+            latency_ms = round(test.slo.observe(latencies) if test.slo else max(latencies), 3)
+            if test.slo is not None:
+                slo_failure = test.slo.evaluate(latencies)
+                slo_met = slo_failure is None
+
+        failure = test.evaluate(exchange)
+        if failure is None and slo_failure is not None and test.slo.severity == "fail":
+            failure = slo_failure
+        duration_ms = tracer.duration_ms() if test.sends_request else 0
+        if failure is not None:
+            return TestResult(
+                test_id=test.id,
+                name=test.name,
+                passed=False,
+                duration_ms=duration_ms,
+                status_code=exchange.status_code,
+                timings=timings,
+                attempts=attempts(),
+                latency_ms=latency_ms,
+                slo_met=slo_met,
+                error=failure.error,
+                expected=failure.expected,
+                actual=failure.actual,
+                recommendation=failure.recommendation,
+            )
+
+        test.capture(exchange, context)
+        return TestResult(
+            test_id=test.id,
+            name=test.name,
+            passed=True,
+            duration_ms=duration_ms,
+            status_code=exchange.status_code,
+            timings=timings,
+            attempts=attempts(),
+            latency_ms=latency_ms,
+            slo_met=slo_met,
+            warning=slo_failure.error if slo_failure is not None else None,
+            recommendation=slo_failure.recommendation if slo_failure is not None else None,
+        )
+
+    except httpx.RequestError as e:
+        tracer.finish()
+        return TestResult(
+            test_id=test.id,
+            name=test.name,
+            passed=False,
+            duration_ms=tracer.duration_ms(),
+            timings=timings or tracer.timings(),
+            attempts=attempts(),
+            error=f"Request failed: {e}",
+            recommendation="Check that the target server is running and accessible",
+        )
+    except TimeoutError:
+        tracer.finish()
+        return TestResult(
+            test_id=test.id,
+            name=test.name,
+            passed=False,
+            duration_ms=tracer.duration_ms(),
+            timings=timings or tracer.timings(),
+            attempts=attempts(),
+            error="Request timed out",
+            recommendation="Check that the endpoint answers within the test's timeout",
+        )
+    except Exception as e:
+        tracer.finish()
+        return TestResult(
+            test_id=test.id,
+            name=test.name,
+            passed=False,
+            duration_ms=tracer.duration_ms(),
+            attempts=attempts(),
+            error=f"Test error: {e}",
+        )
+
+
+def _skipped_result(test: CompiledTest, reason: str) -> TestResult:
+    """Build the result for a test that was not run."""
+    return TestResult(
+        test_id=test.id,
+        name=test.name,
+        passed=False,
+        duration_ms=0,
+        error=f"{SKIPPED_PREFIX}{reason}",
+    )
+
+
+async def _schedule_tests(
+    client: httpx.AsyncClient,
+    base_url: str,
+    tests: list[CompiledTest],
+    concurrency: int = DEFAULT_CONCURRENCY,
+    exchanges: dict[str, Exchange] | None = None,
+    deadline: float | None = None,
+    capture: CaptureWriter | None = None,
+) -> AsyncIterator[tuple[int, TestResult]]:
+    """Run tests as a dependency graph, yielding results as they complete.
+
+    Tests become ready once every test they depend on has finished, and ready
+    tests are started in definition order with at most ``concurrency`` in
+    flight on the shared client. Dependents of a failed test are skipped
+    without a request. Each result is paired with the test's index in
+    ``tests`` so callers can restore definition order.
+
+    At ``deadline`` (a ``time.perf_counter`` value) tests still running are
+    cancelled and fail, and tests not yet started are skipped.
+    """
+    index = {test.id: i for i, test in enumerate(tests)}
+    # Dependencies outside the suite cannot fail, so they are not edges
+    deps = [tuple(d for d in test.depends_on if d in index) for test in tests]
+    dependents: list[list[int]] = [[] for _ in tests]
+    waiting = [len(d) for d in deps]
+    for i, test_deps in enumerate(deps):
+        for dep_id in test_deps:
+            dependents[index[dep_id]].append(i)
+
+    ready = [i for i, count in enumerate(waiting) if count == 0]
+    heapq.heapify(ready)
+    results: dict[int, TestResult] = {}
+    contexts: dict[int, dict[str, Any]] = {}
+    running: dict[asyncio.Task[TestResult], int] = {}
+
+    def complete(i: int, result: TestResult) -> None:
+        results[i] = result
+        for dependent in dependents[i]:
+            waiting[dependent] -= 1
+            if waiting[dependent] == 0:
+                heapq.heappush(ready, dependent)
+
+    def expired() -> bool:
+        return deadline is not None and time.perf_counter() >= deadline
+
+    try:
+        while (ready or running) and not expired():
+            while ready and len(running) < concurrency:
+                i = heapq.heappop(ready)
+                test = tests[i]
+                failed_dep = next(
+                    (d for d in deps[i] if not results[index[d]].passed), None
+                )
+                if failed_dep is not None:
+                    result = _skipped_result(test, f"dependency '{failed_dep}' failed")
+                    complete(i, result)
+                    yield i, result
+                    continue
+
+                # Each test sees only the context produced by its own dependencies
+                context: dict[str, Any] = {}
+                for dep_id in deps[i]:
+                    context.update(contexts[index[dep_id]])
+                contexts[i] = context
+                task = asyncio.create_task(
+                    _run_test(client, test, context, base_url, exchanges, deadline, capture)
+                )
+                running[task] = i
+
+            if not running:
+                continue
+
+            timeout = None if deadline is None else max(0.0, deadline - time.perf_counter())
+            done, _ = await asyncio.wait(
+                running, timeout=timeout, return_when=asyncio.FIRST_COMPLETED
+            )
+            for task in sorted(done, key=running.__getitem__):
+                i = running.pop(task)
+                result = task.result()
+                complete(i, result)
+                yield i, result
+    finally:
+        for task in running:
+            task.cancel()
+        if running:
+            await asyncio.gather(*running, return_exceptions=True)
+
+    if running:
+        # The deadline passed with these tests in flight; they were cancelled above
+        for i in sorted(running.values()):
+            result = TestResult(
+                test_id=tests[i].id,
+                name=tests[i].name,
+                passed=False,
+                duration_ms=0,
+                error="Run deadline exceeded",
+                recommendation="Raise the run deadline or check why the endpoint is slow",
+            )
+            results[i] = result
+            yield i, result
+        running.clear()
+
+    # Anything left never started, or never became ready
+    reason = "run deadline exceeded" if expired() else "dependency cycle"
+    for i, test in enumerate(tests):
+        if i not in results:
+            yield i, _skipped_result(test, reason)
+
+
+class _ReportBuilder:
+    """Accumulates results for one run into a TestReport.
+
+    Results may arrive in any order; they are reported in definition order.
+    With ``keep_results=False`` only the per-test outcome is retained, so a
+    streamed run never holds every TestResult in memory. With
+    ``keep_exchanges`` the raw responses are kept in ``exchanges`` by test id.
+    With ``capture`` the run records every exchange to ``capture_file``.
+    """
+
+    def __init__(
+        self,
+        target_url: str,
+        protocol: str,
+        tests: list[CompiledTest],
+        keep_results: bool = True,
+        keep_exchanges: bool = False,
+        score_performance: bool = False,
+        capture: bool = False,
+    ) -> None:
+        self.run_id = f"run_{uuid.uuid4().hex[:12]}"
+        self.start_time = datetime.now(timezone.utc)
+        self._started = time.perf_counter()
+        self.target_url = target_url
+        self.protocol = protocol
+        self.tests = tests
+        self.keep_results = keep_results
+        self.exchanges: dict[str, Exchange] | None = {} if keep_exchanges else None
+        self.score_performance = score_performance
+        self.capture_file = capture_path(self.run_id) if capture else None
+        self._passed = [False] * len(tests)
+        self._slo_met: list[bool | None] = [None] * len(tests)
+        self._warnings = 0
+        self._results: list[TestResult | None] = [None] * len(tests) if keep_results else []
+        self._timed = 0
+        self._new_connections = 0
+        self._phase_total: dict[str, float] = dict.fromkeys(PhaseTimings.model_fields, 0.0)
+        self._phase_max: dict[str, float] = dict.fromkeys(PhaseTimings.model_fields, 0.0)
+
+    def add(self, index: int, result: TestResult) -> None:
+        self._passed[index] = result.passed
+        self._slo_met[index] = result.slo_met
+        self._warnings += result.warning is not None
+        if self.keep_results:
+            self._results[index] = result
+        if result.timings is not None:
+            self._timed += 1
+            self._new_connections += result.timings.new_connection
+            for phase in self._phase_total:
+                value = getattr(result.timings, phase)
+                self._phase_total[phase] += value
+                self._phase_max[phase] = max(self._phase_max[phase], value)
+
+    def _timing_summary(self) -> TimingSummary | None:
+        if not self._timed:
+            return None
+        return TimingSummary(
+            requests=self._timed,
+            new_connections=self._new_connections,
+            mean=PhaseTimings(
+                **{k: round(v / self._timed, 3) for k, v in self._phase_total.items()}
+            ),
+            max=PhaseTimings(**self._phase_max),
+            total=PhaseTimings(**{k: round(v, 3) for k, v in self._phase_total.items()}),
+        )
+
+    def build(self) -> TestReport:
+        duration_ms = int((time.perf_counter() - self._started) * 1000)
+        passed = sum(self._passed)
+        failed = len(self._passed) - passed
+
+        # Calculate security score
+        total_weight = sum(t.weight for t in self.tests)
+        earned_weight = sum(
+            t.weight
+            for t, ok, slo_met in zip(self.tests, self._passed, self._slo_met)
+            if ok and not (self.score_performance and slo_met is False)
+        )
+        security_score = int((earned_weight / total_weight) * 100) if total_weight > 0 else 0
+
+        # Calculate performance score over tests with a latency SLO
+        slo_weight = sum(t.weight for t, met in zip(self.tests, self._slo_met) if met is not None)
+        met_weight = sum(t.weight for t, met in zip(self.tests, self._slo_met) if met)
+        performance_score = int((met_weight / slo_weight) * 100) if slo_weight > 0 else None
+
+        # Generate summary
+        if failed == 0:
+            summary = f"All {passed} tests passed! Server is fully compliant with {self.protocol}."
+        else:
+            summary = f"{failed} of {passed + failed} tests failed. Review the results for recommendations."
+        if self._warnings:
+            summary += f" {self._warnings} latency SLO warning{'s' if self._warnings > 1 else ''}."
+
+        return TestReport(
+            run_id=self.run_id,
+            target_url=self.target_url,
+            protocol=self.protocol,
+            timestamp=self.start_time.isoformat(),
+            duration_ms=duration_ms,
+            passed=passed,
+            failed=failed,
+            warnings=self._warnings,
+            security_score=security_score,
+            performance_score=performance_score,
+            results=[r for r in self._results if r is not None],
+            summary=summary,
+            timings=self._timing_summary(),
+            capture_file=str(self.capture_file) if self.capture_file is not None else None,
+        )
+
+
+async def _iter_run(
+    builder: _ReportBuilder,
+    concurrency: int = DEFAULT_CONCURRENCY,
+    client: httpx.AsyncClient | None = None,
+    in_process: bool = False,
+    deadline_s: float | None = None,
+) -> AsyncIterator[tuple[int, TestResult]]:
+    """Run the builder's suite, recording and yielding results as they complete.
+
+    Without an explicit ``client`` the run borrows one from the process-wide
+    pool, or opens a private client when no pool is installed. ``in_process``
+    asks the pool for its ASGI client; only pass it for sandbox targets.
+    Work still outstanding ``deadline_s`` seconds after the start is cancelled.
+    Exchanges are written to the builder's ``capture_file``, if it has one.
+    """
+    base_url = builder.target_url.rstrip("/")
+    deadline = time.perf_counter() + deadline_s if deadline_s is not None else None
+    pool = get_client_pool()
+    if client is not None:
+        scope = nullcontext(client)
+    elif pool is not None:
+        scope = pool.client(builder.target_url, in_process=in_process)
+    else:
+        scope = httpx.AsyncClient(timeout=30.0)
+    capture = None
+    if builder.capture_file is not None:
+        settings = CaptureSettings()
+        capture = CaptureWriter(
+            builder.capture_file, level=settings.level, max_queue=settings.max_queue
+        )
+    async with scope as active_client, capture or nullcontext():
+        async for i, result in _schedule_tests(
+            active_client,
+            base_url,
+            builder.tests,
+            concurrency,
+            builder.exchanges,
+            deadline,
+            capture,
+        ):
+            builder.add(i, result)
+            yield i, result
+
+
+async def run_tests(
+    target_url: str,
+    protocol: str,
+    concurrency: int = DEFAULT_CONCURRENCY,
+    client: httpx.AsyncClient | None = None,
+    in_process: bool = False,
+    deadline_s: float | None = None,
+    score_performance: bool = False,
+    capture: bool = False,
+    timeout_s: float | None = None,
+    retries: int = 0,
+) -> TestReport:
+    """Run all tests for a protocol against a target URL.
+
+    Pass ``client`` to share connections with other runs; otherwise a client
+    is borrowed from the shared pool (or opened for this run). Set
+    ``in_process`` to dispatch to the sandbox app without a socket when the
+    target is one of its own mock servers. With ``deadline_s`` the run stops
+    after that many seconds, failing or skipping the tests left. With
+    ``score_performance`` a test that misses its latency SLO earns no score.
+    With ``capture`` every exchange is recorded to the report's ``capture_file``.
+    ``timeout_s`` and ``retries`` apply to tests without a request policy of
+    their own (see ``with_run_policy``).
+    """
+    builder = _ReportBuilder(
+        target_url,
+        protocol,
+        with_run_policy(get_tests(protocol), timeout_s, retries),
+        score_performance=score_performance,
+        capture=capture,
+    )
+    async for _ in _iter_run(builder, concurrency, client, in_process, deadline_s):
+        pass
+    return builder.build()
+
+
+async def stream_tests(
+    target_url: str,
+    protocol: str,
+    concurrency: int = DEFAULT_CONCURRENCY,
+    in_process: bool = False,
+    deadline_s: float | None = None,
+    score_performance: bool = False,
+    capture: bool = False,
+    timeout_s: float | None = None,
+    retries: int = 0,
+) -> AsyncIterator[dict[str, Any]]:
+    """Run all tests for a protocol, yielding events as results complete.
+
+    Yields a ``start`` event, one ``result`` event per test in completion
+    order, then a ``report`` event with the TestReport summary (without the
+    per-test results, which have already been sent). Closing the iterator
+    cancels any tests still in flight.
+    """
+    builder = _ReportBuilder(
+        target_url,
+        protocol,
+        with_run_policy(get_tests(protocol), timeout_s, retries),
+        keep_results=False,
+        score_performance=score_performance,
+        capture=capture,
+    )
+    yield {
+        "event": "start",
+        "run_id": builder.run_id,
+        "target_url": target_url,
+        "protocol": protocol,
+        "test_count": len(builder.tests),
+    }
+    async for i, result in _iter_run(
+        builder, concurrency, in_process=in_process, deadline_s=deadline_s
+    ):
+        yield {"event": "result", "index": i, "result": result.model_dump(mode="json")}
+    yield {"event": "report", "report": builder.build().model_dump(mode="json", exclude={"results"})}
+
+
+async def run_batch(
+    targets: list[str],
+    protocols: list[str],
+    concurrency: int = DEFAULT_BATCH_CONCURRENCY,
+    per_host_limit: int = DEFAULT_PER_HOST_LIMIT,
+    test_concurrency: int = DEFAULT_CONCURRENCY,
+    in_process_targets: frozenset[str] = frozenset(),
+    deadline_s: float | None = None,
+) -> BatchReport:
+    """Run every protocol suite against every target.
+
+    At most ``concurrency`` suites run at once across the whole batch. Suites
+    against the same host share one client that holds at most
+    ``per_host_limit`` connections, so a host with many protocols or paths is
+    never hit harder than that. Clients come from the process-wide pool when
+    one is installed, otherwise from a pool that lives for this batch.
+    Targets in ``in_process_targets`` are dispatched to the sandbox app
+    without a socket. ``deadline_s`` bounds each suite from when it starts.
+    """
+    batch_id = f"batch_{uuid.uuid4().hex[:12]}"
+    start_time = datetime.now(timezone.utc)
+    started = time.perf_counter()
+    cells = [(target, protocol) for target in targets for protocol in protocols]
+    budget = asyncio.Semaphore(concurrency)
+
+    shared_pool = get_client_pool()
+    pool = shared_pool or ClientPool()
+
+    async def run_cell(target_url: str, protocol: str) -> TestReport:
+        in_process = target_url in in_process_targets
+        async with budget, pool.client(target_url, per_host_limit, in_process) as client:
+            return await run_tests(
+                target_url, protocol, test_concurrency, client=client, deadline_s=deadline_s
+            )
+
+    try:
+        reports = await asyncio.gather(*(run_cell(t, p) for t, p in cells))
+    finally:
+        if shared_pool is None:
+            await pool.close()
+
+    duration_ms = int((time.perf_counter() - started) * 1000)
+    scores = [r.security_score for r in reports]
+    cells_passed = sum(1 for r in reports if r.failed == 0)
+
+    return BatchReport(
+        batch_id=batch_id,
+        timestamp=start_time.isoformat(),
+        duration_ms=duration_ms,
+        rollup=BatchRollup(
+            cells=len(reports),
+            cells_passed=cells_passed,
+            cells_failed=len(reports) - cells_passed,
+            tests_passed=sum(r.passed for r in reports),
+            tests_failed=sum(r.failed for r in reports),
+            mean_security_score=round(sum(scores) / len(scores), 1) if scores else 0.0,
+            min_security_score=min(scores, default=0),
+        ),
+        reports=list(reports),
+    )
+
+
+def _percentile(ordered: list[float], pct: float) -> float:
+    """Nearest-rank percentile of an ascending list."""
+    if not ordered:
+        return 0.0
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def _latency_histogram(samples: list[float]) -> LatencyHistogram:
+    """Summarize latency samples (ms) into percentiles and fixed buckets."""
+    ordered = sorted(samples)
+    counts = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+    for sample in ordered:
+        counts[bisect.bisect_left(LATENCY_BUCKETS_MS, sample)] += 1
+    bounds: list[float | None] = [*LATENCY_BUCKETS_MS, None]
+
+    return LatencyHistogram(
+        count=len(ordered),
+        min_ms=round(ordered[0], 3) if ordered else 0.0,
+        mean_ms=round(sum(ordered) / len(ordered), 3) if ordered else 0.0,
+        p50_ms=round(_percentile(ordered, 50), 3),
+        p90_ms=round(_percentile(ordered, 90), 3),
+        p99_ms=round(_percentile(ordered, 99), 3),
+        max_ms=round(ordered[-1], 3) if ordered else 0.0,
+        buckets=[HistogramBucket(le_ms=le, count=n) for le, n in zip(bounds, counts)],
+    )
+
+
+def _stats_histogram(stats: RunningStats) -> LatencyHistogram:
+    """Summarize a rolling aggregate; percentiles are interpolated within buckets."""
+    bounds: list[float | None] = [*LATENCY_BUCKETS_MS, None]
+    return LatencyHistogram(
+        count=stats.count,
+        min_ms=round(stats.min, 3) if stats.count else 0.0,
+        mean_ms=round(stats.mean, 3),
+        p50_ms=round(stats.percentile(50), 3),
+        p90_ms=round(stats.percentile(90), 3),
+        p99_ms=round(stats.percentile(99), 3),
+        max_ms=round(stats.max, 3) if stats.count else 0.0,
+        buckets=[HistogramBucket(le_ms=le, count=n) for le, n in zip(bounds, stats.buckets)],
+    )
+
+
+class _LoadSamples:
+    """Raw samples collected for one test during a load run."""
+
+    def __init__(self, test: CompiledTest) -> None:
+        self.test = test
+        self.latencies: list[float] = []
+        self.passed = 0
+        self.status_codes: Counter[str] = Counter()
+        self.errors: Counter[str] = Counter()
+
+    def add(self, result: TestResult, latency_ms: float) -> None:
+        self.latencies.append(latency_ms)
+        if result.passed:
+            self.passed += 1
+        else:
+            self.errors[result.error or "unknown"] += 1
+        status = str(result.status_code) if result.status_code is not None else "no_response"
+        self.status_codes[status] += 1
+
+    def stats(self, elapsed_s: float) -> LoadTestStats:
+        requests = len(self.latencies)
+        return LoadTestStats(
+            test_id=self.test.id,
+            name=self.test.name,
+            requests=requests,
+            passed=self.passed,
+            failed=requests - self.passed,
+            throughput_rps=round(requests / elapsed_s, 2) if elapsed_s > 0 else 0.0,
+            latency=_latency_histogram(self.latencies),
+            status_codes=dict(self.status_codes),
+            errors=dict(self.errors),
+        )
+
+
+def _with_dependencies(
+    tests: list[CompiledTest], selected: list[str]
+) -> tuple[list[CompiledTest], list[CompiledTest]]:
+    """Split the suite into selected tests and the prerequisites they need.
+
+    Both lists are in definition order. Prerequisites are found transitively.
+    """
+    by_id = {t.id: t for t in tests}
+    needed: set[str] = set()
+    stack = [dep for test_id in selected for dep in by_id[test_id].depends_on]
+    while stack:
+        dep_id = stack.pop()
+        if dep_id in by_id and dep_id not in needed:
+            needed.add(dep_id)
+            stack.extend(by_id[dep_id].depends_on)
+
+    chosen = set(selected)
+    return (
+        [t for t in tests if t.id in chosen],
+        [t for t in tests if t.id in needed],
+    )
+
+
+async def run_load(
+    target_url: str,
+    protocol: str,
+    test_ids: list[str],
+    duration_s: float = 10.0,
+    rate: float | None = None,
+    concurrency: int = DEFAULT_CONCURRENCY,
+) -> LoadReport:
+    """Replay selected tests against a target for a fixed duration.
+
+    Every request goes through ``_run_test``, so a request only counts as
+    passed under load if it would pass the correctness suite. Prerequisites of
+    the selected tests run once beforehand to populate the shared context
+    (e.g. a checkout id for ``ucp_checkout_get``).
+    """
+    run_id = f"load_{uuid.uuid4().hex[:12]}"
+    start_time = datetime.now(timezone.utc)
+    selected, prerequisites = _with_dependencies(get_tests(protocol, opt_in=True), test_ids)
+    samples = [_LoadSamples(test) for test in selected]
+    base_url = target_url.rstrip("/")
+    context: dict[str, Any] = {}
+    setup: list[TestResult] = []
+    dropped = 0
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(timeout=30.0, limits=limits) as client:
+        for test in prerequisites:
+            setup.append(await _run_test(client, test, context, base_url))
+
+        picks = itertools.cycle(range(len(selected)))
+
+        async def fire(i: int) -> None:
+            # Copy the context so no request sees another's writes
+            began = time.perf_counter()
+            result = await _run_test(client, selected[i], dict(context), base_url)
+            samples[i].add(result, (time.perf_counter() - began) * 1000)
+
+        load_start = time.perf_counter()
+        deadline = load_start + duration_s
+
+        if all(r.passed for r in setup):
+            if rate is not None:
+                in_flight: set[asyncio.Task[None]] = set()
+                for tick in itertools.count():
+                    due = load_start + tick / rate
+                    if due >= deadline:
+                        break
+                    await asyncio.sleep(max(0.0, due - time.perf_counter()))
+                    if len(in_flight) >= concurrency:
+                        dropped += 1
+                        continue
+                    task = asyncio.create_task(fire(next(picks)))
+                    in_flight.add(task)
+                    task.add_done_callback(in_flight.discard)
+                if in_flight:
+                    await asyncio.gather(*in_flight)
+            else:
+
+                async def worker() -> None:
+                    while time.perf_counter() < deadline:
+                        await fire(next(picks))
+
+                await asyncio.gather(*(worker() for _ in range(concurrency)))
+
+        elapsed_s = time.perf_counter() - load_start
+
+    stats = [s.stats(elapsed_s) for s in samples]
+    requests = sum(s.requests for s in stats)
+    passed = sum(s.passed for s in stats)
+
+    return LoadReport(
+        run_id=run_id,
+        target_url=target_url,
+        protocol=protocol,
+        timestamp=start_time.isoformat(),
+        mode="rate" if rate is not None else "concurrency",
+        duration_ms=int(elapsed_s * 1000),
+        requests=requests,
+        passed=passed,
+        failed=requests - passed,
+        dropped=dropped,
+        throughput_rps=round(requests / elapsed_s, 2) if elapsed_s > 0 else 0.0,
+        latency=_latency_histogram([ms for s in samples for ms in s.latencies]),
+        setup=setup,
+        tests=stats,
+    )
+
+
+class _SoakWindow:
+    """Rolling aggregate of the suite cycles finished in one soak window."""
+
+    def __init__(self, index: int) -> None:
+        self.index = index
+        self.latency = RunningStats(LATENCY_BUCKETS_MS)
+        self.cycles = 0
+        self.tests = 0
+        self.failed = 0
+        self.failures: Counter[str] = Counter()
+
+    def add(self, report: TestReport) -> None:
+        self.cycles += 1
+        for result in report.results:
+            # A skipped test already counted as its dependency's failure
+            if result.error is not None and result.error.startswith(SKIPPED_PREFIX):
+                continue
+            self.tests += 1
+            if not result.passed:
+                self.failed += 1
+                self.failures[result.test_id] += 1
+            if result.timings is not None:
+                self.latency.add(result.timings.total_ms)
+
+    def summary(self, window_s: float) -> SoakWindow:
+        return SoakWindow(
+            index=self.index,
+            start_s=self.index * window_s,
+            cycles=self.cycles,
+            tests=self.tests,
+            failed=self.failed,
+            error_rate=round(self.failed / self.tests, 4) if self.tests else 0.0,
+            latency=_stats_histogram(self.latency),
+            failures=dict(self.failures),
+        )
+
+
+def _drift_check(test: DriftTest) -> DriftCheck:
+    return DriftCheck(
+        metric=test.metric,
+        early=round(test.early, 4),
+        late=round(test.late, 4),
+        change_pct=round(test.change_pct, 2) if test.change_pct is not None else None,
+        statistic=round(test.statistic, 3) if math.isfinite(test.statistic) else None,
+        p_value=test.p_value,
+        significant=test.significant,
+        direction=test.direction,
+    )
+
+
+async def run_soak(
+    target_url: str,
+    protocol: str,
+    duration_s: float,
+    window_s: float = 60.0,
+    interval_s: float = 0.0,
+    concurrency: int = DEFAULT_CONCURRENCY,
+    drift_windows: int | None = None,
+    alpha: float = DEFAULT_ALPHA,
+    min_change_pct: float = DEFAULT_MIN_CHANGE_PCT,
+    in_process: bool = False,
+) -> SoakReport:
+    """Cycle a protocol suite with ``run_tests`` until ``duration_s`` has passed.
+
+    Each cycle's report is folded into the window it finished in and then
+    dropped, so memory stays constant however long the soak runs. Latency is
+    the total time of each request; error rate counts failed tests, not
+    tests skipped because a dependency failed.
+    """
+    run_id = f"soak_{uuid.uuid4().hex[:12]}"
+    start_time = datetime.now(timezone.utc)
+    window_count = max(1, math.ceil(duration_s / window_s))
+    windows = [_SoakWindow(i) for i in range(window_count)]
+    started = time.perf_counter()
+    deadline = started + duration_s
+
+    while time.perf_counter() < deadline:
+        report = await run_tests(target_url, protocol, concurrency, in_process=in_process)
+        index = int((time.perf_counter() - started) // window_s)
+        # A cycle that overruns the deadline still belongs to the last window
+        windows[min(index, window_count - 1)].add(report)
+        if interval_s:
+            await asyncio.sleep(min(interval_s, max(0.0, deadline - time.perf_counter())))
+
+    active = [w for w in windows if w.cycles]
+    span = drift_windows or max(1, len(active) // 4)
+    span = min(span, len(active) // 2)
+    early = active[:span]
+    late = active[len(active) - span:] if span else []
+
+    drift: list[DriftCheck] = []
+    if early and late:
+        drift = [
+            _drift_check(
+                mean_drift(
+                    "latency_mean_ms",
+                    merged((w.latency for w in early), LATENCY_BUCKETS_MS),
+                    merged((w.latency for w in late), LATENCY_BUCKETS_MS),
+                    alpha,
+                    min_change_pct,
+                )
+            ),
+            _drift_check(
+                rate_drift(
+                    "error_rate",
+                    sum(w.failed for w in early),
+                    sum(w.tests for w in early),
+                    sum(w.failed for w in late),
+                    sum(w.tests for w in late),
+                    alpha,
+                )
+            ),
+        ]
+    drift_detected = any(d.significant and d.direction == "up" for d in drift)
+
+    tests = sum(w.tests for w in windows)
+    failed = sum(w.failed for w in windows)
+    cycles = sum(w.cycles for w in windows)
+    if not drift:
+        summary = f"{cycles} cycles in {len(active)} windows; too few windows to test for drift."
+    elif drift_detected:
+        risen = ", ".join(d.metric for d in drift if d.significant and d.direction == "up")
+        summary = f"{cycles} cycles; {risen} rose significantly between early and late windows."
+    else:
+        summary = f"{cycles} cycles; no significant degradation between early and late windows."
+
+    return SoakReport(
+        run_id=run_id,
+        target_url=target_url,
+        protocol=protocol,
+        timestamp=start_time.isoformat(),
+        duration_ms=int((time.perf_counter() - started) * 1000),
+        window_s=window_s,
+        cycles=cycles,
+        tests=tests,
+        failed=failed,
+        error_rate=round(failed / tests, 4) if tests else 0.0,
+        latency=_stats_histogram(merged((w.latency for w in windows), LATENCY_BUCKETS_MS)),
+        windows=[w.summary(window_s) for w in windows],
+        early_windows=[w.index for w in early],
+        late_windows=[w.index for w in late],
+        drift=drift,
+        drift_detected=drift_detected,
+        summary=summary,
+    )
+
+
+# Per protocol: the test whose request warms up connections, and the create
+# test replayed by an idempotency race
+RACE_TESTS = {
+    "UCP": ("ucp_discovery", "ucp_checkout_create"),
+    "ACP": ("acp_discovery", "acp_session_create"),
+}
+
+
+async def run_race(
+    target_url: str,
+    protocol: str,
+    requests: int = DEFAULT_RACE_REQUESTS,
+    in_process: bool = False,
+) -> RaceReport:
+    """Race identical creates that share one Idempotency-Key.
+
+    ``requests`` connections are opened first with the protocol's discovery
+    request, then every create is released from a barrier at once, so the
+    duplicates arrive while the first is still being processed.
+    """
+    run_id = f"race_{uuid.uuid4().hex[:12]}"
+    start_time = datetime.now(timezone.utc)
+    by_id = {t.id: t for t in get_tests(protocol)}
+    warm_up, create = (by_id[test_id] for test_id in RACE_TESTS[protocol])
+    base_url = target_url.rstrip("/")
+    key = f"race-{uuid.uuid4().hex}"
+    headers = {**create.headers, "Idempotency-Key": key}
+    pool = get_client_pool()
+    if in_process and pool is not None:
+        scope = pool.client(target_url, in_process=True)
+    else:
+        limits = httpx.Limits(max_connections=requests, max_keepalive_connections=requests)
+        scope = httpx.AsyncClient(timeout=30.0, limits=limits)
+
+    async with scope as client:
+        await _send_together(
+            client, warm_up.method, f"{base_url}{warm_up.endpoint}", None, {}, requests
+        )
+        raced = await _send_together(
+            client, create.method, f"{base_url}{create.endpoint}", create.content, headers, requests
+        )
+
+    status_codes: Counter[str] = Counter()
+    errors: Counter[str] = Counter()
+    bodies: set[bytes] = set()
+    resource_ids: set[str] = set()
+    for request in raced:
+        if request.response is None:
+            status_codes["no_response"] += 1
+            errors[f"Request failed: {request.error}"] += 1
+            continue
+        response = request.response
+        status_codes[str(response.status_code)] += 1
+        bodies.add(response.content)
+        exchange = Exchange(
+            status_code=response.status_code,
+            headers=response.headers,
+            content=response.content,
+            endpoint=create.endpoint,
+        )
+        # Every duplicate must pass the create test on its own
+        failure = create.evaluate(exchange)
+        if failure is not None:
+            errors[failure.error] += 1
+            continue
+        data = exchange.json()
+        if isinstance(data, dict) and data.get("id") is not None:
+            resource_ids.add(str(data["id"]))
+
+    starts = [r.started for r in raced]
+    latencies = [r.latency_ms for r in raced]
+    identical = len(bodies) == 1 and not status_codes["no_response"]
+    passed = not errors and identical and len(resource_ids) == 1
+
+    recommendation = None
+    if len(resource_ids) > 1:
+        recommendation = (
+            "Creates with the same Idempotency-Key raced past the cache lookup; "
+            "hold a per-key lock or reserve the key before creating the resource"
+        )
+    elif not passed:
+        recommendation = "Return the stored response, byte for byte, for every duplicate request"
+
+    return RaceReport(
+        run_id=run_id,
+        target_url=target_url,
+        protocol=protocol,
+        timestamp=start_time.isoformat(),
+        endpoint=create.endpoint,
+        idempotency_key=key,
+        requests=requests,
+        passed=passed,
+        resources_created=len(resource_ids),
+        resource_ids=sorted(resource_ids),
+        identical_responses=identical,
+        distinct_responses=len(bodies),
+        status_codes=dict(status_codes),
+        errors=dict(errors),
+        start_skew_ms=round((max(starts) - min(starts)) * 1000, 3),
+        latency_spread_ms=round(max(latencies) - min(latencies), 3),
+        latency=_latency_histogram(latencies),
+        recommendation=recommendation,
+    )
+
+
+def _diff_test(
+    differ: JsonDiffer,
+    test: CompiledTest,
+    reference: tuple[TestResult, Exchange | None],
+    target: tuple[TestResult, Exchange | None],
+) -> TestDiff:
+    """Compare the responses the reference and the target gave to one test."""
+    (reference_result, reference_exchange), (target_result, target_exchange) = reference, target
+    differences: list[Difference] = []
+    truncated = False
+    note = None
+
+    if reference_exchange is None:
+        note = f"No response from reference: {reference_result.error}"
+    elif target_exchange is None:
+        note = f"No response from target: {target_result.error}"
+    elif reference_exchange.content != target_exchange.content:
+        try:
+            differences, truncated = differ.diff(reference_exchange.json(), target_exchange.json())
+        except json.JSONDecodeError:
+            differences = [
+                Difference(
+                    "",
+                    "body",
+                    f"{len(reference_exchange.content)} bytes",
+                    f"{len(target_exchange.content)} bytes",
+                )
+            ]
+
+    exchange = target_exchange or reference_exchange
+    reference_status = reference_exchange.status_code if reference_exchange else None
+    target_status = target_exchange.status_code if target_exchange else None
+    return TestDiff(
+        test_id=test.id,
+        name=test.name,
+        endpoint=exchange.endpoint if exchange else test.endpoint,
+        reference_status=reference_status,
+        target_status=target_status,
+        reference_passed=reference_result.passed,
+        target_passed=target_result.passed,
+        matches=note is None and reference_status == target_status and not differences,
+        differences=[
+            FieldDifference(path=d.path, kind=d.kind, reference=d.reference, target=d.candidate)
+            for d in differences
+        ],
+        truncated=truncated,
+        note=note,
+    )
+
+
+async def run_diff(
+    target_url: str,
+    protocol: str,
+    reference_url: str,
+    concurrency: int = DEFAULT_CONCURRENCY,
+    ignore_fields: list[str] | None = None,
+    max_differences: int = DEFAULT_MAX_DIFFERENCES,
+    reference_in_process: bool = False,
+    target_in_process: bool = False,
+) -> DiffReport:
+    """Run a suite against a reference and a target at once and diff their responses.
+
+    Each side runs its own dependency graph, so dependent requests use ids the
+    same server issued. Only tests that send a request are compared. The
+    comparison runs in a worker thread so diffing large payloads does not
+    stall other requests.
+    """
+    run_id = f"diff_{uuid.uuid4().hex[:12]}"
+    start_time = datetime.now(timezone.utc)
+    started = time.perf_counter()
+    tests = get_tests(protocol)
+    reference = _ReportBuilder(reference_url, protocol, tests, keep_exchanges=True)
+    target = _ReportBuilder(target_url, protocol, tests, keep_exchanges=True)
+
+    async def drain(builder: _ReportBuilder, in_process: bool) -> TestReport:
+        async for _ in _iter_run(builder, concurrency, in_process=in_process):
+            pass
+        return builder.build()
+
+    reference_report, target_report = await asyncio.gather(
+        drain(reference, reference_in_process),
+        drain(target, target_in_process),
+    )
+
+    differ = JsonDiffer(ignore=ignore_fields or (), max_differences=max_differences)
+
+    def compare() -> list[TestDiff]:
+        return [
+            _diff_test(
+                differ,
+                test,
+                (reference_result, reference.exchanges.get(test.id)),
+                (target_result, target.exchanges.get(test.id)),
+            )
+            for test, reference_result, target_result in zip(
+                tests, reference_report.results, target_report.results
+            )
+            if test.sends_request
+        ]
+
+    diffs = await asyncio.to_thread(compare)
+    matching = sum(d.matches for d in diffs)
+    return DiffReport(
+        run_id=run_id,
+        target_url=target_url,
+        reference_url=reference_url,
+        protocol=protocol,
+        timestamp=start_time.isoformat(),
+        duration_ms=int((time.perf_counter() - started) * 1000),
+        compared=len(diffs),
+        matching=matching,
+        diverging=len(diffs) - matching,
+        differences=sum(len(d.differences) for d in diffs),
+        reference_score=reference_report.security_score,
+        target_score=target_report.security_score,
+        tests=diffs,
+    )
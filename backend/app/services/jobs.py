@@ -0,0 +1,213 @@
+"""Background Job Queue - Bounded async workers for long-running inspector runs.
+
+Jobs are submitted as coroutine factories and executed by a fixed number of
+worker tasks, so hundreds of queued suites never run at once. Finished jobs
+are kept for ``result_ttl`` seconds, up to ``max_retained`` of them, then
+evicted oldest first.
+"""
+
+import asyncio
+import time
+import uuid
+from collections import OrderedDict
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass, field
+from datetime import UTC, datetime
+from enum import StrEnum
+from typing import Any
+
+from pydantic_settings import BaseSettings, SettingsConfigDict
+
+
+class JobQueueSettings(BaseSettings):
+    """Job queue configuration, read from ``APS_INSPECTOR_JOB_*`` environment variables."""
+
+    model_config = SettingsConfigDict(env_prefix="APS_INSPECTOR_JOB_")
+
+    workers: int = 4
+    max_pending: int = 1000
+    max_retained: int = 1000
+    result_ttl: float = 3600.0  # seconds a finished job is kept
+
+
+class JobStatus(StrEnum):
+    """Lifecycle of a queued job."""
+
+    QUEUED = "queued"
+    RUNNING = "running"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+    CANCELLED = "cancelled"
+
+
+FINISHED_STATUSES = {JobStatus.SUCCEEDED, JobStatus.FAILED, JobStatus.CANCELLED}
+
+
+class QueueFullError(Exception):
+    """Raised when a job is submitted to a full queue."""
+
+
+@dataclass
+class Job:
+    """A unit of work and its outcome."""
+
+    id: str
+    run: Callable[[], Awaitable[Any]]
+    metadata: dict[str, Any] = field(default_factory=dict)
+    status: JobStatus = JobStatus.QUEUED
+    submitted_at: datetime = field(default_factory=lambda: datetime.now(UTC))
+    started_at: datetime | None = None
+    finished_at: datetime | None = None
+    result: Any | None = None
+    error: str | None = None
+    _finished_monotonic: float | None = None
+    _task: asyncio.Task[Any] | None = None
+
+    @property
+    def finished(self) -> bool:
+        return self.status in FINISHED_STATUSES
+
+    def describe(self) -> dict[str, Any]:
+        """Status fields of the job, without its result."""
+        return {
+            "job_id": self.id,
+            "status": self.status.value,
+            "submitted_at": self.submitted_at.isoformat(),
+            "started_at": self.started_at.isoformat() if self.started_at else None,
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None,
+            "error": self.error,
+            **self.metadata,
+        }
+
+
+class JobQueue:
+    """Runs submitted jobs on a bounded pool of worker tasks."""
+
+    def __init__(self, settings: JobQueueSettings | None = None) -> None:
+        self.settings = settings or JobQueueSettings()
+        self._queue: asyncio.Queue[Job] = asyncio.Queue(maxsize=self.settings.max_pending)
+        self._jobs: dict[str, Job] = {}
+        # Finished job ids in completion order, oldest first
+        self._finished: OrderedDict[str, None] = OrderedDict()
+        self._workers: list[asyncio.Task[None]] = []
+        self.completed = 0
+
+    async def start(self) -> None:
+        """Start the worker tasks."""
+        if not self._workers:
+            self._workers = [
+                asyncio.create_task(self._worker()) for _ in range(self.settings.workers)
+            ]
+
+    async def close(self) -> None:
+        """Cancel running jobs and stop the workers."""
+        for job in self._jobs.values():
+            if job._task is not None:
+                job._task.cancel()
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    def submit(self, run: Callable[[], Awaitable[Any]], **metadata: Any) -> Job:
+        """Queue a job; raises QueueFullError if ``max_pending`` jobs are waiting."""
+        self._prune()
+        job = Job(id=f"job_{uuid.uuid4().hex[:12]}", run=run, metadata=metadata)
+        try:
+            self._queue.put_nowait(job)
+        except asyncio.QueueFull:
+            raise QueueFullError(f"{self.settings.max_pending} jobs already queued") from None
+        self._jobs[job.id] = job
+        return job
+
+    def get(self, job_id: str) -> Job | None:
+        """Look up a job that is queued, running or still retained."""
+        self._prune()
+        return self._jobs.get(job_id)
+
+    def cancel(self, job_id: str) -> Job | None:
+        """Cancel a queued or running job. Finished jobs are left unchanged."""
+        job = self.get(job_id)
+        if job is None or job.finished:
+            return job
+        if job._task is not None:
+            job._task.cancel()
+        else:
+            # Still queued: the worker that dequeues it will skip it
+            self._finish(job, JobStatus.CANCELLED)
+        return job
+
+    def stats(self) -> dict[str, Any]:
+        """Queue depth and job counts by status."""
+        self._prune()
+        counts = dict.fromkeys((s.value for s in JobStatus), 0)
+        for job in self._jobs.values():
+            counts[job.status.value] += 1
+        return {
+            "workers": len(self._workers),
+            "queued": self._queue.qsize(),
+            "jobs": counts,
+            "completed": self.completed,
+        }
+
+    def _finish(self, job: Job, status: JobStatus) -> None:
+        job.status = status
+        job.finished_at = datetime.now(UTC)
+        job._finished_monotonic = time.monotonic()
+        job._task = None
+        job.run = _noop  # Drop references held by the job's closure
+        self._finished[job.id] = None
+        self.completed += 1
+        self._prune()
+
+    def _prune(self) -> None:
+        cutoff = time.monotonic() - self.settings.result_ttl
+        while self._finished:
+            oldest_id = next(iter(self._finished))
+            oldest = self._jobs[oldest_id]
+            expired = (oldest._finished_monotonic or 0.0) < cutoff
+            if not expired and len(self._finished) <= self.settings.max_retained:
+                break
+            del self._finished[oldest_id]
+            del self._jobs[oldest_id]
+
+    async def _worker(self) -> None:
+        while True:
+            job = await self._queue.get()
+            try:
+                if job.finished:
+                    continue
+                job.status = JobStatus.RUNNING
+                job.started_at = datetime.now(UTC)
+                job._task = asyncio.create_task(job.run())
+                # Wait without letting a job's cancellation cancel the worker
+                await asyncio.wait([job._task])
+                if job._task.cancelled():
+                    self._finish(job, JobStatus.CANCELLED)
+                elif job._task.exception() is not None:
+                    job.error = str(job._task.exception())
+                    self._finish(job, JobStatus.FAILED)
+                else:
+                    job.result = job._task.result()
+                    self._finish(job, JobStatus.SUCCEEDED)
+            finally:
+                self._queue.task_done()
+
+
+async def _noop() -> None:
+    return None
+
+
+# Process-wide queue, installed by the application lifespan
+_queue: JobQueue | None = None
+
+
+def get_job_queue() -> JobQueue | None:
+    """Get the process-wide job queue, or None outside the application lifespan."""
+    return _queue
+
+
+def set_job_queue(queue: JobQueue | None) -> None:
+    """Install (or clear) the process-wide job queue."""
+    global _queue
+    _queue = queue
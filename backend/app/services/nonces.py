@@ -0,0 +1,180 @@
+"""Nonce Store - Replay protection that forgets nonces once they expire.
+
+An x402 authorization can only be replayed while it is valid, so a used nonce
+has to be remembered until its ``validBefore`` and no longer. ``NonceStore``
+files each nonce in a bucket by expiry time and drops whole buckets once every
+authorization in them has expired, so memory tracks the number of live
+authorizations rather than every payment ever settled.
+
+An optional Bloom filter in front of the store answers most lookups for unseen
+nonces without touching it. Expired nonces stay in the filter until it is
+rebuilt, which only costs a few extra exact lookups.
+"""
+
+import hashlib
+import heapq
+import math
+import time
+from collections.abc import Callable, Iterable
+from typing import Any
+
+from pydantic_settings import BaseSettings, SettingsConfigDict
+
+
+class NonceStoreSettings(BaseSettings):
+    """Nonce store configuration, read from ``APS_X402_NONCE_*`` environment variables."""
+
+    model_config = SettingsConfigDict(env_prefix="APS_X402_NONCE_")
+
+    bucket_s: int = 60  # width of an expiry bucket
+    bloom_capacity: int = 0  # nonces the Bloom filter is sized for; 0 disables it
+    bloom_error_rate: float = 0.001
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter over strings, using double hashing."""
+
+    __slots__ = ("bits", "hashes", "_array")
+
+    def __init__(self, capacity: int, error_rate: float = 0.001) -> None:
+        # Optimal size and hash count for ``capacity`` items at ``error_rate``
+        self.bits = max(8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.bits / capacity * math.log(2)))
+        self._array = bytearray((self.bits + 7) // 8)
+
+    def _positions(self, item: str) -> Iterable[int]:
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return ((h1 + i * h2) % self.bits for i in range(self.hashes))
+
+    def add(self, item: str) -> None:
+        for position in self._positions(item):
+            self._array[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, item: str) -> bool:
+        return all(self._array[p >> 3] & (1 << (p & 7)) for p in self._positions(item))
+
+    def clear(self) -> None:
+        self._array = bytearray(len(self._array))
+
+
+class NonceStore:
+    """Used nonces, kept until the authorization that used them expires.
+
+    Nonces are grouped into buckets ``bucket_s`` seconds wide by expiry time.
+    A bucket is dropped as soon as the clock passes its upper edge, at which
+    point every nonce in it belongs to an expired authorization. Eviction
+    happens lazily on lookups and inserts, so no background task is needed.
+    """
+
+    def __init__(
+        self,
+        bucket_s: int = 60,
+        bloom_capacity: int = 0,
+        bloom_error_rate: float = 0.001,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        if bucket_s < 1:
+            raise ValueError("bucket_s must be at least 1")
+        self.bucket_s = bucket_s
+        self.clock = clock
+        self.bloom = BloomFilter(bloom_capacity, bloom_error_rate) if bloom_capacity else None
+        self._expiry: dict[str, int] = {}  # nonce -> bucket
+        self._buckets: dict[int, list[str]] = {}
+        self._bucket_heap: list[int] = []
+        self._bloom_stale = 0  # evicted nonces still set in the Bloom filter
+        self.evicted_nonces = 0
+        self.evicted_buckets = 0
+        self.lookups = 0
+        self.bloom_negatives = 0
+
+    @classmethod
+    def from_settings(cls, settings: NonceStoreSettings | None = None) -> "NonceStore":
+        settings = settings or NonceStoreSettings()
+        return cls(settings.bucket_s, settings.bloom_capacity, settings.bloom_error_rate)
+
+    def __len__(self) -> int:
+        return len(self._expiry)
+
+    def __contains__(self, nonce: str) -> bool:
+        self.evict()
+        self.lookups += 1
+        if self.bloom is not None and nonce not in self.bloom:
+            self.bloom_negatives += 1
+            return False
+        return nonce in self._expiry
+
+    def add(self, nonce: str, expires_at: float) -> bool:
+        """Remember a nonce until ``expires_at`` (epoch seconds).
+
+        Returns False, storing nothing, if the nonce is already present.
+        """
+        self.evict()
+        if nonce in self._expiry:
+            return False
+        bucket = math.ceil(expires_at / self.bucket_s)
+        nonces = self._buckets.get(bucket)
+        if nonces is None:
+            nonces = self._buckets[bucket] = []
+            heapq.heappush(self._bucket_heap, bucket)
+        nonces.append(nonce)
+        self._expiry[nonce] = bucket
+        if self.bloom is not None:
+            self.bloom.add(nonce)
+        return True
+
+    def evict(self, now: float | None = None) -> int:
+        """Drop buckets whose authorizations have all expired; return nonces dropped."""
+        if not self._bucket_heap:
+            return 0
+        # Whole seconds, as authorizations are checked: one expiring at t is valid at t
+        now = math.floor(self.clock() if now is None else now)
+        dropped = 0
+        # Bucket b holds expiries in ((b - 1) * bucket_s, b * bucket_s]
+        while self._bucket_heap and self._bucket_heap[0] * self.bucket_s < now:
+            bucket = heapq.heappop(self._bucket_heap)
+            nonces = self._buckets.pop(bucket)
+            for nonce in nonces:
+                del self._expiry[nonce]
+            dropped += len(nonces)
+            self.evicted_buckets += 1
+        self.evicted_nonces += dropped
+        self._bloom_stale += dropped
+        if self.bloom is not None and self._bloom_stale > len(self._expiry):
+            self._rebuild_bloom()
+        return dropped
+
+    def _rebuild_bloom(self) -> None:
+        """Clear expired nonces from the Bloom filter once they outnumber live ones."""
+        self.bloom.clear()
+        for nonce in self._expiry:
+            self.bloom.add(nonce)
+        self._bloom_stale = 0
+
+    def clear(self) -> None:
+        self._expiry.clear()
+        self._buckets.clear()
+        self._bucket_heap.clear()
+        if self.bloom is not None:
+            self.bloom.clear()
+        self._bloom_stale = 0
+
+    def stats(self) -> dict[str, Any]:
+        """Size and eviction metrics."""
+        return {
+            "size": len(self._expiry),
+            "buckets": len(self._buckets),
+            "bucket_s": self.bucket_s,
+            "evicted_nonces": self.evicted_nonces,
+            "evicted_buckets": self.evicted_buckets,
+            "lookups": self.lookups,
+            "bloom": None
+            if self.bloom is None
+            else {
+                "bits": self.bloom.bits,
+                "hashes": self.bloom.hashes,
+                "negatives": self.bloom_negatives,
+                "stale": self._bloom_stale,
+            },
+        }
@@ -0,0 +1,110 @@
+"""Paid Files - File-backed x402 resources delivered by streaming.
+
+Every regular file in ``APS_X402_FILES_DIR`` is a paid resource whose id is
+its file name, priced at ``amount``. After payment the file is served with
+Starlette's ``FileResponse``. It is streamed in chunks, so memory use does not
+grow with file size. It is handed to the server with ``http.response.pathsend``
+(zero-copy) where the server supports that. It honours ``Range`` and
+``If-Range``, so an interrupted download resumes where it stopped.
+
+Responses carry an ``ETag`` and ``Last-Modified``. ``If-None-Match`` and
+``If-Modified-Since`` are answered with 304 Not Modified.
+
+A payment for a file earns an entitlement: an access receipt valid for
+``entitlement_ttl_s``. Presenting it grants further full or partial downloads
+of that file without paying again.
+"""
+
+import mimetypes
+import os
+import re
+from email.utils import parsedate_to_datetime
+from pathlib import Path
+from typing import Any
+
+from pydantic_settings import BaseSettings, SettingsConfigDict
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse, Response
+
+# File names usable as resource ids: one path segment, no hidden files
+_NAME = re.compile(r"[A-Za-z0-9][A-Za-z0-9._-]*")
+
+
+class PaidFileSettings(BaseSettings):
+    """Paid file configuration, read from ``APS_X402_FILES_*`` environment variables."""
+
+    model_config = SettingsConfigDict(env_prefix="APS_X402_FILES_")
+
+    dir: Path = Path("paid-files")
+    amount: str = "50000"  # 0.05 USDC per file
+    entitlement_ttl_s: int = 3600  # how long one payment covers (resumed) downloads
+
+
+def file_resource(
+    resource_id: str, settings: PaidFileSettings | None = None
+) -> dict[str, Any] | None:
+    """The resource for the file named ``resource_id``, if there is one."""
+    settings = settings or PaidFileSettings()
+    if not _NAME.fullmatch(resource_id):
+        return None
+    path = settings.dir / resource_id
+    # Symlinks must not lead out of the directory
+    if not path.is_file() or not path.resolve().is_relative_to(settings.dir.resolve()):
+        return None
+    return {
+        "id": resource_id,
+        "title": resource_id,
+        "description": f"Download {resource_id} ({path.stat().st_size} bytes)",
+        "amount": settings.amount,
+        "mimeType": mimetypes.guess_type(resource_id)[0] or "application/octet-stream",
+        "file": path,
+    }
+
+
+def list_file_resources(settings: PaidFileSettings | None = None) -> list[dict[str, Any]]:
+    """Resources for every file in the directory, by name."""
+    settings = settings or PaidFileSettings()
+    if not settings.dir.is_dir():
+        return []
+    resources = (file_resource(entry.name, settings) for entry in sorted(settings.dir.iterdir()))
+    return [resource for resource in resources if resource is not None]
+
+
+def _not_modified(request_headers: Headers, response_headers: Headers) -> bool:
+    """Whether the client's cached copy is current (RFC 9110 section 13.1)."""
+    if_none_match = request_headers.get("if-none-match")
+    if if_none_match is not None:
+        # Weak comparison: W/ prefixes are ignored
+        etag = response_headers["etag"].removeprefix("W/")
+        tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+        return "*" in tags or etag in tags
+    if_modified_since = request_headers.get("if-modified-since")
+    if if_modified_since is not None:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+            modified = parsedate_to_datetime(response_headers["last-modified"])
+        except (TypeError, ValueError):
+            return False
+        return modified <= since
+    return False
+
+
+def paid_file_response(
+    path: Path,
+    request_headers: Headers,
+    headers: dict[str, str] | None = None,
+) -> Response:
+    """Stream a paid file, or answer a conditional request with 304."""
+    response = FileResponse(
+        path,
+        headers=headers,
+        media_type=mimetypes.guess_type(path.name)[0] or "application/octet-stream",
+        stat_result=os.stat(path),
+    )
+    if _not_modified(request_headers, response.headers):
+        kept = {"etag", "last-modified", "cache-control", "x-payment-response"}
+        return Response(
+            status_code=304,
+            headers={k: v for k, v in response.headers.items() if k in kept},
+        )
+    return response
@@ -0,0 +1,147 @@
+"""Access Receipts - Short-lived proof that a resource has been paid for.
+
+After settling a payment for a resource the x402 mock issues a receipt: a
+token signed with HMAC-SHA256 that names the resource, payer and settlement
+transaction and expires after ``ttl_s`` seconds. Presenting it again admits
+the client without a new payment. Checking a receipt costs one HMAC, compared
+in constant time, and one lookup in an in-memory expiry index; the nonce and
+settlement stores are not touched.
+
+The index also makes receipts revocable: clearing it invalidates every
+receipt issued so far. The signing key is generated per process, so a receipt
+is only admitted by the worker that issued it.
+"""
+
+import base64
+import hashlib
+import hmac
+import json
+import os
+import time
+import uuid
+from collections.abc import Callable
+from typing import Any
+
+from pydantic_settings import BaseSettings, SettingsConfigDict
+
+from app.services.nonces import NonceStore
+
+# Width of the expiry index buckets; receipts are dropped at most this long after expiring
+_INDEX_BUCKET_S = 10
+
+
+class ReceiptSettings(BaseSettings):
+    """Access receipt configuration, read from ``APS_X402_RECEIPT_*`` environment variables."""
+
+    model_config = SettingsConfigDict(env_prefix="APS_X402_RECEIPT_")
+
+    ttl_s: int = 300  # 0 disables receipts
+
+
+def _b64encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode("ascii")
+
+
+def _b64decode(data: str) -> bytes:
+    return base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))
+
+
+class ReceiptIssuer:
+    """Issues and checks access receipts of the form ``<claims>.<signature>``."""
+
+    def __init__(
+        self,
+        ttl_s: int = 300,
+        key: bytes | None = None,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        self.ttl_s = ttl_s
+        self.clock = clock
+        self._key = key or os.urandom(32)
+        self._index = NonceStore(bucket_s=_INDEX_BUCKET_S, clock=clock)
+        self.issued = 0
+        self.admitted = 0
+        self.rejected = 0
+
+    @classmethod
+    def from_settings(cls, settings: ReceiptSettings | None = None) -> "ReceiptIssuer":
+        return cls((settings or ReceiptSettings()).ttl_s)
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl_s > 0
+
+    def _sign(self, claims: str) -> str:
+        return _b64encode(hmac.new(self._key, claims.encode("ascii"), hashlib.sha256).digest())
+
+    def issue(
+        self,
+        resource_id: str,
+        payer: str | None,
+        transaction: str | None,
+        ttl_s: int | None = None,
+    ) -> tuple[str, int]:
+        """Issue a receipt for a paid resource; return it and its expiry (epoch seconds).
+
+        ``ttl_s`` overrides the issuer's lifetime for this receipt.
+        """
+        expires_at = int(self.clock()) + (self.ttl_s if ttl_s is None else ttl_s)
+        receipt_id = uuid.uuid4().hex
+        claims = _b64encode(
+            json.dumps(
+                {
+                    "jti": receipt_id,
+                    "resource": resource_id,
+                    "payer": payer,
+                    "transaction": transaction,
+                    "exp": expires_at,
+                },
+                separators=(",", ":"),
+            ).encode()
+        )
+        self._index.add(receipt_id, expires_at)
+        self.issued += 1
+        return f"{claims}.{self._sign(claims)}", expires_at
+
+    def check(self, receipt: str, resource_id: str) -> tuple[dict[str, Any] | None, str | None]:
+        """Admit a receipt for ``resource_id``.
+
+        Returns the receipt's claims and None, or None and the reason it was
+        rejected.
+        """
+        claims, reason = self._check(receipt, resource_id)
+        if reason is None:
+            self.admitted += 1
+        else:
+            self.rejected += 1
+        return claims, reason
+
+    def _check(self, receipt: str, resource_id: str) -> tuple[dict[str, Any] | None, str | None]:
+        encoded, _, signature = receipt.partition(".")
+        try:
+            valid = hmac.compare_digest(self._sign(encoded), signature)
+        except (UnicodeEncodeError, TypeError):  # non-ASCII, so not one of ours
+            return None, "invalid_receipt"
+        if not valid:
+            return None, "invalid_receipt_signature"
+        claims = json.loads(_b64decode(encoded))
+        if claims["resource"] != resource_id:
+            return None, "receipt_resource_mismatch"
+        if self.clock() > claims["exp"]:
+            return None, "receipt_expired"
+        if claims["jti"] not in self._index:
+            return None, "receipt_revoked"
+        return claims, None
+
+    def clear(self) -> None:
+        """Revoke every receipt issued so far."""
+        self._index.clear()
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "ttl_s": self.ttl_s,
+            "live": len(self._index),
+            "issued": self.issued,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+        }
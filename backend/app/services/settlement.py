@@ -0,0 +1,214 @@
+"""Deferred Settlement - Settles x402 payments in batches off the request path.
+
+In deferred mode the x402 mock verifies a payment and claims its nonce inline,
+serves the resource straight away, and hands the settlement to a
+``SettlementQueue``. A background worker collects queued settlements into
+batches of up to ``batch_size``, waiting at most ``max_wait_s`` for a batch to
+fill, settles each batch (after ``chain_delay_s`` of simulated chain time) and
+records it in the facilitator store. Resource latency no longer depends on how
+long settlement takes, as with a real facilitator settling on chain.
+
+Until its batch lands a settlement is reported as ``pending``; the timing of
+recent batches is kept for inspection.
+"""
+
+import asyncio
+import logging
+import time
+from collections import deque
+from collections.abc import Callable
+from dataclasses import asdict, dataclass
+from datetime import UTC, datetime
+from typing import Any
+
+from pydantic_settings import BaseSettings, SettingsConfigDict
+
+logger = logging.getLogger(__name__)
+
+
+class SettlementSettings(BaseSettings):
+    """Settlement configuration, read from ``APS_X402_SETTLEMENT_*`` environment variables."""
+
+    model_config = SettingsConfigDict(env_prefix="APS_X402_SETTLEMENT_")
+
+    mode: str = "sync"  # "sync" settles on the request path, "deferred" in the background
+    batch_size: int = 64
+    max_wait_s: float = 0.05  # longest a settlement waits for its batch to fill
+    chain_delay_s: float = 0.0  # simulated time to settle one batch
+    max_pending: int = 10000  # beyond this, settlements are recorded inline
+    history: int = 100  # recent batch timings kept
+
+
+@dataclass(frozen=True, slots=True)
+class BatchTiming:
+    """How long one settlement batch took."""
+
+    batch: int
+    size: int
+    wait_ms: float  # longest time an item spent queued before its batch started
+    settle_ms: float  # from the batch starting to every item being recorded
+    settled_at: str
+
+
+@dataclass(slots=True)
+class _Pending:
+    tx_hash: str
+    record: dict[str, Any]
+    enqueued: float
+
+
+class SettlementQueue:
+    """Queues settlements and records them in batches from a worker task.
+
+    ``commit`` records one settled transaction, e.g. in the facilitator store.
+    The worker and its asyncio queue are created with the first submission,
+    on the running loop, so the queue can be created at import time.
+    """
+
+    def __init__(
+        self,
+        commit: Callable[[str, dict[str, Any]], None],
+        batch_size: int = 64,
+        max_wait_s: float = 0.05,
+        chain_delay_s: float = 0.0,
+        max_pending: int = 10000,
+        history: int = 100,
+    ) -> None:
+        self.commit = commit
+        self.batch_size = batch_size
+        self.max_wait_s = max_wait_s
+        self.chain_delay_s = chain_delay_s
+        self.max_pending = max_pending
+        self._queue: asyncio.Queue[_Pending | None] | None = None
+        self._pending: dict[str, _Pending] = {}
+        self._worker: asyncio.Task[None] | None = None
+        self.batches: deque[BatchTiming] = deque(maxlen=history)
+        self.batch_count = 0
+        self.settled = 0
+        self.failed = 0
+        self.inline = 0
+
+    @classmethod
+    def from_settings(
+        cls,
+        commit: Callable[[str, dict[str, Any]], None],
+        settings: SettlementSettings | None = None,
+    ) -> "SettlementQueue":
+        settings = settings or SettlementSettings()
+        return cls(
+            commit,
+            batch_size=settings.batch_size,
+            max_wait_s=settings.max_wait_s,
+            chain_delay_s=settings.chain_delay_s,
+            max_pending=settings.max_pending,
+            history=settings.history,
+        )
+
+    def submit(self, tx_hash: str, record: dict[str, Any]) -> str:
+        """Queue a settlement; return its status, ``pending`` or ``settled``.
+
+        When the queue is full the settlement is recorded inline instead.
+        """
+        if self._worker is None:
+            self._queue = asyncio.Queue(self.max_pending)
+            self._worker = asyncio.get_running_loop().create_task(self._run(self._queue))
+        pending = _Pending(tx_hash, record, time.perf_counter())
+        try:
+            self._queue.put_nowait(pending)
+        except asyncio.QueueFull:
+            self.inline += 1
+            self.commit(tx_hash, _settled(record, batch=None))
+            return "settled"
+        self._pending[tx_hash] = pending
+        return "pending"
+
+    def pending(self, tx_hash: str) -> dict[str, Any] | None:
+        """The record of a settlement still waiting for its batch."""
+        pending = self._pending.get(tx_hash)
+        return {**pending.record, "status": "pending"} if pending is not None else None
+
+    async def _next_batch(
+        self, queue: asyncio.Queue[_Pending | None]
+    ) -> tuple[list[_Pending], bool]:
+        """Wait for one item, then up to ``max_wait_s`` for the batch to fill."""
+        batch = [await queue.get()]
+        deadline = time.perf_counter() + self.max_wait_s
+        while batch[-1] is not None and len(batch) < self.batch_size:
+            if not queue.empty():
+                batch.append(queue.get_nowait())
+                continue
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(queue.get(), remaining))
+            except TimeoutError:
+                break
+        done = batch[-1] is None
+        return [item for item in batch if item is not None], done
+
+    async def _run(self, queue: asyncio.Queue[_Pending | None]) -> None:
+        done = False
+        while not done:
+            batch, done = await self._next_batch(queue)
+            if batch:
+                started = time.perf_counter()
+                if self.chain_delay_s:
+                    await asyncio.sleep(self.chain_delay_s)
+                self._settle(batch, started)
+
+    def _settle(self, batch: list[_Pending], started: float) -> None:
+        self.batch_count += 1
+        number = self.batch_count
+        for item in batch:
+            try:
+                self.commit(item.tx_hash, _settled(item.record, batch=number))
+                self.settled += 1
+            except Exception:
+                logger.exception("Failed to record settlement %s", item.tx_hash)
+                self.failed += 1
+            self._pending.pop(item.tx_hash, None)
+        finished = time.perf_counter()
+        self.batches.append(
+            BatchTiming(
+                batch=number,
+                size=len(batch),
+                wait_ms=round((started - min(i.enqueued for i in batch)) * 1000, 3),
+                settle_ms=round((finished - started) * 1000, 3),
+                settled_at=datetime.now(UTC).isoformat(),
+            )
+        )
+
+    async def close(self) -> None:
+        """Settle everything queued, then stop the worker.
+
+        The queue is dropped with the worker, so the next submission starts
+        both afresh on whichever loop is running then.
+        """
+        if self._worker is None:
+            return
+        worker, self._worker = self._worker, None
+        queue, self._queue = self._queue, None
+        await queue.put(None)
+        await worker
+
+    def stats(self) -> dict[str, Any]:
+        processed = self.settled + self.failed
+        return {
+            "pending": len(self._pending),
+            "settled": self.settled,
+            "failed": self.failed,
+            "inline": self.inline,
+            "batches": self.batch_count,
+            "mean_batch": round(processed / self.batch_count, 1) if self.batch_count else 0.0,
+            "recent_batches": [asdict(b) for b in list(self.batches)[-10:]],
+        }
+
+
+def _settled(record: dict[str, Any], batch: int | None) -> dict[str, Any]:
+    return {
+        **record,
+        "status": "settled",
+        "batch": batch,
+        "settledAt": datetime.now(UTC).isoformat(),
+    }
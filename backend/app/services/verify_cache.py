@@ -0,0 +1,102 @@
+"""Verify Cache - Remembers successful x402 verifications until settlement.
+
+Facilitator clients call ``/verify`` and then ``/settle`` with the same
+payload. Whether a payload is well formed, addressed to the right recipient
+and for enough value cannot change in between, so a successful verification
+is cached under a key made of every field verification reads; a payload that
+would verify differently gets a different key. Settling a cached payment only
+re-checks what can change: whether the nonce has been used and whether the
+authorization is inside its time window.
+
+Entries expire with their authorization's ``validBefore`` and the cache is an
+LRU bounded to ``max_size`` entries.
+"""
+
+from collections import OrderedDict
+from collections.abc import Hashable
+from dataclasses import dataclass
+from typing import Any
+
+from pydantic_settings import BaseSettings, SettingsConfigDict
+
+
+class VerifyCacheSettings(BaseSettings):
+    """Verify cache configuration, read from ``APS_X402_VERIFY_CACHE_*`` environment variables."""
+
+    model_config = SettingsConfigDict(env_prefix="APS_X402_VERIFY_CACHE_")
+
+    max_size: int = 10000  # 0 disables the cache
+
+
+@dataclass(frozen=True, slots=True)
+class VerifiedPayment:
+    """What settlement still needs from a successful verification."""
+
+    payer: str
+    nonce: str
+    valid_after: int
+    valid_before: int
+
+
+class VerifyCache:
+    """LRU of VerifiedPayments, each expiring at its ``valid_before``."""
+
+    def __init__(self, max_size: int = 10000) -> None:
+        self.max_size = max_size
+        self._entries: OrderedDict[Hashable, VerifiedPayment] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evicted = 0
+
+    @classmethod
+    def from_settings(cls, settings: VerifyCacheSettings | None = None) -> "VerifyCache":
+        return cls((settings or VerifyCacheSettings()).max_size)
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_size > 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Hashable, now: int) -> VerifiedPayment | None:
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        if now > entry.valid_before:
+            del self._entries[key]
+            self.expired += 1
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry
+
+    def put(self, key: Hashable, entry: VerifiedPayment, now: int) -> None:
+        if not self.enabled or now > entry.valid_before:
+            return
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evicted += 1
+
+    def discard(self, key: Hashable) -> None:
+        self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def stats(self) -> dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "expired": self.expired,
+            "evicted": self.evicted,
+        }
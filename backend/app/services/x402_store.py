@@ -0,0 +1,251 @@
+"""x402 Facilitator Store - Where the x402 mock keeps used nonces and settlements.
+
+The in-memory store is the default and is private to one process. Run
+uvicorn with several workers and a payment replayed against another worker
+would be accepted, so the SQLite store keeps the same state in one database
+file shared by every worker:
+
+- Nonces are claimed with ``INSERT OR IGNORE`` on the primary key, which is
+  atomic across processes: exactly one settle of a nonce succeeds.
+- Settlements are buffered and written in one transaction per batch, when the
+  batch fills or ``flush_interval`` after the first buffered one, whichever
+  comes first. They are readable from this process at once and from others
+  after the flush.
+- The database runs in WAL mode, so reads never wait for the writer.
+
+Select the backend with ``APS_X402_STORE_BACKEND=sqlite``.
+"""
+
+import asyncio
+import json
+import math
+import sqlite3
+import time
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Any
+
+from pydantic_settings import BaseSettings, SettingsConfigDict
+
+from app.services.nonces import NonceStore, NonceStoreSettings
+
+
+class X402StoreSettings(BaseSettings):
+    """Facilitator store configuration, read from ``APS_X402_STORE_*`` environment variables."""
+
+    model_config = SettingsConfigDict(env_prefix="APS_X402_STORE_")
+
+    backend: str = "memory"  # "memory" or "sqlite"
+    sqlite_path: Path = Path("x402.sqlite3")
+    settlement_batch: int = 256  # settlements written per transaction
+    flush_interval: float = 0.05  # seconds a settlement may wait for its batch
+
+
+class FacilitatorStore(ABC):
+    """Used nonces and settlement records of the x402 facilitator."""
+
+    @abstractmethod
+    def has_nonce(self, nonce: str) -> bool:
+        """Whether a nonce has been used by an authorization that is still valid."""
+
+    @abstractmethod
+    def claim_nonce(self, nonce: str, expires_at: int) -> bool:
+        """Mark a nonce used until ``expires_at``; False if it already was."""
+
+    @abstractmethod
+    def add_settlement(self, tx_hash: str, settlement: dict[str, Any]) -> None:
+        """Record a settlement under its transaction hash."""
+
+    @abstractmethod
+    def get_settlement(self, tx_hash: str) -> dict[str, Any] | None:
+        """Look up a settlement by transaction hash."""
+
+    @abstractmethod
+    def clear(self) -> None:
+        """Forget every nonce and settlement."""
+
+    @abstractmethod
+    def stats(self) -> dict[str, Any]:
+        """Describe the store's contents."""
+
+    def close(self) -> None:
+        """Write anything buffered and release resources."""
+
+
+class MemoryStore(FacilitatorStore):
+    """Process-local store: an expiring NonceStore and a settlements dict."""
+
+    def __init__(self, nonces: NonceStore | None = None) -> None:
+        self.nonces = nonces if nonces is not None else NonceStore.from_settings()
+        self.settlements: dict[str, dict[str, Any]] = {}
+
+    def has_nonce(self, nonce: str) -> bool:
+        return nonce in self.nonces
+
+    def claim_nonce(self, nonce: str, expires_at: int) -> bool:
+        return self.nonces.add(nonce, expires_at)
+
+    def add_settlement(self, tx_hash: str, settlement: dict[str, Any]) -> None:
+        self.settlements[tx_hash] = settlement
+
+    def get_settlement(self, tx_hash: str) -> dict[str, Any] | None:
+        return self.settlements.get(tx_hash)
+
+    def clear(self) -> None:
+        self.nonces.clear()
+        self.settlements.clear()
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "backend": "memory",
+            "nonces": self.nonces.stats(),
+            "settlements": len(self.settlements),
+        }
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS nonces (
+    nonce TEXT PRIMARY KEY,
+    expires_at INTEGER NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS nonces_expires_at ON nonces (expires_at);
+CREATE TABLE IF NOT EXISTS settlements (
+    tx_hash TEXT PRIMARY KEY,
+    record TEXT NOT NULL
+) WITHOUT ROWID;
+"""
+
+
+class SQLiteStore(FacilitatorStore):
+    """Store shared by every process that opens the same SQLite file.
+
+    Expired nonces are deleted at most once per ``evict_interval`` seconds,
+    piggybacking on claims. Call ``close`` at shutdown to write settlements
+    still waiting for their batch.
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        settlement_batch: int = 256,
+        flush_interval: float = 0.05,
+        evict_interval: float = 60.0,
+    ) -> None:
+        self.path = path
+        self.settlement_batch = settlement_batch
+        self.flush_interval = flush_interval
+        self.evict_interval = evict_interval
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Autocommit: each claim is its own transaction; batches open one explicitly
+        self._db = sqlite3.connect(path, timeout=5.0, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(_SCHEMA)
+        self._pending: dict[str, dict[str, Any]] = {}
+        self._flush_timer: asyncio.TimerHandle | None = None
+        self._last_evict = 0.0
+        self.flushes = 0
+        self.flushed = 0
+        self.evicted_nonces = 0
+
+    def has_nonce(self, nonce: str) -> bool:
+        row = self._db.execute("SELECT 1 FROM nonces WHERE nonce = ?", (nonce,)).fetchone()
+        return row is not None
+
+    def claim_nonce(self, nonce: str, expires_at: int) -> bool:
+        now = time.time()
+        if now - self._last_evict >= self.evict_interval:
+            self._evict(now)
+        cursor = self._db.execute(
+            "INSERT OR IGNORE INTO nonces (nonce, expires_at) VALUES (?, ?)",
+            (nonce, expires_at),
+        )
+        return cursor.rowcount == 1
+
+    def _evict(self, now: float) -> None:
+        # Whole seconds, as authorizations are checked: one expiring at t is valid at t
+        cursor = self._db.execute("DELETE FROM nonces WHERE expires_at < ?", (math.floor(now),))
+        self.evicted_nonces += cursor.rowcount
+        self._last_evict = now
+
+    def add_settlement(self, tx_hash: str, settlement: dict[str, Any]) -> None:
+        self._pending[tx_hash] = settlement
+        if len(self._pending) >= self.settlement_batch:
+            self.flush()
+        elif self._flush_timer is None:
+            try:
+                loop = asyncio.get_running_loop()
+            except RuntimeError:
+                self.flush()
+            else:
+                self._flush_timer = loop.call_later(self.flush_interval, self.flush)
+
+    def flush(self) -> int:
+        """Write buffered settlements in one transaction; return how many."""
+        if self._flush_timer is not None:
+            self._flush_timer.cancel()
+            self._flush_timer = None
+        if not self._pending:
+            return 0
+        rows = [(tx_hash, json.dumps(record)) for tx_hash, record in self._pending.items()]
+        with self._db:
+            self._db.execute("BEGIN IMMEDIATE")
+            self._db.executemany(
+                "INSERT OR REPLACE INTO settlements (tx_hash, record) VALUES (?, ?)", rows
+            )
+        self._pending.clear()
+        self.flushes += 1
+        self.flushed += len(rows)
+        return len(rows)
+
+    def get_settlement(self, tx_hash: str) -> dict[str, Any] | None:
+        pending = self._pending.get(tx_hash)
+        if pending is not None:
+            return pending
+        row = self._db.execute(
+            "SELECT record FROM settlements WHERE tx_hash = ?", (tx_hash,)
+        ).fetchone()
+        return json.loads(row[0]) if row is not None else None
+
+    def clear(self) -> None:
+        if self._flush_timer is not None:
+            self._flush_timer.cancel()
+            self._flush_timer = None
+        self._pending.clear()
+        with self._db:
+            self._db.execute("BEGIN IMMEDIATE")
+            self._db.execute("DELETE FROM nonces")
+            self._db.execute("DELETE FROM settlements")
+
+    def stats(self) -> dict[str, Any]:
+        nonces, settlements = self._db.execute(
+            "SELECT (SELECT COUNT(*) FROM nonces), (SELECT COUNT(*) FROM settlements)"
+        ).fetchone()
+        return {
+            "backend": "sqlite",
+            "path": str(self.path),
+            "nonces": {"size": nonces, "evicted_nonces": self.evicted_nonces},
+            "settlements": settlements + len(self._pending),
+            "pending_settlements": len(self._pending),
+            "flushes": self.flushes,
+            "mean_batch": round(self.flushed / self.flushes, 1) if self.flushes else 0.0,
+        }
+
+    def close(self) -> None:
+        self.flush()
+        self._db.close()
+
+
+def create_store(settings: X402StoreSettings | None = None) -> FacilitatorStore:
+    """Build the store selected by the settings."""
+    settings = settings or X402StoreSettings()
+    if settings.backend == "memory":
+        return MemoryStore()
+    if settings.backend == "sqlite":
+        return SQLiteStore(
+            settings.sqlite_path,
+            settlement_batch=settings.settlement_batch,
+            flush_interval=settings.flush_interval,
+            evict_interval=NonceStoreSettings().bucket_s,
+        )
+    raise ValueError(f"Unknown x402 store backend: {settings.backend}")
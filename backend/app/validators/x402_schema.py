@@ -51,7 +51,7 @@ class PaymentRequirementsSchema(BaseModel):
     @field_validator("scheme")
     @classmethod
     def validate_scheme(cls, v: str) -> str:
-        allowed = {"exact", "deferred"}
+        allowed = {"exact", "deferred", "channel"}
         if v not in allowed:
             raise ValueError(f"Scheme must be one of: {allowed}")
         return v
@@ -0,0 +1,35 @@
+"""Shared fixtures for the backend tests."""
+
+from collections.abc import AsyncIterator
+
+import httpx
+import pytest
+
+from app.main import app
+
+
+class FakeClock:
+    """A clock for time-dependent services that only moves when told to."""
+
+    def __init__(self, now: float = 1_000_000.0) -> None:
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+    def advance(self, seconds: float) -> None:
+        self.now += seconds
+
+
+@pytest.fixture
+def clock() -> FakeClock:
+    return FakeClock()
+
+
+@pytest.fixture
+async def x402_client() -> AsyncIterator[httpx.AsyncClient]:
+    """A client for the x402 mock, dispatched in process, starting from a reset."""
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test/mock/x402") as client:
+        await client.post("/test/reset")
+        yield client
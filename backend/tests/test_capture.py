@@ -0,0 +1,102 @@
+"""Tests for the binary capture file format."""
+
+import struct
+
+import httpx
+import pytest
+
+from app.services.capture import (
+    CapturedExchange,
+    CaptureError,
+    CaptureReader,
+    CaptureWriter,
+)
+
+
+def _exchange(i: int) -> CapturedExchange:
+    request = httpx.Request("POST", f"http://target/items/{i}", content=b'{"n": %d}' % i)
+    response = httpx.Response(201, json={"id": i}, request=request)
+    return CapturedExchange(
+        test_id=f"test_{i}",
+        kind="initial",
+        attempt=0,
+        method="POST",
+        url=f"http://target/items/{i}",
+        headers={},
+        content=None,
+        response=response,
+        timings=None,
+        duration_ms=1.5,
+    )
+
+
+async def _write(path, count):
+    async with CaptureWriter(path) as writer:
+        for i in range(count):
+            writer.record(_exchange(i))
+    return writer
+
+
+async def test_round_trip(tmp_path):
+    path = tmp_path / "run.apscap"
+    writer = await _write(path, 3)
+
+    with CaptureReader(path) as reader:
+        assert reader.complete
+        assert reader.dropped == 0
+        assert [e["test_id"] for e in reader.exchanges] == ["test_0", "test_1", "test_2"]
+        exchange = reader.get(1)
+
+    assert writer.written == 3
+    assert exchange["request"]["body"] == '{"n": 1}'
+    assert exchange["response"]["status_code"] == 201
+    assert exchange["response"]["body"] == '{"id":1}'
+
+
+async def test_get_seeks_to_any_exchange(tmp_path):
+    path = tmp_path / "run.apscap"
+    await _write(path, 300)
+
+    with CaptureReader(path) as reader:
+        assert reader.get(299)["test_id"] == "test_299"
+        assert reader.get(0)["test_id"] == "test_0"
+        assert reader.exchanges[150]["seq"] == 150
+        with pytest.raises(CaptureError):
+            reader.get(300)
+
+
+async def test_truncated_file_is_recovered_by_scanning(tmp_path):
+    path = tmp_path / "run.apscap"
+    await _write(path, 3)
+    with CaptureReader(path) as reader:
+        cut = reader.exchanges[2]["offset"] + 5
+    path.write_bytes(path.read_bytes()[:cut])
+
+    with CaptureReader(path) as reader:
+        assert not reader.complete
+        assert [e["test_id"] for e in reader.exchanges] == ["test_0", "test_1"]
+        assert reader.get(1)["response"]["status_code"] == 201
+
+
+async def test_file_whose_writer_never_closed_is_scanned(tmp_path):
+    path = tmp_path / "run.apscap"
+    await _write(path, 2)
+    data = path.read_bytes()
+    # Drop the index frame and trailer, as if the writer had never closed
+    (index_offset,) = struct.unpack(">Q", data[-16:-8])
+    path.write_bytes(data[:index_offset])
+
+    with CaptureReader(path) as reader:
+        assert not reader.complete
+        assert [e["test_id"] for e in reader.exchanges] == ["test_0", "test_1"]
+        assert reader.get(1)["request"]["url"] == "http://target/items/1"
+
+
+def test_rejects_files_that_are_not_captures(tmp_path):
+    path = tmp_path / "run.apscap"
+    path.write_bytes(b"not a capture")
+
+    with pytest.raises(CaptureError, match="not a capture file"):
+        CaptureReader(path)
+    with pytest.raises(CaptureError, match="No capture file"):
+        CaptureReader(tmp_path / "missing.apscap")
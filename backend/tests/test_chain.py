@@ -0,0 +1,59 @@
+"""Tests for the chain simulator."""
+
+import pytest
+
+from app.services.chain import ChainSimulator
+
+
+@pytest.fixture
+async def chain(clock):
+    chain = ChainSimulator(block_interval_s=3600, confirmations=2, seed=1, clock=clock)
+    yield chain
+    await chain.close()
+
+
+async def test_transactions_confirm_as_blocks_are_mined(chain, clock):
+    chain.submit("0xa")
+    clock.advance(2)
+    chain.mine()
+
+    assert chain.status("0xa")["state"] == "included"
+    chain.mine()
+    assert chain.status("0xa")["state"] == "confirmed"
+    assert chain.stats()["mean_inclusion_s"] == 2.0
+
+
+async def test_reorg_returns_transactions_to_the_mempool(chain, clock):
+    chain.submit("0xa")
+    chain.mine()
+
+    assert chain.reorg(1) == 1
+    assert chain.status("0xa") == {"state": "mempool", "confirmations": 0, "reorgs": 1}
+    assert chain.stats()["mean_inclusion_s"] == 0.0
+
+    clock.advance(5)
+    chain.mine()
+    assert chain.stats()["mean_inclusion_s"] == 5.0
+
+
+async def test_clear_resets_every_stat(chain, clock):
+    chain.submit("0xa")
+    clock.advance(1)
+    chain.mine()
+    chain.reorg(1)
+    chain.mine()
+
+    chain.clear()
+
+    stats = chain.stats()
+    assert stats["height"] == 0
+    assert stats["mempool"] == 0
+    assert stats["tracked_transactions"] == 0
+    assert stats["reorgs"] == 0
+    assert stats["reorged_transactions"] == 0
+    assert stats["mean_inclusion_s"] == 0.0
+
+    chain.submit("0xb")
+    clock.advance(4)
+    chain.mine()
+    assert chain.stats()["mean_inclusion_s"] == 4.0
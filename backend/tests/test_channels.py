@@ -0,0 +1,141 @@
+"""Tests for x402 payment channels paid with vouchers."""
+
+import json
+
+import pytest
+
+from app.services.channels import ChannelBook, voucher_signature
+
+RESOURCE = "premium-content"
+DEPOSIT = 200000
+
+
+@pytest.fixture
+async def channel(x402_client) -> dict:
+    generated = await x402_client.post(
+        "/test/generate-payment", params={"resource_id": RESOURCE, "amount": str(DEPOSIT)}
+    )
+    opened = await x402_client.post(
+        "/channels/open", json={"paymentPayload": generated.json()["payment_payload"]}
+    )
+    assert opened.status_code == 200
+    return opened.json()
+
+
+async def _voucher(client, channel: dict, cumulative: int) -> dict:
+    generated = await client.post(
+        "/test/generate-voucher",
+        params={
+            "resource_id": RESOURCE,
+            "channel_id": channel["channelId"],
+            "cumulative_amount": str(cumulative),
+        },
+    )
+    return generated.json()["payment_payload"]
+
+
+async def _pay(client, voucher: dict):
+    return await client.get(f"/resource/{RESOURCE}", headers={"X-PAYMENT": json.dumps(voucher)})
+
+
+async def _price(client) -> int:
+    required = await client.get(f"/resource/{RESOURCE}")
+    return int(required.json()["accepts"][0]["amount"])
+
+
+async def test_open_funds_channel(channel):
+    assert channel["status"] == "open"
+    assert channel["deposit"] == str(DEPOSIT)
+    assert channel["spent"] == "0"
+    assert channel["openTransaction"]
+
+
+async def test_vouchers_pay_cumulatively(x402_client, channel):
+    price = await _price(x402_client)
+
+    first = await _pay(x402_client, await _voucher(x402_client, channel, price))
+    second = await _pay(x402_client, await _voucher(x402_client, channel, 2 * price))
+
+    assert first.status_code == 200
+    assert second.status_code == 200
+    state = (await x402_client.get(f"/channels/{channel['channelId']}")).json()
+    assert state["spent"] == str(2 * price)
+    assert state["vouchers"] == 2
+
+
+async def test_replayed_voucher_is_rejected(x402_client, channel):
+    voucher = await _voucher(x402_client, channel, await _price(x402_client))
+    await _pay(x402_client, voucher)
+
+    replay = await _pay(x402_client, voucher)
+
+    assert replay.status_code == 402
+    assert replay.json()["detail"] == "invalid_channel_voucher_amount"
+
+
+async def test_overspending_the_deposit_is_rejected(x402_client, channel):
+    response = await _pay(x402_client, await _voucher(x402_client, channel, DEPOSIT + 1))
+
+    assert response.status_code == 402
+    assert response.json()["detail"] == "channel_deposit_exceeded"
+
+
+async def test_voucher_from_another_payer_is_rejected(x402_client, channel):
+    price = await _price(x402_client)
+    voucher = await _voucher(x402_client, channel, price)
+    intruder = "0x000000000000000000000000000000000000dEaD"
+    voucher["payload"]["from"] = intruder
+    voucher["payload"]["signature"] = voucher_signature(channel["channelId"], price, intruder)
+
+    response = await _pay(x402_client, voucher)
+
+    assert response.status_code == 402
+    assert response.json()["detail"] == "invalid_signature"
+
+
+@pytest.mark.parametrize(
+    ("field", "value"),
+    [("signature", "0x" + "cd" * 65), ("cumulativeAmount", None), ("from", None)],
+)
+async def test_tampered_voucher_is_rejected(x402_client, channel, field, value):
+    price = await _price(x402_client)
+    voucher = await _voucher(x402_client, channel, price)
+    if field == "cumulativeAmount":
+        value = str(2 * price)  # more than the payer signed for
+    voucher["payload"][field] = value
+
+    response = await _pay(x402_client, voucher)
+
+    assert response.status_code == 402
+    assert response.json()["detail"] == "invalid_signature"
+
+
+async def test_close_settles_latest_voucher_and_stops_further_use(x402_client, channel):
+    price = await _price(x402_client)
+    await _pay(x402_client, await _voucher(x402_client, channel, price))
+
+    closed = await x402_client.post(f"/channels/{channel['channelId']}/close")
+    after = await _pay(x402_client, await _voucher(x402_client, channel, 2 * price))
+    again = await x402_client.post(f"/channels/{channel['channelId']}/close")
+
+    assert closed.json()["status"] == "closed"
+    settlement = await x402_client.get(f"/settlements/{closed.json()['closeTransaction']}")
+    assert settlement.json()["amount"] == str(price)
+    assert settlement.json()["refund"] == str(DEPOSIT - price)
+    assert after.json()["detail"] == "channel_closed"
+    assert again.status_code == 409
+
+
+def test_closed_and_expired_channels_are_pruned_after_retention(clock):
+    book = ChannelBook(ttl_s=100, retain_s=50, clock=clock)
+    closed = book.open("0xpayer", "0xpayee", "0xusdc", "eip155:84532", 1000)
+    expiring = book.open("0xpayer", "0xpayee", "0xusdc", "eip155:84532", 1000)
+    book.close(closed.channel_id, "0xtx")
+
+    clock.advance(60)
+    assert book.stats()["closed"] == 0
+    assert book.get(expiring.channel_id) is not None
+
+    clock.advance(100)
+    book.stats()
+    assert book.get(expiring.channel_id) is None
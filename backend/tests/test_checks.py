@@ -0,0 +1,44 @@
+"""Tests for compiled inspector checks."""
+
+import json
+
+import pytest
+
+from app.services.checks import Exchange, compile_test
+from app.services.inspector import get_tests
+
+
+def _exchange(body, status_code: int = 200) -> Exchange:
+    return Exchange(
+        status_code=status_code, headers={}, content=json.dumps(body).encode(), endpoint="/x"
+    )
+
+
+@pytest.mark.parametrize(
+    "definition",
+    [
+        {"required_fields": ["id"]},
+        {"check": "caip2_networks"},
+        {"check": "status_in", "valid_statuses": ["ready_for_payment"]},
+        {"check": "line_item_schema"},
+        {"check": "checkout_session_schema"},
+    ],
+)
+@pytest.mark.parametrize(("body", "kind"), [([1, 2], "array"), ("ok", "string"), (3, "number")])
+def test_field_checks_fail_cleanly_on_non_object_bodies(definition, body, kind):
+    test = compile_test({"id": "t", "name": "t", "endpoint": "/x", **definition})
+
+    failure = test.evaluate(_exchange(body))
+
+    assert failure is not None
+    assert failure.error == f"Expected a JSON object, got {kind}"
+
+
+def test_acp_session_create_validates_checkout_session_schema():
+    test = next(t for t in get_tests("ACP") if t.id == "acp_session_create")
+    body = {"id": "cs_1", "status": "ready_for_payment", "line_items": [], "totals": "none"}
+
+    failure = test.evaluate(_exchange(body, status_code=201))
+
+    assert failure is not None
+    assert failure.error.startswith("Invalid ACP CheckoutSession")
@@ -0,0 +1,70 @@
+"""Tests for the JSON structural diff."""
+
+from app.services.diff import Difference, JsonDiffer
+
+
+def test_equal_documents_have_no_differences():
+    document = {"status": "ready", "line_items": [{"quantity": 1}]}
+
+    assert JsonDiffer().diff(document, dict(document)) == ([], False)
+
+
+def test_volatile_fields_are_compared_by_type_only():
+    reference = {"id": "cs_1", "checkout_id": "a", "created_at": "2026-01-01", "status": "ready"}
+    candidate = {"id": "cs_2", "checkout_id": "b", "created_at": 1767225600, "status": "ready"}
+
+    differences, truncated = JsonDiffer().diff(reference, candidate)
+
+    assert differences == [Difference("created_at", "type", "string", "number")]
+    assert not truncated
+
+
+def test_missing_volatile_field_is_still_reported():
+    differences, _ = JsonDiffer().diff({"id": "cs_1"}, {})
+
+    assert differences == [Difference("id", "missing", "cs_1")]
+
+
+def test_differences_are_reported_in_document_order_with_paths():
+    reference = {"status": "ready", "line_items": [{"quantity": 1}, {"quantity": 2}], "a": 1}
+    candidate = {"status": "open", "line_items": [{"quantity": 1}, {"quantity": 3}], "b": 1}
+
+    differences, _ = JsonDiffer().diff(reference, candidate)
+
+    assert differences == [
+        Difference("a", "missing", 1),
+        Difference("b", "unexpected", None, 1),
+        Difference("status", "value", "ready", "open"),
+        Difference("line_items.1.quantity", "value", 2, 3),
+    ]
+
+
+def test_ignored_fields_are_skipped():
+    differences, _ = JsonDiffer(ignore={"debug"}).diff({"debug": 1}, {"debug": [2]})
+
+    assert differences == []
+
+
+def test_containers_are_summarized():
+    differences, _ = JsonDiffer().diff({"items": [1, 2]}, {"items": {"n": 2}})
+
+    assert differences == [Difference("items", "type", "array", "object")]
+    differences, _ = JsonDiffer().diff({"items": [1, 2]}, {"items": [1, 2, 3]})
+    assert differences == [Difference("items", "length", 2, 3)]
+
+
+def test_differences_are_truncated_at_max_differences():
+    reference = {f"field_{i}": i for i in range(10)}
+    candidate = {f"field_{i}": -i - 1 for i in range(10)}
+
+    differences, truncated = JsonDiffer(max_differences=3).diff(reference, candidate)
+
+    assert truncated
+    assert [d.path for d in differences] == ["field_0", "field_1", "field_2"]
+
+
+def test_exactly_max_differences_is_not_truncated():
+    differences, truncated = JsonDiffer(max_differences=2).diff([1, 2], [3, 4])
+
+    assert len(differences) == 2
+    assert not truncated
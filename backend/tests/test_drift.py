@@ -0,0 +1,77 @@
+"""Tests for rolling statistics and drift detection."""
+
+import pytest
+
+from app.services.drift import RunningStats, mean_drift, merged, rate_drift
+
+BOUNDS = (10.0, 20.0, 30.0)
+
+
+def _stats(values, bounds=BOUNDS) -> RunningStats:
+    stats = RunningStats(bounds)
+    for value in values:
+        stats.add(value)
+    return stats
+
+
+def test_percentile_interpolates_within_the_bucket():
+    stats = _stats(range(11, 21))
+
+    assert stats.percentile(10) == pytest.approx(11.9)
+    assert stats.percentile(50) == pytest.approx(15.5)
+    assert stats.percentile(100) == 20
+
+
+def test_percentile_in_the_overflow_bucket_ends_at_the_max():
+    stats = _stats([40, 50])
+
+    assert stats.percentile(50) == pytest.approx(45)
+    assert stats.percentile(100) == 50
+
+
+def test_percentile_of_no_samples_is_zero():
+    assert RunningStats(BOUNDS).percentile(99) == 0.0
+
+
+def test_merge_matches_adding_every_sample():
+    values = [3, 12, 12, 25, 31, 7, 18]
+    whole = _stats(values)
+
+    parts = merged([_stats(values[:3]), _stats(values[3:]), RunningStats(BOUNDS)], BOUNDS)
+
+    assert parts.count == whole.count
+    assert parts.mean == pytest.approx(whole.mean)
+    assert parts.variance == pytest.approx(whole.variance)
+    assert parts.buckets == whole.buckets
+    assert (parts.min, parts.max) == (3, 31)
+
+
+def test_small_mean_shift_is_not_drift_below_min_change_pct():
+    early = _stats([99, 101] * 500)
+    late = _stats([104, 106] * 500)
+
+    result = mean_drift("latency", early, late)
+
+    assert result.p_value < 0.01
+    assert result.change_pct == pytest.approx(5.0)
+    assert not result.significant
+    assert result.direction == "none"
+    assert mean_drift("latency", early, late, min_change_pct=0).direction == "up"
+
+
+def test_large_mean_shift_is_drift():
+    early = _stats([99, 101] * 500)
+    late = _stats([129, 131] * 500)
+
+    result = mean_drift("latency", early, late)
+
+    assert result.significant
+    assert result.direction == "up"
+
+
+def test_error_rate_rise_is_drift():
+    result = rate_drift("error_rate", 5, 1000, 60, 1000)
+
+    assert result.significant
+    assert result.direction == "up"
+    assert not rate_drift("error_rate", 5, 1000, 6, 1000).significant
@@ -0,0 +1,117 @@
+"""Tests for the background job queue."""
+
+import asyncio
+from types import SimpleNamespace
+
+import httpx
+import pytest
+
+from app.main import app
+from app.services import jobs
+from app.services.jobs import JobQueue, JobQueueSettings, JobStatus, QueueFullError
+
+RUN = {"target_url": "http://localhost:9/mock/ucp", "protocol": "UCP"}
+
+
+async def _hang() -> None:
+    await asyncio.Event().wait()
+
+
+async def _ok() -> str:
+    return "done"
+
+
+@pytest.fixture
+async def job_queue():
+    queue = JobQueue(JobQueueSettings(workers=1, max_pending=1, result_ttl=60))
+    jobs.set_job_queue(queue)
+    yield queue
+    jobs.set_job_queue(None)
+    await queue.close()
+
+
+@pytest.fixture
+async def api_client(job_queue):
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(
+        transport=transport, base_url="http://test/api/inspector"
+    ) as client:
+        yield client
+
+
+async def _until(predicate) -> None:
+    async with asyncio.timeout(1):
+        while not predicate():
+            await asyncio.sleep(0)
+
+
+async def test_job_runs_to_completion(job_queue):
+    await job_queue.start()
+
+    job = job_queue.submit(_ok, kind="run")
+    await _until(lambda: job.finished)
+
+    assert job.status == JobStatus.SUCCEEDED
+    assert job.result == "done"
+    assert job.describe()["status"] == "succeeded"
+    assert job.describe()["kind"] == "run"
+
+
+async def test_submit_beyond_max_pending_is_rejected(job_queue):
+    job_queue.submit(_ok)
+
+    with pytest.raises(QueueFullError):
+        job_queue.submit(_ok)
+
+
+async def test_full_queue_answers_429(api_client):
+    first = await api_client.post("/jobs", json=RUN)
+    second = await api_client.post("/jobs", json=RUN)
+
+    assert first.status_code == 202
+    assert first.json()["status"] == "queued"
+    assert second.status_code == 429
+
+
+async def test_finished_jobs_are_pruned_after_their_ttl(job_queue, clock, monkeypatch):
+    monkeypatch.setattr(jobs, "time", SimpleNamespace(monotonic=clock))
+    await job_queue.start()
+    job = job_queue.submit(_ok)
+    await _until(lambda: job.finished)
+
+    clock.advance(59)
+    assert job_queue.get(job.id) is job
+
+    clock.advance(2)
+    assert job_queue.get(job.id) is None
+    assert job_queue.stats()["completed"] == 1
+
+
+async def test_delete_cancels_a_running_job(api_client, job_queue):
+    await job_queue.start()
+    job = job_queue.submit(_hang, kind="run", **RUN)
+    await _until(lambda: job.status == JobStatus.RUNNING)
+
+    response = await api_client.delete(f"/jobs/{job.id}")
+    await _until(lambda: job.finished)
+    fetched = await api_client.get(f"/jobs/{job.id}")
+
+    assert response.status_code == 200
+    assert fetched.json()["status"] == "cancelled"
+    assert (await api_client.get(f"/jobs/{job.id}/result")).status_code == 409
+
+
+async def test_delete_cancels_a_queued_job(api_client, job_queue):
+    job = job_queue.submit(_hang, kind="run", **RUN)
+
+    response = await api_client.delete(f"/jobs/{job.id}")
+
+    assert response.json()["status"] == "cancelled"
+    await job_queue.start()
+    await asyncio.sleep(0)
+    assert job.status == JobStatus.CANCELLED
+    assert job.started_at is None
+
+
+async def test_delete_unknown_job_is_404(api_client):
+    assert (await api_client.delete("/jobs/job_000000000000")).status_code == 404
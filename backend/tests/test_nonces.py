@@ -0,0 +1,79 @@
+"""Tests for replay protection with expiring nonces."""
+
+import pytest
+
+from app.services.nonces import NonceStore
+
+
+def test_claimed_nonce_cannot_be_claimed_again(clock):
+    store = NonceStore(bucket_s=60, clock=clock)
+
+    assert store.add("0xabc", clock.now + 300)
+    assert "0xabc" in store
+    assert not store.add("0xabc", clock.now + 300)
+    assert len(store) == 1
+
+
+def test_nonce_is_kept_while_its_authorization_is_valid(clock):
+    store = NonceStore(bucket_s=60, clock=clock)
+    expires_at = clock.now + 300
+    store.add("0xabc", expires_at)
+
+    # An authorization expiring at t is still valid at t
+    clock.now = expires_at
+    assert "0xabc" in store
+    assert not store.add("0xabc", expires_at)
+
+
+def test_expiry_releases_nonces(clock):
+    store = NonceStore(bucket_s=60, clock=clock)
+    store.add("0xabc", clock.now + 30)
+    store.add("0xdef", clock.now + 30)
+    store.add("0xlive", clock.now + 600)
+
+    # Past the upper edge of the expired nonces' bucket
+    clock.advance(120)
+
+    assert "0xabc" not in store
+    assert "0xlive" in store
+    assert len(store) == 1
+    assert store.stats()["evicted_nonces"] == 2
+    assert store.add("0xabc", clock.now + 30)
+
+
+def test_bloom_filter_does_not_change_answers(clock):
+    store = NonceStore(bucket_s=60, bloom_capacity=100, clock=clock)
+    for i in range(50):
+        store.add(f"0x{i}", clock.now + 30)
+    store.add("0xlive", clock.now + 600)
+
+    assert all(f"0x{i}" in store for i in range(50))
+    assert "0xunseen" not in store
+
+    clock.advance(120)
+    assert "0x0" not in store
+    assert "0xlive" in store
+    # Evicted nonces outnumbered live ones, so the filter was rebuilt
+    assert store.stats()["bloom"]["stale"] == 0
+
+
+def test_bucket_width_must_be_positive():
+    with pytest.raises(ValueError):
+        NonceStore(bucket_s=0)
+
+
+async def test_settle_rejects_replayed_payment(x402_client):
+    generated = await x402_client.post(
+        "/test/generate-payment", params={"resource_id": "premium-content"}
+    )
+    payload = generated.json()["payment_payload"]
+    body = {"paymentPayload": payload, "paymentRequirements": payload["accepted"]}
+
+    first = (await x402_client.post("/settle", json=body)).json()
+    replay = (await x402_client.post("/settle", json=body)).json()
+
+    assert first["success"]
+    assert not replay["success"]
+    assert replay["errorReason"] == "nonce_already_used"
+    verify = (await x402_client.post("/verify", json=body)).json()
+    assert not verify["isValid"]
@@ -0,0 +1,94 @@
+"""Tests for file-backed paid resources."""
+
+import base64
+import json
+
+import pytest
+
+from app.mock import x402
+
+CONTENT = bytes(range(256)) * 4
+NAME = "dataset.bin"
+
+
+@pytest.fixture
+def files_dir(tmp_path, monkeypatch):
+    (tmp_path / NAME).write_bytes(CONTENT)
+    monkeypatch.setattr(x402._file_settings, "dir", tmp_path)
+    return tmp_path
+
+
+@pytest.fixture
+async def paid(x402_client, files_dir):
+    """Pay for the file once; return the first download."""
+    generated = await x402_client.post("/test/generate-payment", params={"resource_id": NAME})
+    return await x402_client.get(
+        f"/resource/{NAME}", headers={"X-PAYMENT": generated.json()["x_payment_header"]}
+    )
+
+
+def _receipt(response) -> str:
+    return json.loads(base64.b64decode(response.headers["X-PAYMENT-RESPONSE"]))["receipt"]
+
+
+def _settlements() -> int:
+    return x402._store.stats()["settlements"]
+
+
+async def test_paid_download_streams_the_file(paid):
+    assert paid.status_code == 200
+    assert paid.content == CONTENT
+    assert paid.headers["accept-ranges"] == "bytes"
+    assert "etag" in paid.headers
+
+
+async def test_receipt_resumes_a_single_range(x402_client, paid):
+    response = await x402_client.get(
+        f"/resource/{NAME}",
+        headers={"X-PAYMENT-RECEIPT": _receipt(paid), "Range": "bytes=100-199"},
+    )
+
+    assert response.status_code == 206
+    assert response.content == CONTENT[100:200]
+    assert response.headers["content-range"] == f"bytes 100-199/{len(CONTENT)}"
+    assert _settlements() == 1
+
+
+async def test_unsatisfiable_range_gets_416(x402_client, paid):
+    response = await x402_client.get(
+        f"/resource/{NAME}",
+        headers={"X-PAYMENT-RECEIPT": _receipt(paid), "Range": f"bytes={len(CONTENT)}-"},
+    )
+
+    assert response.status_code == 416
+    assert response.headers["content-range"] == f"bytes */{len(CONTENT)}"
+
+
+async def test_matching_etag_gets_304_without_a_second_charge(x402_client, paid):
+    response = await x402_client.get(
+        f"/resource/{NAME}",
+        headers={"X-PAYMENT-RECEIPT": _receipt(paid), "If-None-Match": paid.headers["etag"]},
+    )
+
+    assert response.status_code == 304
+    assert response.content == b""
+    assert response.headers["etag"] == paid.headers["etag"]
+    assert _settlements() == 1
+
+
+async def test_stale_etag_gets_the_file(x402_client, paid):
+    response = await x402_client.get(
+        f"/resource/{NAME}",
+        headers={"X-PAYMENT-RECEIPT": _receipt(paid), "If-None-Match": '"stale"'},
+    )
+
+    assert response.status_code == 200
+    assert response.content == CONTENT
+
+
+async def test_conditional_request_without_payment_still_needs_one(x402_client, paid):
+    response = await x402_client.get(
+        f"/resource/{NAME}", headers={"If-None-Match": paid.headers["etag"]}
+    )
+
+    assert response.status_code == 402
@@ -0,0 +1,134 @@
+"""Tests for signed access receipts."""
+
+import base64
+import json
+
+import pytest
+
+from app.mock import x402
+from app.services.receipts import ReceiptIssuer
+
+RESOURCE = "premium-content"
+
+
+@pytest.fixture
+def issuer(clock) -> ReceiptIssuer:
+    return ReceiptIssuer(ttl_s=300, clock=clock)
+
+
+def _reencode(receipt: str, **changes) -> str:
+    encoded, _, signature = receipt.partition(".")
+    claims = json.loads(base64.urlsafe_b64decode(encoded + "=" * (-len(encoded) % 4)))
+    claims.update(changes)
+    forged = base64.urlsafe_b64encode(json.dumps(claims).encode()).rstrip(b"=").decode()
+    return f"{forged}.{signature}"
+
+
+def test_issued_receipt_is_admitted(issuer, clock):
+    receipt, expires_at = issuer.issue(RESOURCE, "0xpayer", "0xtx")
+
+    claims, reason = issuer.check(receipt, RESOURCE)
+
+    assert reason is None
+    assert claims["payer"] == "0xpayer"
+    assert claims["transaction"] == "0xtx"
+    assert expires_at == int(clock.now) + 300
+    assert issuer.stats()["admitted"] == 1
+
+
+def test_tampered_signature_is_rejected(issuer):
+    receipt, _ = issuer.issue(RESOURCE, "0xpayer", "0xtx")
+    tampered = receipt[:-2] + ("AA" if not receipt.endswith("AA") else "BB")
+
+    assert issuer.check(tampered, RESOURCE) == (None, "invalid_receipt_signature")
+
+
+def test_tampered_claims_are_rejected(issuer):
+    receipt, _ = issuer.issue(RESOURCE, "0xpayer", "0xtx")
+
+    forged = _reencode(receipt, exp=10**12)
+
+    assert issuer.check(forged, RESOURCE) == (None, "invalid_receipt_signature")
+
+
+def test_receipt_from_another_issuer_is_rejected(issuer):
+    receipt, _ = ReceiptIssuer().issue(RESOURCE, "0xpayer", "0xtx")
+
+    assert issuer.check(receipt, RESOURCE) == (None, "invalid_receipt_signature")
+
+
+def test_non_ascii_receipt_is_rejected(issuer):
+    assert issuer.check("ünïcode.sig", RESOURCE) == (None, "invalid_receipt")
+
+
+def test_receipt_only_covers_its_resource(issuer):
+    receipt, _ = issuer.issue(RESOURCE, "0xpayer", "0xtx")
+
+    assert issuer.check(receipt, "api-call") == (None, "receipt_resource_mismatch")
+
+
+def test_receipt_expires(issuer, clock):
+    receipt, _ = issuer.issue(RESOURCE, "0xpayer", "0xtx")
+
+    clock.advance(301)
+
+    assert issuer.check(receipt, RESOURCE) == (None, "receipt_expired")
+
+
+def test_clear_revokes_receipts(issuer):
+    receipt, _ = issuer.issue(RESOURCE, "0xpayer", "0xtx")
+
+    issuer.clear()
+
+    assert issuer.check(receipt, RESOURCE) == (None, "receipt_revoked")
+
+
+async def _pay(client):
+    generated = await client.post("/test/generate-payment", params={"resource_id": RESOURCE})
+    return await client.get(
+        f"/resource/{RESOURCE}", headers={"X-PAYMENT": generated.json()["x_payment_header"]}
+    )
+
+
+async def test_paid_resource_returns_receipt_that_grants_access(x402_client):
+    paid = await _pay(x402_client)
+    settlement = paid.json()["settlement"]
+    header = json.loads(base64.b64decode(paid.headers["X-PAYMENT-RESPONSE"]))
+
+    again = await x402_client.get(
+        f"/resource/{RESOURCE}", headers={"X-PAYMENT-RECEIPT": settlement["receipt"]}
+    )
+
+    assert header["receipt"] == settlement["receipt"]
+    assert again.status_code == 200
+    assert again.json()["settlement"]["transaction"] == settlement["transaction"]
+
+
+async def test_tampered_receipt_gets_402_with_reason(x402_client):
+    receipt = (await _pay(x402_client)).json()["settlement"]["receipt"]
+
+    response = await x402_client.get(
+        f"/resource/{RESOURCE}", headers={"X-PAYMENT-RECEIPT": _reencode(receipt, resource="x")}
+    )
+
+    assert response.status_code == 402
+    assert response.json()["error"] == "invalid_receipt_signature"
+
+
+async def test_deferred_payment_earns_receipt_only_once_settled(x402_client, monkeypatch):
+    monkeypatch.setattr(x402._settlement_settings, "mode", "deferred")
+    monkeypatch.setattr(x402._settlements, "max_wait_s", 60.0)
+
+    paid = (await _pay(x402_client)).json()["settlement"]
+    pending = (await x402_client.get(f"/settlements/{paid['transaction']}")).json()
+    await x402._settlements.close()
+    settled = (await x402_client.get(f"/settlements/{paid['transaction']}")).json()
+
+    assert paid["status"] == "pending"
+    assert "receipt" not in paid
+    assert pending["status"] == "pending"
+    assert "receipt" not in pending
+    assert settled["status"] == "settled"
+    claims, reason = x402._receipts.check(settled["receipt"], RESOURCE)
+    assert reason is None
+    assert claims["transaction"] == paid["transaction"]
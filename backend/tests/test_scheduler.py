@@ -0,0 +1,94 @@
+"""Tests for the dependency-graph test scheduler."""
+
+import asyncio
+import time
+
+import httpx
+import pytest
+
+from app.services import inspector
+from app.services.checks import compile_suite
+from app.services.inspector import SKIPPED_PREFIX, _schedule_tests
+
+BASE_URL = "http://target"
+
+
+def _suite(*definitions):
+    return compile_suite([{"name": d["id"], **d} for d in definitions])
+
+
+@pytest.fixture
+def requests_seen():
+    return []
+
+
+@pytest.fixture
+async def client(requests_seen):
+    async def handler(request: httpx.Request) -> httpx.Response:
+        requests_seen.append(request.url.path)
+        if request.url.path == "/fail":
+            return httpx.Response(500)
+        return httpx.Response(200, json={"id": "abc"})
+
+    async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+        yield client
+
+
+async def _run(client, tests, **kwargs):
+    return [(i, result) async for i, result in _schedule_tests(client, BASE_URL, tests, **kwargs)]
+
+
+async def test_dependents_run_after_their_dependencies(client, requests_seen):
+    tests = _suite(
+        {"id": "child", "depends_on": "parent", "endpoint_template": "/child/{checkout_id}"},
+        {"id": "parent", "endpoint": "/parent", "capture": {"checkout_id": "id"}},
+        {"id": "grandchild", "depends_on": "child", "endpoint": "/grandchild"},
+    )
+
+    results = await _run(client, tests, concurrency=4)
+
+    assert [i for i, _ in results] == [1, 0, 2]
+    assert all(result.passed for _, result in results)
+    assert requests_seen == ["/parent", "/child/abc", "/grandchild"]
+
+
+async def test_dependents_of_a_failed_test_are_skipped(client, requests_seen):
+    tests = _suite(
+        {"id": "parent", "endpoint": "/fail"},
+        {"id": "child", "depends_on": "parent", "endpoint": "/child"},
+        {"id": "grandchild", "depends_on": "child", "endpoint": "/grandchild"},
+        {"id": "sibling", "endpoint": "/sibling"},
+    )
+
+    results = dict(await _run(client, tests))
+
+    assert not results[0].passed
+    assert results[1].error == f"{SKIPPED_PREFIX}dependency 'parent' failed"
+    assert results[2].error == f"{SKIPPED_PREFIX}dependency 'child' failed"
+    assert results[3].passed
+    assert sorted(requests_seen) == ["/fail", "/sibling"]
+
+
+async def test_deadline_cancels_tests_in_flight(client, monkeypatch):
+    cancelled = []
+
+    async def hang(client, test, *args):
+        try:
+            await asyncio.Event().wait()
+        except asyncio.CancelledError:
+            cancelled.append(test.id)
+            raise
+
+    monkeypatch.setattr(inspector, "_run_test", hang)
+    tests = _suite(
+        {"id": "slow", "endpoint": "/slow"},
+        {"id": "after", "depends_on": "slow", "endpoint": "/after"},
+    )
+
+    started = time.perf_counter()
+    results = dict(await _run(client, tests, deadline=started + 0.05))
+
+    assert time.perf_counter() - started < 1
+    assert cancelled == ["slow"]
+    assert results[0].error == "Run deadline exceeded"
+    assert results[1].error == f"{SKIPPED_PREFIX}run deadline exceeded"
@@ -0,0 +1,95 @@
+"""Tests for the deferred settlement queue."""
+
+import pytest
+
+from app.mock import x402
+from app.services.settlement import SettlementQueue
+
+
+@pytest.fixture
+def committed():
+    return {}
+
+
+@pytest.fixture
+async def queue(committed):
+    queue = SettlementQueue(committed.__setitem__, batch_size=2, max_wait_s=60.0)
+    yield queue
+    await queue.close()
+
+
+async def test_settlement_is_pending_until_its_batch_lands(queue, committed):
+    assert queue.submit("0xa", {"payer": "0x1"}) == "pending"
+
+    assert queue.pending("0xa") == {"payer": "0x1", "status": "pending"}
+    assert committed == {}
+
+    await queue.close()
+
+    assert queue.pending("0xa") is None
+    assert committed["0xa"]["status"] == "settled"
+    assert committed["0xa"]["payer"] == "0x1"
+    assert committed["0xa"]["batch"] == 1
+    assert queue.stats()["settled"] == 1
+
+
+async def test_full_batches_settle_together(queue, committed):
+    for tx_hash in ("0xa", "0xb", "0xc"):
+        queue.submit(tx_hash, {})
+
+    await queue.close()
+
+    assert [committed[tx]["batch"] for tx in ("0xa", "0xb", "0xc")] == [1, 1, 2]
+    assert queue.stats()["batches"] == 2
+
+
+async def test_failed_commit_is_counted_and_does_not_stop_the_batch(committed):
+    def commit(tx_hash, record):
+        if tx_hash == "0xbad":
+            raise RuntimeError("store unavailable")
+        committed[tx_hash] = record
+
+    queue = SettlementQueue(commit, batch_size=2, max_wait_s=60.0)
+    queue.submit("0xbad", {})
+    queue.submit("0xgood", {})
+    await queue.close()
+
+    assert list(committed) == ["0xgood"]
+    assert queue.pending("0xbad") is None
+    stats = queue.stats()
+    assert (stats["settled"], stats["failed"], stats["pending"]) == (1, 1, 0)
+
+
+async def test_full_queue_settles_inline(committed):
+    queue = SettlementQueue(committed.__setitem__, max_wait_s=60.0, max_pending=1)
+
+    statuses = [queue.submit("0xa", {}), queue.submit("0xb", {})]
+
+    assert statuses == ["pending", "settled"]
+    assert committed["0xb"]["batch"] is None
+    assert queue.stats()["inline"] == 1
+    await queue.close()
+
+
+async def test_settlement_lookup_follows_a_deferred_payment(x402_client, monkeypatch):
+    monkeypatch.setattr(x402._settlement_settings, "mode", "deferred")
+    monkeypatch.setattr(x402._settlements, "max_wait_s", 60.0)
+    generated = await x402_client.post(
+        "/test/generate-payment", params={"resource_id": "premium-content"}
+    )
+    paid = await x402_client.get(
+        "/resource/premium-content",
+        headers={"X-PAYMENT": generated.json()["x_payment_header"]},
+    )
+    tx_hash = paid.json()["settlement"]["transaction"]
+
+    pending = await x402_client.get(f"/settlements/{tx_hash}")
+    await x402._settlements.close()
+    settled = await x402_client.get(f"/settlements/{tx_hash}")
+    missing = await x402_client.get("/settlements/0xunknown")
+
+    assert pending.json()["status"] == "pending"
+    assert settled.json()["status"] == "settled"
+    assert settled.json()["transaction"] == tx_hash
+    assert settled.json()["batch"] is not None
+    assert missing.status_code == 404
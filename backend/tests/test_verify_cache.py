@@ -0,0 +1,86 @@
+"""Tests for caching x402 verifications until settlement."""
+
+from app.mock import x402
+from app.services.verify_cache import VerifiedPayment, VerifyCache
+
+
+def _payment(valid_before: int, nonce: str = "0xabc") -> VerifiedPayment:
+    return VerifiedPayment("0xpayer", nonce, valid_after=0, valid_before=valid_before)
+
+
+def test_entry_is_served_until_valid_before():
+    cache = VerifyCache()
+    cache.put("key", _payment(valid_before=200), now=100)
+
+    assert cache.get("key", now=200) == _payment(valid_before=200)
+    assert cache.stats()["hits"] == 1
+
+
+def test_entry_does_not_outlive_valid_before():
+    cache = VerifyCache()
+    cache.put("key", _payment(valid_before=200), now=100)
+
+    assert cache.get("key", now=201) is None
+    assert len(cache) == 0
+    assert cache.stats()["expired"] == 1
+
+
+def test_expired_payment_is_not_cached():
+    cache = VerifyCache()
+    cache.put("key", _payment(valid_before=200), now=201)
+
+    assert len(cache) == 0
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = VerifyCache(max_size=2)
+    cache.put("a", _payment(300, "0xa"), now=100)
+    cache.put("b", _payment(300, "0xb"), now=100)
+    cache.get("a", now=100)
+    cache.put("c", _payment(300, "0xc"), now=100)
+
+    assert cache.get("b", now=100) is None
+    assert cache.get("a", now=100) is not None
+    assert cache.stats()["evicted"] == 1
+
+
+def test_zero_size_disables_cache():
+    cache = VerifyCache(max_size=0)
+    cache.put("key", _payment(valid_before=200), now=100)
+
+    assert not cache.enabled
+    assert len(cache) == 0
+
+
+async def test_settle_after_valid_before_is_rejected_despite_cached_verify(x402_client):
+    generated = await x402_client.post(
+        "/test/generate-payment", params={"resource_id": "premium-content"}
+    )
+    payload = generated.json()["payment_payload"]
+    requirements = payload["accepted"]
+    valid_before = int(payload["payload"]["authorization"]["validBefore"])
+
+    assert x402._verify_payment_payload(payload, requirements, now=valid_before)[0]
+    assert len(x402._verify_cache) == 1
+
+    success, error, _, tx_hash = x402._settle_payment(payload, requirements, now=valid_before + 1)
+
+    assert not success
+    assert error == "invalid_exact_evm_payload_authorization_valid_before"
+    assert tx_hash is None
+    assert len(x402._verify_cache) == 0
+
+
+async def test_settle_consumes_cached_verify(x402_client):
+    generated = await x402_client.post(
+        "/test/generate-payment", params={"resource_id": "premium-content"}
+    )
+    payload = generated.json()["payment_payload"]
+    body = {"paymentPayload": payload, "paymentRequirements": payload["accepted"]}
+
+    assert (await x402_client.post("/verify", json=body)).json()["isValid"]
+    assert (await x402_client.post("/settle", json=body)).json()["success"]
+
+    stats = x402._verify_cache.stats()
+    assert stats["hits"] == 1
+    assert stats["size"] == 0
@@ -0,0 +1,67 @@
+"""Tests for batch verify and settle matching the single-item endpoints."""
+
+import copy
+
+
+async def _payment(client) -> dict:
+    generated = await client.post(
+        "/test/generate-payment", params={"resource_id": "premium-content"}
+    )
+    payload = generated.json()["payment_payload"]
+    return {"paymentPayload": payload, "paymentRequirements": payload["accepted"]}
+
+
+def _with_recipient(item: dict, pay_to: str) -> dict:
+    item = copy.deepcopy(item)
+    item["paymentPayload"]["payload"]["authorization"]["to"] = pay_to
+    return item
+
+
+async def test_verify_batch_marks_repeat_of_verified_nonce(x402_client):
+    item = await _payment(x402_client)
+
+    results = (await x402_client.post("/verify/batch", json=[item, item])).json()["results"]
+
+    assert results[0]["isValid"]
+    assert results[1] == {
+        "isValid": False,
+        "invalidReason": "duplicate_nonce_in_batch",
+        "payer": results[0]["payer"],
+    }
+
+
+async def test_verify_batch_repeat_after_failed_item_is_verified_on_its_own(x402_client):
+    item = await _payment(x402_client)
+    misaddressed = _with_recipient(item, "0x0000000000000000000000000000000000000001")
+
+    batch = [misaddressed, item]
+    results = (await x402_client.post("/verify/batch", json=batch)).json()["results"]
+    single = [(await x402_client.post("/verify", json=i)).json() for i in batch]
+
+    assert results == single
+    assert not results[0]["isValid"]
+    assert results[1]["isValid"]
+
+
+async def test_settle_batch_matches_sequential_settles(x402_client):
+    first = await _payment(x402_client)
+    second = await _payment(x402_client)
+
+    batch = (await x402_client.post("/settle/batch", json=[first, first, second])).json()
+    results = batch["results"]
+
+    assert results[0]["success"]
+    assert results[1]["errorReason"] == "nonce_already_used"
+    assert results[2]["success"]
+    replay = (await x402_client.post("/settle", json=first)).json()
+    assert replay["errorReason"] == results[1]["errorReason"]
+
+
+async def test_settle_batch_repeat_after_failed_item_settles(x402_client):
+    item = await _payment(x402_client)
+    misaddressed = _with_recipient(item, "0x0000000000000000000000000000000000000001")
+
+    results = (await x402_client.post("/settle/batch", json=[misaddressed, item])).json()["results"]
+
+    assert results[0]["errorReason"] == "invalid_exact_evm_payload_recipient_mismatch"
+    assert results[1]["success"]
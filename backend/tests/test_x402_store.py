@@ -0,0 +1,116 @@
+"""Tests for the x402 facilitator stores."""
+
+import asyncio
+import time
+
+import pytest
+
+from app.services.nonces import NonceStore
+from app.services.x402_store import (
+    MemoryStore,
+    SQLiteStore,
+    X402StoreSettings,
+    create_store,
+)
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return tmp_path / "x402.sqlite3"
+
+
+def test_memory_store_rejects_replayed_claim(clock):
+    store = MemoryStore(NonceStore(clock=clock))
+
+    assert store.claim_nonce("0xabc", int(clock.now) + 300)
+    assert store.has_nonce("0xabc")
+    assert not store.claim_nonce("0xabc", int(clock.now) + 300)
+
+
+def test_sqlite_claim_is_shared_between_connections(db_path):
+    first = SQLiteStore(db_path)
+    second = SQLiteStore(db_path)
+    expires_at = int(time.time()) + 300
+    try:
+        assert first.claim_nonce("0xabc", expires_at)
+        assert second.has_nonce("0xabc")
+        assert not second.claim_nonce("0xabc", expires_at)
+    finally:
+        first.close()
+        second.close()
+
+
+def test_sqlite_evicts_expired_nonces(db_path):
+    store = SQLiteStore(db_path, evict_interval=0.0)
+    now = int(time.time())
+    try:
+        store.claim_nonce("0xexpired", now - 10)
+        store.claim_nonce("0xlive", now + 300)
+
+        assert not store.has_nonce("0xexpired")
+        assert store.has_nonce("0xlive")
+        assert store.stats()["nonces"] == {"size": 1, "evicted_nonces": 1}
+    finally:
+        store.close()
+
+
+async def test_buffered_settlements_survive_reopen(db_path):
+    store = SQLiteStore(db_path, flush_interval=60.0)
+    other = SQLiteStore(db_path)
+    store.add_settlement("0x1", {"payer": "0xpayer", "amount": "10000"})
+
+    # Readable at once here, but not written until the batch is flushed
+    assert store.get_settlement("0x1") == {"payer": "0xpayer", "amount": "10000"}
+    assert store.stats()["pending_settlements"] == 1
+    assert other.get_settlement("0x1") is None
+    other.close()
+
+    store.close()
+    reopened = SQLiteStore(db_path)
+    try:
+        assert reopened.get_settlement("0x1") == {"payer": "0xpayer", "amount": "10000"}
+        assert reopened.stats()["pending_settlements"] == 0
+    finally:
+        reopened.close()
+
+
+async def test_settlements_flush_after_interval(db_path):
+    store = SQLiteStore(db_path, flush_interval=0.01)
+    other = SQLiteStore(db_path)
+    try:
+        store.add_settlement("0x1", {"amount": "1"})
+        await asyncio.sleep(0.05)
+
+        assert store.flushes == 1
+        assert other.get_settlement("0x1") == {"amount": "1"}
+    finally:
+        store.close()
+        other.close()
+
+
+async def test_full_batch_is_written_in_one_transaction(db_path):
+    store = SQLiteStore(db_path, settlement_batch=3, flush_interval=60.0)
+    try:
+        for i in range(3):
+            store.add_settlement(f"0x{i}", {"amount": str(i)})
+
+        stats = store.stats()
+        assert stats["flushes"] == 1
+        assert stats["settlements"] == 3
+        assert stats["pending_settlements"] == 0
+    finally:
+        store.close()
+
+
+def test_settlement_outside_event_loop_is_written_at_once(db_path):
+    store = SQLiteStore(db_path)
+    try:
+        store.add_settlement("0x1", {"amount": "1"})
+        assert store.stats()["pending_settlements"] == 0
+    finally:
+        store.close()
+
+
+def test_create_store_rejects_unknown_backend():
+    with pytest.raises(ValueError):
+        create_store(X402StoreSettings(backend="redis"))